@@ -0,0 +1,158 @@
+""" Teste de carga da API de KPIs: latência p50/p99 numa taxa fixa de pedidos
+
+Uso: python benchmarks/bench_api.py [--url http://localhost:8000] [--qps 200] [--duration 10]
+                                    [--combos 20] [--revalidate] [--warmup] [--json relatorio.json]
+
+Sem --url, a API é iniciada num processo separado (python -m curry_company serve)
+numa porta livre e encerrada no fim.
+
+Os pedidos são disparados em malha aberta: o i-ésimo pedido sai no instante
+i / qps, sem esperar as respostas anteriores, e a latência é contada a partir
+desse instante (um servidor lento não reduz a carga que recebe). Os pedidos
+alternam entre todos os KPIs e --combos combinações de filtros; com --revalidate,
+o cliente guarda o ETag de cada URL e envia If-None-Match (respostas 304); com
+--warmup, cada URL é pedida uma vez antes da medição (só o regime com cache quente). """
+
+# Libraries
+import argparse
+import asyncio
+import json
+import random
+import socket
+import subprocess
+import sys
+import time
+from collections import Counter
+from datetime import date, timedelta
+from urllib.parse import urlencode
+
+import numpy as np
+from tornado.httpclient import AsyncHTTPClient, HTTPClientError, HTTPRequest
+
+TRAFFIC = ['Low', 'Medium', 'High', 'Jam']
+WEATHER = ['conditions Cloudy', 'conditions Fog', 'conditions Sandstorm', 'conditions Sunny', 'conditions Windy']
+
+# =======================================
+# Funções
+# =======================================
+
+def filter_combos(combos, seed = 0):
+
+    """ Esta função tem a responsabilidade de sortear combinações de filtros como as da barra lateral
+
+    Input: Quantidade de combinações
+    Output: Lista de dicionários de parâmetros da URL """
+
+    rng = random.Random(seed)
+    resultado = []
+    for _ in range(combos):
+        inicio = date(2022, 2, 11) + timedelta(days = rng.randrange(0, 40))
+        fim = inicio + timedelta(days = rng.randrange(1, 20))
+        params = {'date_start': inicio.isoformat(), 'date_end': fim.isoformat(),
+                  'Road_traffic_density': ','.join(sorted(rng.sample(TRAFFIC, rng.randrange(1, len(TRAFFIC) + 1))))}
+        if rng.random() < 0.5:
+            params['Weatherconditions'] = ','.join(sorted(rng.sample(WEATHER, rng.randrange(1, len(WEATHER) + 1))))
+        resultado.append(params)
+    return resultado
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+async def wait_ready(client, url, timeout):
+    limite = time.monotonic() + timeout
+    while time.monotonic() < limite:
+        try:
+            await client.fetch(url + '/health', request_timeout = 5)
+            return
+        except Exception:
+            await asyncio.sleep(0.5)
+    raise RuntimeError('API não respondeu em %s' % url)
+
+async def load_test(url, qps, duration, combos, revalidate, timeout, warmup = False):
+    AsyncHTTPClient.configure(None, max_clients = 10_000)
+    client = AsyncHTTPClient()
+    await wait_ready(client, url, 120)
+    names = json.loads((await client.fetch(url + '/kpis')).body)['kpis']
+    urls = ['%s/kpis/%s?%s' % (url, name, urlencode(params)) for params in filter_combos(combos) for name in names]
+    random.Random(1).shuffle(urls)
+
+    etags = {}
+    latencias, status = [], Counter()
+    if warmup:
+        # Uma passada sequencial por todas as URLs: mede só o regime com o cache quente
+        for alvo in urls:
+            etags[alvo] = (await client.fetch(alvo, request_timeout = timeout)).headers.get('Etag')
+
+    async def request(i, agendado):
+        alvo = urls[i % len(urls)]
+        headers = {'If-None-Match': etags[alvo]} if revalidate and alvo in etags else {}
+        try:
+            response = await client.fetch(HTTPRequest(alvo, headers = headers, request_timeout = timeout), raise_error = False)
+            status[response.code] += 1
+            if response.code == 200 and 'Etag' in response.headers:
+                etags[alvo] = response.headers['Etag']
+        except (HTTPClientError, OSError) as error:
+            status[type(error).__name__] += 1
+        latencias.append(time.perf_counter() - agendado)
+
+    total = int(qps * duration)
+    inicio = time.perf_counter()
+    tarefas = []
+    for i in range(total):
+        agendado = inicio + i / qps
+        espera = agendado - time.perf_counter()
+        if espera > 0:
+            await asyncio.sleep(espera)
+        tarefas.append(asyncio.ensure_future(request(i, agendado)))
+    await asyncio.gather(*tarefas)
+    decorrido = time.perf_counter() - inicio
+
+    stats = json.loads((await client.fetch(url + '/stats')).body)
+    ms = np.array(latencias) * 1000
+    return {'url': url, 'qps_alvo': qps, 'duracao_s': duration, 'pedidos': total,
+            'qps_obtido': round(total / decorrido, 1), 'urls_distintas': len(urls), 'revalidate': revalidate, 'warmup': warmup,
+            'status': {str(codigo): quantidade for codigo, quantidade in status.items()},
+            'latencia_ms': {'p50': round(float(np.percentile(ms, 50)), 2), 'p90': round(float(np.percentile(ms, 90)), 2),
+                            'p99': round(float(np.percentile(ms, 99)), 2), 'max': round(float(ms.max()), 2)},
+            'servidor': stats}
+
+def main(argv = None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--url', help = 'API já iniciada (padrão: inicia uma local)')
+    parser.add_argument('--dataset', default = 'dataset/train.csv', help = 'dataset da API local')
+    parser.add_argument('--qps', type = float, default = 200)
+    parser.add_argument('--duration', type = float, default = 10, help = 'segundos')
+    parser.add_argument('--combos', type = int, default = 20, help = 'combinações de filtros')
+    parser.add_argument('--revalidate', action = 'store_true', help = 'envia If-None-Match com o ETag recebido')
+    parser.add_argument('--warmup', action = 'store_true', help = 'pede cada URL uma vez antes de medir (cache quente)')
+    parser.add_argument('--timeout', type = float, default = 30)
+    parser.add_argument('--json', help = 'grava o relatório neste arquivo')
+    args = parser.parse_args(argv)
+
+    server = None
+    url = args.url
+    if url is None:
+        port = free_port()
+        url = 'http://127.0.0.1:%d' % port
+        server = subprocess.Popen([sys.executable, '-m', 'curry_company', 'serve', '--port', str(port), '--address', '127.0.0.1', '--dataset', args.dataset],
+                                  stdout = subprocess.DEVNULL, stderr = subprocess.DEVNULL)
+    try:
+        report = asyncio.run(load_test(url.rstrip('/'), args.qps, args.duration, args.combos, args.revalidate, args.timeout, args.warmup))
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+    latencia = report['latencia_ms']
+    print(f'{report["pedidos"]} pedidos a {report["qps_obtido"]} qps (alvo {args.qps}), {report["urls_distintas"]} URLs distintas')
+    print(f'status: {report["status"]}')
+    print(f'latência (ms): p50 {latencia["p50"]}  p90 {latencia["p90"]}  p99 {latencia["p99"]}  max {latencia["max"]}')
+    print(f'cache de respostas: {report["servidor"]["responses"]}')
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent = 2)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,106 @@
+""" Benchmark da limpeza do dataset: clean_code() original x leitura tipada + máscara única
+
+Uso: python benchmarks/bench_clean_code.py [caminho do csv]
+
+Mede tempo de parede e pico de memória (tracemalloc) de leitura + limpeza e
+confere que as duas versões produzem o mesmo dataframe. """
+
+# Libraries
+import sys
+import time
+import tracemalloc
+
+import pandas as pd
+
+sys.path.insert(0, '.')
+from curry_company import loader
+
+# =======================================
+# Funções
+# =======================================
+
+def legacy_clean_code(df):
+
+    """ Esta função é a cópia da limpeza original das páginas, usada como linha de base
+
+    Input: Dataframe bruto (pd.read_csv sem tipos)
+    Output: Dataframe """
+
+    df1 = df.copy()
+
+    df1 = df1.loc[df1['Road_traffic_density'] != 'NaN ', :].copy()
+    df1 = df1.loc[df1['City'] != 'NaN ', :].copy()
+    df1 = df1.loc[df1['Weatherconditions'] != 'NaN ', :].copy()
+
+    df1['Delivery_person_Ratings'] = (df1['Delivery_person_Ratings'].astype(float))
+
+    linhas_selecionadas = (df1['Delivery_person_Age'] != 'NaN ')
+    df1 = df1.loc[linhas_selecionadas, :].copy()
+    df1['Delivery_person_Age'] = (df1['Delivery_person_Age'].astype(int)).copy()
+
+    linhas_selecionadas = (df1['Weatherconditions'] != 'conditions NaN')
+    df1 = df1.loc[linhas_selecionadas, :].copy()
+
+    linhas_selecionadas = (df1['Festival'] != 'NaN ')
+    df1 = df1.loc[linhas_selecionadas, :].copy()
+
+    df1 = df1.loc[df1['multiple_deliveries'] != 'NaN ', :].copy()
+    df1['multiple_deliveries'] = (df1['multiple_deliveries'].astype(int)).copy()
+
+    df1['Order_Date'] = pd.to_datetime(df1['Order_Date'], format = '%d-%m-%Y').copy()
+
+    df1['ID'] = df1.loc[:, 'ID'].str.strip()
+    df1['Delivery_person_ID'] = df1.loc[:, 'Delivery_person_ID'].str.strip()
+    df1['Road_traffic_density'] = df1.loc[:, 'Road_traffic_density'].str.strip()
+    df1['Type_of_order'] = df1.loc[:, 'Type_of_order'].str.strip()
+    df1['Type_of_vehicle'] = df1.loc[:, 'Type_of_vehicle'].str.strip()
+    df1['Festival'] = df1.loc[:, 'Festival'].str.strip()
+    df1['City'] = df1.loc[:, 'City'].str.strip()
+    df1['Road_traffic_density'] = df1.loc[:, 'Road_traffic_density'].str.strip()
+
+    df1['Time_taken(min)'] = df1['Time_taken(min)'].str.strip('(min) ')
+    df1['Time_taken(min)'] = (df1['Time_taken(min)'].astype(int)).copy()
+
+    return (df1)
+
+def legacy(path):
+    return legacy_clean_code(pd.read_csv(path))
+
+def current(path):
+    return loader.clean_code(loader.read_raw(path))
+
+def measure(func, path):
+
+    """ Esta função tem a responsabilidade de medir tempo e pico de memória de uma execução
+
+    O tempo é medido numa execução sem tracemalloc, que distorce o tempo de parede.
+
+    Input: Função de limpeza, caminho do csv
+    Output: (dataframe, segundos, pico em MB) """
+
+    start = time.perf_counter()
+    df = func(path)
+    elapsed = time.perf_counter() - start
+    del df
+    tracemalloc.start()
+    df = func(path)
+    peak = tracemalloc.get_traced_memory()[1] / 2**20
+    tracemalloc.stop()
+    return df, elapsed, peak
+
+def same_result(before, after):
+    after = after.astype({coluna: str for coluna in loader.CATEGORY_COLUMNS})
+    before = before.astype(after.dtypes.to_dict())
+    pd.testing.assert_frame_equal(before.drop(columns = ['Time_Orderd', 'Time_Order_picked']), after.drop(columns = ['Time_Orderd', 'Time_Order_picked']))
+
+def main(path):
+    before, t_before, m_before = measure(legacy, path)
+    after, t_after, m_after = measure(current, path)
+    same_result(before, after)
+    print(f'linhas limpas: {len(after)}')
+    print(f'{"":10}{"tempo (s)":>12}{"pico (MB)":>12}{"residente (MB)":>16}')
+    print(f'{"antes":10}{t_before:12.2f}{m_before:12.1f}{before.memory_usage(deep = True).sum() / 2**20:16.1f}')
+    print(f'{"depois":10}{t_after:12.2f}{m_after:12.1f}{after.memory_usage(deep = True).sum() / 2**20:16.1f}')
+
+if __name__ == '__main__':
+    main(sys.argv[1] if len(sys.argv) > 1 else loader.DATASET_PATH)
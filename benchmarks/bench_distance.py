@@ -0,0 +1,74 @@
+""" Benchmark da distância restaurante -> entrega: DataFrame.apply + haversine x versão vetorizada
+
+Uso: python benchmarks/bench_distance.py [linhas ...]   (padrão: 1000000 10000000)
+
+O apply linha a linha é medido em uma amostra (--baseline-rows) e extrapolado
+linearmente, pois levaria minutos em 10M de linhas. Antes de medir, confere que a
+coluna float32 bate com o pacote haversine dentro da tolerância. """
+
+# Libraries
+import argparse
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+from haversine import haversine
+
+sys.path.insert(0, '.')
+from curry_company.geo import LOCATION_COLUMNS, delivery_distance
+
+# Tolerância relativa do float32 em relação ao haversine (float64)
+RTOL = 1e-6
+
+# =======================================
+# Funções
+# =======================================
+
+def synthetic_locations(rows, seed = 0):
+
+    """ Esta função tem a responsabilidade de gerar coordenadas parecidas com as do dataset
+
+    Input: Quantidade de linhas
+    Output: Dataframe com as colunas de LOCATION_COLUMNS """
+
+    rng = np.random.default_rng(seed)
+    lat = rng.uniform(9, 31, rows)
+    lon = rng.uniform(72, 89, rows)
+    return pd.DataFrame({'Restaurant_latitude': lat,
+                         'Restaurant_longitude': lon,
+                         'Delivery_location_latitude': lat + rng.uniform(-0.15, 0.15, rows),
+                         'Delivery_location_longitude': lon + rng.uniform(-0.15, 0.15, rows)})
+
+def apply_distance(df):
+    return df.loc[:, LOCATION_COLUMNS].apply( lambda x: haversine ((x['Restaurant_latitude'], x['Restaurant_longitude']), (x['Delivery_location_latitude'], x['Delivery_location_longitude'])), axis = 1)
+
+def check_tolerance(rows = 10000):
+    df = synthetic_locations(rows, seed = 1)
+    np.testing.assert_allclose(delivery_distance(df), apply_distance(df).to_numpy(), rtol = RTOL)
+
+def timed(func, df):
+    start = time.perf_counter()
+    func(df)
+    return time.perf_counter() - start
+
+def main(argv = None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument('rows', nargs = '*', type = int, default = [1_000_000, 10_000_000])
+    parser.add_argument('--baseline-rows', type = int, default = 200_000)
+    args = parser.parse_args(argv)
+
+    check_tolerance()
+    print(f'tolerância ok (rtol={RTOL})')
+    print(f'{"linhas":>12}{"apply (s)":>14}{"vetorizado (s)":>16}{"ganho":>10}')
+    for rows in args.rows:
+        df = synthetic_locations(rows)
+        sample = min(rows, args.baseline_rows)
+        t_apply = timed(apply_distance, df.iloc[:sample]) * rows / sample
+        t_vec = timed(delivery_distance, df)
+        estimado = '*' if sample < rows else ' '
+        print(f'{rows:>12}{t_apply:>13.2f}{estimado}{t_vec:>16.3f}{t_apply / t_vec:>9.0f}x')
+    print('* apply extrapolado a partir de', args.baseline_rows, 'linhas')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,58 @@
+""" Benchmark da contagem de entregadores únicos: pandas x bitmap exato x HyperLogLog
+
+Uso: python benchmarks/bench_distinct.py [caminho do csv] [--error 0.01]
+
+Compara, para as consultas das páginas (entregadores únicos por semana e no
+período filtrado), o tempo da varredura com pandas e o tempo de juntar os
+resumos por célula, além do erro do HyperLogLog. """
+
+# Libraries
+import argparse
+import sys
+import time
+from datetime import datetime
+
+sys.path.insert(0, '.')
+from curry_company import distinct, loader
+
+FILTROS = dict(date_end = datetime(2022, 3, 3), Road_traffic_density = ['Low', 'Medium', 'High', 'Jam'])
+
+# =======================================
+# Funções
+# =======================================
+
+def timed(func, repeat = 5):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = func()
+    return result, (time.perf_counter() - start) / repeat
+
+def pandas_baseline(df1):
+    linhas_selecionadas = (df1['Order_Date'] < FILTROS['date_end']) & df1['Road_traffic_density'].isin(FILTROS['Road_traffic_density'])
+    df_aux = df1.loc[linhas_selecionadas, :]
+    weekly = df_aux.loc[:, ['Delivery_person_ID']].groupby(df_aux['Order_Date'].dt.strftime('%U')).nunique()['Delivery_person_ID']
+    return weekly, len(df_aux['Delivery_person_ID'].unique())
+
+def sketch_query(sketch):
+    weekly = distinct.count_distinct_by(sketch, sketch['keys']['Order_Date'].dt.strftime('%U'), **FILTROS)
+    return weekly, distinct.count_distinct(sketch, **FILTROS)
+
+def main(argv = None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument('csv', nargs = '?', default = loader.DATASET_PATH)
+    parser.add_argument('--error', type = float, default = distinct.DEFAULT_ERROR)
+    args = parser.parse_args(argv)
+
+    df1 = loader.read_dataset(args.csv)
+    (weekly, total), t_pandas = timed(lambda: pandas_baseline(df1))
+    print(f'linhas: {len(df1)}  entregadores: {total}')
+    print(f'{"modo":8}{"montagem (s)":>14}{"consulta (ms)":>15}{"memória (KB)":>14}{"erro máx.":>11}')
+    print(f'{"pandas":8}{"-":>14}{t_pandas * 1000:>15.1f}{"-":>14}{0:>11.4f}')
+    for mode in ('exact', 'hll'):
+        sketch, t_build = timed(lambda: distinct.build_distinct(df1, mode = mode, error = args.error), repeat = 1)
+        (weekly_s, total_s), t_query = timed(lambda: sketch_query(sketch))
+        error = max(((weekly_s - weekly).abs() / weekly).max(), abs(total_s - total) / total)
+        print(f'{mode:8}{t_build:>14.2f}{t_query * 1000:>15.1f}{sketch["states"].nbytes / 1024:>14.0f}{error:>11.4f}')
+
+if __name__ == '__main__':
+    main()
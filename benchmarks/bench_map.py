@@ -0,0 +1,96 @@
+""" Benchmark do mapa: um folium.Marker por ponto (iterrows) x camadas em lote
+
+Uso: python benchmarks/bench_map.py [pontos ...]   (padrão: 12 10000 100000 1000000)
+
+Para cada quantidade de pontos mede o tempo de montar o mapa e gerar o HTML
+(o mesmo que o folium_static envia ao navegador) e o tamanho desse HTML:
+
+- marcadores: laço iterrows com um folium.Marker e popup por ponto (versão antiga);
+- geojson: uma FeatureCollection com popup;
+- fast: FastMarkerCluster (todos os pontos, agrupados no navegador);
+- servidor: pontos agrupados numa grade no servidor (só as células vão para o navegador).
+
+O laço de marcadores é medido em uma amostra (--baseline-points) e extrapolado
+linearmente, tanto no tempo quanto no tamanho. """
+
+# Libraries
+import argparse
+import sys
+import time
+
+import folium
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, '.')
+from curry_company.maps import cluster_layer, cluster_points, fast_marker_layer, geojson_layer
+
+# =======================================
+# Funções
+# =======================================
+
+def synthetic_points(points, seed = 0):
+
+    """ Esta função tem a responsabilidade de gerar locais de entrega em torno de algumas cidades
+
+    Input: Quantidade de pontos
+    Output: Dataframe com City, Road_traffic_density e as coordenadas de entrega """
+
+    rng = np.random.default_rng(seed)
+    centers = rng.uniform([9, 72], [31, 89], size = (20, 2))
+    city = rng.integers(0, len(centers), points)
+    return pd.DataFrame({'City': pd.Categorical.from_codes(city % 3, ['Metropolitian', 'Semi-Urban', 'Urban']),
+                         'Road_traffic_density': pd.Categorical.from_codes(rng.integers(0, 4, points), ['High', 'Jam', 'Low', 'Medium']),
+                         'Delivery_location_latitude': centers[city, 0] + rng.normal(0, 0.08, points),
+                         'Delivery_location_longitude': centers[city, 1] + rng.normal(0, 0.08, points)})
+
+def markers_map(df_aux):
+    map = folium.Map()
+    for index, location_info in df_aux.iterrows():
+        folium.Marker( [location_info['Delivery_location_latitude'],
+                          location_info['Delivery_location_longitude']],
+                          popup=location_info[['City', 'Road_traffic_density']] ).add_to( map )
+    return map
+
+def geojson_map(df_aux):
+    map = folium.Map()
+    geojson_layer(df_aux, 'Delivery_location_latitude', 'Delivery_location_longitude', ['City', 'Road_traffic_density']).add_to(map)
+    return map
+
+def fast_map(df_aux):
+    map = folium.Map()
+    fast_marker_layer(df_aux['Delivery_location_latitude'].to_numpy(), df_aux['Delivery_location_longitude'].to_numpy()).add_to(map)
+    return map
+
+def server_map(df_aux):
+    map = folium.Map()
+    clusters = cluster_points(df_aux['Delivery_location_latitude'].to_numpy(), df_aux['Delivery_location_longitude'].to_numpy())
+    cluster_layer(clusters).add_to(map)
+    return map
+
+def timed_render(build, df_aux):
+    start = time.perf_counter()
+    html = folium.Figure().add_child(build(df_aux)).render()
+    return time.perf_counter() - start, len(html.encode())
+
+def main(argv = None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument('points', nargs = '*', type = int, default = [12, 10_000, 100_000, 1_000_000])
+    parser.add_argument('--baseline-points', type = int, default = 5_000)
+    args = parser.parse_args(argv)
+
+    metodos = [('marcadores', markers_map), ('geojson', geojson_map), ('fast', fast_map), ('servidor', server_map)]
+    print(f'{"pontos":>10}' + ''.join(f'{nome + " (s)":>16}{nome + " (KB)":>18}' for nome, _ in metodos))
+    for points in args.points:
+        df_aux = synthetic_points(points)
+        linha = f'{points:>10}'
+        for nome, build in metodos:
+            sample = min(points, args.baseline_points) if nome == 'marcadores' else points
+            seconds, size = timed_render(build, df_aux.iloc[:sample])
+            estimado = '*' if sample < points else ' '
+            linha += f'{seconds * points / sample:>15.3f}{estimado}{size * points / sample / 1024:>17.0f}{estimado}'
+        print(linha)
+    print('* extrapolado a partir de', args.baseline_points, 'pontos')
+
+if __name__ == '__main__':
+    main()
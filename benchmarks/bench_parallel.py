@@ -0,0 +1,66 @@
+""" Benchmark da agregação em paralelo: 1..N processos sobre colunas em memória compartilhada
+
+Uso: python benchmarks/bench_parallel.py caminho/train.csv [--workers 1 2 4 8] [--partition date|city]
+
+Para cada quantidade de processos mede o tempo de parallel_aggregates (publicar as
+colunas, calcular os parciais no pool e juntar) e compara com a versão serial
+(as funções de construção chamadas no próprio processo). O pool é criado e aquecido
+antes de medir, para que o tempo de iniciar os processos não entre na conta.
+Antes de medir, confere que o cubo em paralelo é igual ao serial. """
+
+# Libraries
+import argparse
+import sys
+import time
+
+import pandas as pd
+
+sys.path.insert(0, '.')
+from curry_company import cube, parallel
+from curry_company.loader import load_dataset
+
+# =======================================
+# Funções
+# =======================================
+
+def serial_aggregates(df1, names):
+    return {name: parallel.PARTIALS[name][0](df1) for name in names}
+
+def timed(function, *args, repeat = 3, **kwargs):
+    tempos = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function(*args, **kwargs)
+        tempos.append(time.perf_counter() - start)
+    return min(tempos)
+
+def check_cube(df1, partition):
+    esperado = cube.build_cube(df1)
+    obtido = parallel.parallel_aggregates(df1, ['cube'], workers = 2, partition = partition)['cube'][esperado.columns]
+    pd.testing.assert_frame_equal(obtido.sort_values(cube.DIMENSIONS, ignore_index = True),
+                                  esperado.sort_values(cube.DIMENSIONS, ignore_index = True),
+                                  check_categorical = False, check_dtype = False)
+
+def main(argv = None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument('path')
+    parser.add_argument('--workers', nargs = '*', type = int, default = [1, 2, 4, 8])
+    parser.add_argument('--partition', choices = ['date', 'city'], default = 'date')
+    parser.add_argument('--repeat', type = int, default = 3)
+    args = parser.parse_args(argv)
+
+    df1 = load_dataset(args.path)
+    names = list(parallel.PARTIALS)
+    check_cube(df1, args.partition)
+    print(f'{len(df1)} linhas, {parallel.default_workers()} núcleos disponíveis, partição por {args.partition}')
+
+    serial = timed(serial_aggregates, df1, names, repeat = args.repeat)
+    print(f'{"processos":>10}{"tempo (s)":>12}{"speedup":>10}')
+    print(f'{"serial":>10}{serial:>12.3f}{1.0:>10.2f}')
+    for workers in args.workers:
+        parallel.parallel_aggregates(df1, names, workers = workers, partition = args.partition)
+        seconds = timed(parallel.parallel_aggregates, df1, names, workers = workers, partition = args.partition, repeat = args.repeat)
+        print(f'{workers:>10}{seconds:>12.3f}{serial / seconds:>10.2f}')
+
+if __name__ == '__main__':
+    main()
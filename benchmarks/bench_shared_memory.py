@@ -0,0 +1,138 @@
+""" Verificação do dataset compartilhado: sessões e processos não copiam as colunas
+
+Uso: python benchmarks/bench_shared_memory.py [caminho/train.csv] [--processes 4]   (Linux)
+
+1. Sessões: duas chamadas de load_dataset no mesmo processo (como duas sessões do
+   Streamlit) devem devolver colunas que apontam para os mesmos buffers, e todos
+   esses buffers devem estar dentro do arquivo colunar mapeado em memória.
+2. Processos: N processos (como réplicas atrás de um balanceador) carregam o
+   dataset ao mesmo tempo. Para cada um são medidos, em /proc/self/smaps, a memória
+   privada que a carga acrescentou e o PSS do mapeamento do arquivo (a parte das
+   páginas atribuída ao processo: ~tamanho / N quando as páginas são compartilhadas).
+
+Termina com código 1 se alguma coluna tiver sido copiada. """
+
+# Libraries
+import argparse
+import multiprocessing
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, '.')
+from curry_company import loader, store
+
+# =======================================
+# Funções
+# =======================================
+
+def mapped_ranges(path):
+
+    """ Esta função tem a responsabilidade de listar os intervalos de endereço em que o arquivo está mapeado
+
+    Input: Caminho do arquivo
+    Output: Lista de (início, fim) """
+
+    target = os.path.realpath(path)
+    ranges = []
+    with open('/proc/self/maps') as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) >= 6 and parts[5] == target:
+                start, end = (int(address, 16) for address in parts[0].split('-'))
+                ranges.append((start, end))
+    return ranges
+
+def column_buffers(df1):
+
+    """ Esta função tem a responsabilidade de retornar o array de dados de cada coluna
+
+    Colunas categóricas são representadas pelos códigos.
+
+    Input: Dataframe
+    Output: Dicionário coluna -> np.ndarray """
+
+    return {coluna: (df1[coluna].array.codes if isinstance(df1[coluna].dtype, pd.CategoricalDtype) else df1[coluna].to_numpy())
+            for coluna in df1.columns}
+
+def private_columns(df1, path):
+
+    """ Esta função tem a responsabilidade de listar as colunas cujos dados não estão no arquivo mapeado
+
+    Input: Dataframe, caminho do CSV
+    Output: Lista de colunas copiadas para a memória do processo """
+
+    ranges = mapped_ranges(store.store_path(path))
+    return [coluna for coluna, values in column_buffers(df1).items()
+            if not any(start <= values.__array_interface__['data'][0] < end for start, end in ranges)]
+
+def smaps(path = None):
+
+    """ Esta função tem a responsabilidade de somar os campos de /proc/self/smaps (de um arquivo ou do processo)
+
+    Input: Caminho do arquivo mapeado (None: todos os mapeamentos)
+    Output: Dicionário campo -> kB """
+
+    target = path and os.path.realpath(path)
+    totals = {}
+    selected = False
+    with open('/proc/self/smaps') as f:
+        for line in f:
+            parts = line.split()
+            if '-' in parts[0] and not parts[0].endswith(':'):
+                selected = target is None or (len(parts) >= 6 and parts[5] == target)
+            elif selected and len(parts) == 3 and parts[2] == 'kB':
+                totals[parts[0][:-1]] = totals.get(parts[0][:-1], 0) + int(parts[1])
+    return totals
+
+def check_sessions(path):
+    sessao_1, sessao_2 = loader.load_dataset(path), loader.load_dataset(path)
+    buffers_1, buffers_2 = column_buffers(sessao_1), column_buffers(sessao_2)
+    compartilhadas = [coluna for coluna in buffers_1 if np.shares_memory(buffers_1[coluna], buffers_2[coluna])]
+    copiadas = private_columns(sessao_1, path)
+    total = sum(values.nbytes for values in buffers_1.values())
+    print(f'sessões: {len(compartilhadas)}/{len(buffers_1)} colunas com os mesmos buffers, '
+          f'{total / 2 ** 20:.1f} MB no arquivo mapeado, colunas copiadas: {copiadas or "nenhuma"}')
+    return not copiadas and len(compartilhadas) == len(buffers_1)
+
+def replica(path, barrier, results):
+    antes = smaps()['Private_Dirty']
+    df1 = loader.load_dataset(path)
+    # Lê todas as colunas, para que as páginas do arquivo sejam de fato carregadas
+    for values in column_buffers(df1).values():
+        values.view(np.uint8).max()
+    barrier.wait()
+    mapeamento = smaps(store.store_path(path))
+    results.put((os.getpid(), smaps()['Private_Dirty'] - antes, mapeamento.get('Rss', 0), mapeamento.get('Pss', 0), private_columns(df1, path)))
+    barrier.wait()
+
+def check_processes(path, processes):
+    context = multiprocessing.get_context('spawn')
+    barrier, results = context.Barrier(processes), context.Queue()
+    workers = [context.Process(target = replica, args = (path, barrier, results)) for _ in range(processes)]
+    for worker in workers:
+        worker.start()
+    linhas = [results.get(timeout = 600) for _ in workers]
+    for worker in workers:
+        worker.join()
+    print(f'{"processo":>10}{"privada (MB)":>14}{"RSS arquivo (MB)":>18}{"PSS arquivo (MB)":>18}  copiadas')
+    for pid, privada, rss, pss, copiadas in linhas:
+        print(f'{pid:>10}{privada / 1024:>14.1f}{rss / 1024:>18.1f}{pss / 1024:>18.1f}  {copiadas or "nenhuma"}')
+    return not any(copiadas for *_, copiadas in linhas)
+
+def main(argv = None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument('path', nargs = '?', default = loader.DATASET_PATH)
+    parser.add_argument('--processes', type = int, default = 4)
+    args = parser.parse_args(argv)
+
+    loader.build_dataset(args.path)
+    ok = check_sessions(args.path)
+    ok = check_processes(args.path, args.processes) and ok
+    print('ok' if ok else 'FALHOU: há colunas copiadas')
+    sys.exit(0 if ok else 1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,258 @@
+""" Suíte de benchmarks em várias escalas, com dados sintéticos e relatório JSON comparável
+
+Uso: python benchmarks/bench_suite.py [--scales 1e5 1e6] [--json relatorio.json] [--compare base.json]
+                                      [--repeat 5] [--no-pages] [--workdir dataset/synthetic]
+
+Para cada escala, gera (ou reaproveita) um CSV sintético com curry_company.synthetic
+e mede tempo (mediana de --repeat execuções) e pico de memória (tracemalloc, numa
+execução à parte) de:
+
+- leitura e limpeza: read_raw, clean_code, delivery_distance;
+- arquivo colunar e estruturas derivadas: build_dataset, cubo, índice de datas,
+  bitmaps, entregadores distintos, grade espacial, séries temporais, perfis de entregadores;
+- cada KPI de curry_company.kpis, com os filtros padrão da barra lateral e sem filtros;
+- execuções completas das páginas (AppTest do Streamlit, num processo à parte com
+  CURRY_DATASET apontando para o arquivo sintético): primeira execução, rerun sem
+  mudanças e rerun com outro filtro de trânsito; aqui a memória é o pico de RSS do processo.
+
+Escalas acima de --max-memory-rows (padrão 1e7) não cabem na memória: para elas
+só são medidas a geração e a leitura em blocos (ingest_chunked).
+
+Com --compare, cada medida é comparada com a do relatório base: o programa termina
+com código 1 se alguma ficar mais lenta que --tolerance (padrão 25%) e a diferença
+passar de --min-delta-ms (padrão 5 ms, abaixo disso é ruído). """
+
+# Libraries
+import argparse
+import json
+import os
+import platform
+import resource
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, '.')
+from curry_company import ingest, kpis, loader, synthetic
+from curry_company.bitmap import build_bitmaps
+from curry_company.cube import build_cube
+from curry_company.dateindex import build_date_index
+from curry_company.distinct import build_distinct
+from curry_company.geo import delivery_distance
+from curry_company.profiles import build_profiles
+from curry_company.spatial import build_grid
+from curry_company.timeseries import build_timeseries
+
+PAGES = ['pages/1_visao_empresa.py', 'pages/2_visao_entregadores.py', 'pages/3_visao_restaurantes.py']
+
+# Filtros das medidas de KPI: os valores iniciais da barra lateral e nenhum filtro
+SCENARIOS = {
+    'padrao': {'date_start': pd.Timestamp(2022, 2, 11), 'date_end': pd.Timestamp(2022, 3, 3),
+               'Road_traffic_density': ['Low', 'Medium', 'High', 'Jam']},
+    'completo': {},
+}
+
+# =======================================
+# Funções
+# =======================================
+
+def measure(func, repeat):
+
+    """ Esta função tem a responsabilidade de medir tempo e pico de memória de uma função
+
+    O tempo é a mediana de repeat execuções sem tracemalloc (que distorce o tempo
+    de parede); o pico de memória vem de uma execução à parte.
+
+    Input: Função sem argumentos, quantidade de execuções
+    Output: (resultado, segundos, pico em MB) """
+
+    tempos = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        tempos.append(time.perf_counter() - start)
+    del result
+    tracemalloc.start()
+    result = func()
+    peak = tracemalloc.get_traced_memory()[1] / 2 ** 20
+    tracemalloc.stop()
+    return result, statistics.median(tempos), peak
+
+def record(records, rows, stage, seconds, peak_mb = None, **extra):
+    records.append({'rows': rows, 'stage': stage, 'seconds': round(seconds, 6),
+                    'peak_mb': None if peak_mb is None else round(peak_mb, 2), **extra})
+    memoria = '' if peak_mb is None else f'{peak_mb:10.1f} MB'
+    print(f'{rows:>12,} {stage:48}{seconds * 1000:12.1f} ms{memoria}', flush = True)
+
+def dataset_for(workdir, rows, seed):
+
+    """ Esta função tem a responsabilidade de gerar o CSV sintético de uma escala, se ainda não existir
+
+    Input: Diretório dos arquivos, quantidade de linhas, seed
+    Output: (caminho do CSV, segundos gastos na geração ou None se reaproveitado) """
+
+    path = os.path.join(workdir, f'train_{rows}_{seed}.csv')
+    if os.path.exists(path):
+        return path, None
+    start = time.perf_counter()
+    synthetic.write_orders(path, rows, seed = seed)
+    return path, time.perf_counter() - start
+
+def bench_cleaning(records, rows, path, repeat):
+    raw, seconds, peak = measure(lambda: loader.read_raw(path), repeat)
+    record(records, rows, 'read_raw', seconds, peak)
+    df1, seconds, peak = measure(lambda: loader.clean_code(raw), repeat)
+    record(records, rows, 'clean_code', seconds, peak, clean_rows = len(df1))
+    _, seconds, peak = measure(lambda: delivery_distance(df1), repeat)
+    record(records, rows, 'delivery_distance', seconds, peak)
+
+def bench_structures(records, rows, path, repeat):
+    _, seconds, peak = measure(lambda: loader.build_dataset(path, force = True), 1)
+    record(records, rows, 'build_dataset', seconds, peak)
+    df1 = loader.load_dataset(path)
+    builders = {'build_cube': build_cube, 'build_date_index': build_date_index, 'build_bitmaps': build_bitmaps,
+                'build_distinct': build_distinct, 'build_grid': build_grid,
+                'build_timeseries': build_timeseries, 'build_profiles': build_profiles}
+    for stage, builder in builders.items():
+        _, seconds, peak = measure(lambda: builder(df1), repeat)
+        record(records, rows, stage, seconds, peak)
+
+def bench_kpis(records, rows, path, repeat):
+    structures = kpis.load_structures(path)
+    for scenario, filtros in SCENARIOS.items():
+        for name, kpi in kpis.KPIS.items():
+            # Chama o cálculo direto, sem o cache de resultados: mede o custo de cada consulta
+            _, seconds, peak = measure(lambda: kpi['compute'](structures, filtros), repeat)
+            record(records, rows, f'kpi/{name}/{scenario}', seconds, peak)
+
+def bench_ingest(records, rows, path):
+    _, seconds, peak = measure(lambda: ingest.ingest_chunked(path), 1)
+    record(records, rows, 'ingest_chunked', seconds, peak)
+
+def page_reruns(path):
+
+    """ Esta função tem a responsabilidade de medir execuções completas das páginas (processo filho)
+
+    Roda no processo criado por bench_pages, com CURRY_DATASET apontando para o
+    CSV. Entre as medidas, espera o aquecimento das seções escondidas terminar,
+    para que ele não conte no tempo da medida seguinte.
+
+    Input: Caminho do CSV
+    Output: Lista de (estágio, segundos) """
+
+    from streamlit.testing.v1 import AppTest
+    from curry_company.sections import pending_prefetches
+
+    def timed_run(run):
+        start = time.perf_counter()
+        at = run()
+        seconds = time.perf_counter() - start
+        if at.exception:
+            raise RuntimeError(at.exception[0].value)
+        while pending_prefetches():
+            time.sleep(0.01)
+        return at, seconds
+
+    loader.build_dataset(path)
+    resultado = []
+    for page in PAGES:
+        nome = os.path.basename(page)[:-3]
+        at, seconds = timed_run(lambda: AppTest.from_file(page, default_timeout = 600).run())
+        resultado.append((f'page/{nome}/primeira', seconds))
+        at, seconds = timed_run(lambda: at.run())
+        resultado.append((f'page/{nome}/rerun', seconds))
+        at, seconds = timed_run(lambda: at.sidebar.multiselect[0].set_value(['Low', 'Jam']).run())
+        resultado.append((f'page/{nome}/filtro', seconds))
+    return resultado
+
+def bench_pages(records, rows, path):
+    # Sem o pré-cálculo em segundo plano, que disputaria a CPU com as execuções medidas
+    env = dict(os.environ, CURRY_DATASET = path, CURRY_PRECOMPUTE = '0')
+    output = subprocess.run([sys.executable, __file__, '--page-reruns', path], env = env, check = True,
+                            capture_output = True, text = True).stdout
+    result = json.loads(output.splitlines()[-1])
+    for stage, seconds in result['stages']:
+        record(records, rows, stage, seconds, rss_mb = result['rss_mb'])
+
+def environment():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output = True, text = True).stdout.strip()
+    except OSError:
+        commit = None
+    return {'date': datetime.now().isoformat(timespec = 'seconds'), 'commit': commit, 'python': platform.python_version(),
+            'pandas': pd.__version__, 'numpy': np.__version__, 'machine': platform.machine(), 'cpus': os.cpu_count()}
+
+def compare(report, baseline, tolerance, min_delta_ms):
+
+    """ Esta função tem a responsabilidade de comparar um relatório com um relatório base
+
+    Input: Relatório atual, relatório base, tolerância relativa, diferença mínima em ms
+    Output: Lista de medidas que ficaram mais lentas """
+
+    base = {(item['rows'], item['stage']): item['seconds'] for item in baseline['results']}
+    regressoes = []
+    print(f'\n{"linhas":>12} {"estágio":48}{"base (ms)":>12}{"atual (ms)":>12}{"razão":>8}')
+    for item in report['results']:
+        antes = base.get((item['rows'], item['stage']))
+        if antes is None:
+            continue
+        razao = item['seconds'] / antes if antes else float('inf')
+        pior = razao > 1 + tolerance and (item['seconds'] - antes) * 1000 > min_delta_ms
+        if pior:
+            regressoes.append(item['stage'])
+        print(f'{item["rows"]:>12,} {item["stage"]:48}{antes * 1000:12.1f}{item["seconds"] * 1000:12.1f}{razao:8.2f}{"  <- mais lento" if pior else ""}')
+    return regressoes
+
+def main(argv = None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--scales', nargs = '+', default = ['1e5', '1e6'], help = 'linhas por arquivo (aceita 1e6)')
+    parser.add_argument('--seed', type = int, default = 0)
+    parser.add_argument('--workdir', default = 'dataset/synthetic', help = 'onde os CSVs sintéticos são gerados e reaproveitados')
+    parser.add_argument('--repeat', type = int, default = 5)
+    parser.add_argument('--max-memory-rows', default = '1e7', help = 'acima disso, só geração e leitura em blocos')
+    parser.add_argument('--no-pages', action = 'store_true', help = 'não mede as execuções das páginas')
+    parser.add_argument('--json', help = 'grava o relatório neste arquivo')
+    parser.add_argument('--compare', help = 'relatório base para detectar regressões')
+    parser.add_argument('--tolerance', type = float, default = 0.25)
+    parser.add_argument('--min-delta-ms', type = float, default = 5)
+    parser.add_argument('--page-reruns', help = argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.page_reruns:
+        stages = page_reruns(args.page_reruns)
+        print(json.dumps({'stages': stages, 'rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024}))
+        return
+
+    records = []
+    for scale in args.scales:
+        rows = int(float(scale))
+        path, seconds = dataset_for(args.workdir, rows, args.seed)
+        if seconds is not None:
+            record(records, rows, 'generate', seconds)
+        if rows > float(args.max_memory_rows):
+            bench_ingest(records, rows, path)
+            continue
+        bench_cleaning(records, rows, path, args.repeat)
+        bench_structures(records, rows, path, args.repeat)
+        bench_kpis(records, rows, path, args.repeat)
+        if not args.no_pages:
+            bench_pages(records, rows, path)
+
+    report = {'environment': environment(), 'repeat': args.repeat, 'results': records}
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent = 2)
+    if args.compare:
+        with open(args.compare) as f:
+            regressoes = compare(report, json.load(f), args.tolerance, args.min_delta_ms)
+        print(f'\n{len(regressoes)} medidas mais lentas que a base' if regressoes else '\nnenhuma regressão')
+        sys.exit(1 if regressoes else 0)
+
+if __name__ == '__main__':
+    main()
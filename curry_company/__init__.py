@@ -0,0 +1,7 @@
+""" Curry Company - camada compartilhada de dados do Growth Dashboard
+
+Este pacote concentra a leitura e a limpeza do dataset para que as páginas
+do Streamlit apenas consumam o dataframe já tratado. Os KPIs ficam em
+curry_company.kpis (sem Streamlit) e são servidos em JSON por curry_company.api. """
+
+from curry_company.loader import clean_code, load_dataset
@@ -0,0 +1,72 @@
+""" Linha de comando do pacote: python -m curry_company <comando> """
+
+# Libraries
+import argparse
+import asyncio
+
+from curry_company import append, ingest, loader, store, synthetic
+
+# =======================================
+# Comandos
+# =======================================
+
+def build(args):
+    print(loader.build_dataset(args.csv, force = args.force))
+
+def ingest_chunked(args):
+    aggs = ingest.ingest_chunked(args.csv, chunksize = args.chunksize)
+    meta = {'source_hash': store.file_hash(args.csv), 'segments': []}
+    print(ingest.save_aggregates(aggs, args.output or ingest.aggregates_path(args.csv), meta))
+
+def append_orders(args):
+    for batch in args.batch:
+        print(batch, append.append_orders(batch, args.dataset))
+
+def generate(args):
+    print(synthetic.write_orders(args.csv, int(float(args.rows)), seed = args.seed, days = args.days, dirt = args.dirt))
+
+def serve(args):
+    # Importado aqui: o Tornado só é necessário para a API
+    from curry_company import api
+    print('API em http://%s:%d/kpis' % (args.address or 'localhost', args.port))
+    asyncio.run(api.serve(args.port, args.dataset, args.address))
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(prog = 'python -m curry_company', description = 'Ferramentas de dados do Curry Company Growth Dashboard.')
+    commands = parser.add_subparsers(dest = 'command', required = True)
+
+    cmd = commands.add_parser('build', help = 'gera o arquivo colunar com o dataset limpo')
+    cmd.add_argument('csv', nargs = '?', default = loader.DATASET_PATH)
+    cmd.add_argument('--force', action = 'store_true', help = 'reconstrói mesmo se o arquivo estiver atualizado')
+    cmd.set_defaults(func = build)
+
+    cmd = commands.add_parser('ingest', help = 'lê o CSV em blocos e grava apenas os agregados (datasets maiores que a memória)')
+    cmd.add_argument('csv', nargs = '?', default = loader.DATASET_PATH)
+    cmd.add_argument('--chunksize', type = int, default = ingest.DEFAULT_CHUNKSIZE, help = 'linhas lidas por bloco')
+    cmd.add_argument('--output', help = 'diretório de saída (padrão: ao lado do CSV)')
+    cmd.set_defaults(func = ingest_chunked)
+
+    cmd = commands.add_parser('append', help = 'anexa lotes de pedidos novos sem reprocessar o histórico')
+    cmd.add_argument('batch', nargs = '+', help = 'CSV no formato do train.csv')
+    cmd.add_argument('--dataset', default = loader.DATASET_PATH)
+    cmd.set_defaults(func = append_orders)
+
+    cmd = commands.add_parser('generate', help = 'gera um CSV sintético no formato do train.csv (benchmarks)')
+    cmd.add_argument('csv')
+    cmd.add_argument('--rows', default = '1e6', help = 'quantidade de linhas (aceita 1e6)')
+    cmd.add_argument('--seed', type = int, default = 0)
+    cmd.add_argument('--days', type = int, default = synthetic.DEFAULT_DAYS, help = 'dias a partir de %s' % synthetic.START_DATE)
+    cmd.add_argument('--dirt', type = float, default = synthetic.DEFAULT_DIRT, help = "fração de sentinelas 'NaN ' por coluna")
+    cmd.set_defaults(func = generate)
+
+    cmd = commands.add_parser('serve', help = 'inicia a API HTTP com os KPIs em JSON')
+    cmd.add_argument('--port', type = int, default = 8000)
+    cmd.add_argument('--address', default = '', help = 'endereço de escuta (padrão: todos)')
+    cmd.add_argument('--dataset', default = loader.DATASET_PATH)
+    cmd.set_defaults(func = serve)
+
+    args = parser.parse_args(argv)
+    args.func(args)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+# Libraries
+import numpy as np
+import pandas as pd
+
+from curry_company.dateindex import day_numbers, week_of_year
+
+# Momentos guardados por grupo: permitem juntar parciais e calcular média e desvio padrão depois
+MOMENTS = ['count', 'sum', 'sumsq', 'min', 'max']
+
+# =======================================
+# Funções
+# =======================================
+
+def moments(df, keys, value):
+
+    """ Esta função tem a responsabilidade de calcular os momentos de uma coluna por grupo
+
+    Input: Dataframe, colunas de agrupamento, coluna de valor
+    Output: Dataframe indexado pelas chaves com count, sum, sumsq, min e max """
+
+    values = df[value].astype('float64')
+    df_aux = df.loc[:, keys].assign(value = values, value_sq = values * values)
+    return df_aux.groupby(keys, observed = True).agg(count = ('value', 'count'),
+                                                      sum = ('value', 'sum'),
+                                                      sumsq = ('value_sq', 'sum'),
+                                                      min = ('value', 'min'),
+                                                      max = ('value', 'max'))
+
+def merge_moments(*frames):
+
+    """ Esta função tem a responsabilidade de juntar momentos parciais calculados em pedaços diferentes dos dados
+
+    Input: Dataframes de momentos com as mesmas chaves
+    Output: Dataframe de momentos combinado """
+
+    frames = [frame for frame in frames if frame is not None and len(frame)]
+    if not frames:
+        return None
+    if len(frames) == 1:
+        return frames[0]
+    df_aux = pd.concat(frames)
+    return df_aux.groupby(level = list(range(df_aux.index.nlevels)), observed = True).agg({'count': 'sum', 'sum': 'sum', 'sumsq': 'sum', 'min': 'min', 'max': 'max'})
+
+def finalize(df_moments, prefix = ''):
+
+    """ Esta função tem a responsabilidade de transformar momentos em média e desvio padrão
+
+    O desvio padrão é o amostral (ddof=1), o mesmo do pandas.
+
+    Input: Dataframe de momentos
+    Output: Dataframe com as colunas mean e std (com o prefixo opcional) """
+
+    count = df_moments['count'].astype('float64')
+    mean = df_moments['sum'] / count.where(count > 0)
+    var = (df_moments['sumsq'] - df_moments['sum'] * mean) / (count - 1).where(count > 1)
+    std = np.sqrt(var.clip(lower = 0))
+    return pd.DataFrame({prefix + 'mean': mean, prefix + 'std': std})
+
+def weekly_orders(daily_orders):
+
+    """ Esta função tem a responsabilidade de somar os pedidos diários por semana do ano
+
+    Input: Dataframe de pedidos indexado pelo dia
+    Output: Dataframe de pedidos por semana ('%U', como na página da empresa) """
+
+    week = pd.Index(week_of_year(day_numbers(daily_orders.index)), name = 'week_of_year')
+    return daily_orders.groupby(week).sum()
@@ -0,0 +1,269 @@
+""" API HTTP assíncrona com os KPIs do painel em JSON
+
+Rotas:
+
+- GET /kpis: nomes dos KPIs e filtros aceitos
+- GET /kpis/<nome>?date_start=2022-02-11&date_end=2022-03-03&Road_traffic_density=Low,Jam
+  (listas separadas por vírgula ou parâmetro repetido; date_end é exclusiva, como na barra lateral)
+- GET /stats: uso dos caches de respostas e de resultados e último pré-cálculo (ver curry_company.precompute)
+- GET /metrics: tempos por KPI no formato texto do Prometheus (ver curry_company.profiling)
+- GET /health
+
+O ETag de uma resposta é o hash de (KPI, filtros normalizados, versão do
+dataset): o mesmo pedido com If-None-Match recebe 304 sem nenhum cálculo. O
+corpo JSON fica num cache LRU próprio (CURRY_API_BYTES, padrão 16 MB), e os
+cálculos rodam num pool de threads (CURRY_API_WORKERS, padrão 4) para não
+bloquear o loop; pedidos iguais simultâneos esperam o mesmo cálculo.
+
+Iniciar: python -m curry_company serve [--port 8000] """
+
+# Libraries
+import asyncio
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+import tornado.web
+
+from curry_company import kpis, precompute, profiling
+from curry_company.loader import DATASET_PATH, current_snapshot, load_version, using
+from curry_company.results import cache_stats, normalize_filters
+
+DEFAULT_BUDGET = 16 * 2 ** 20
+DEFAULT_WORKERS = 4
+DEFAULT_PORT = 8000
+
+# Respostas: chave -> (ETag, corpo), da usada há mais tempo para a mais recente
+_responses = OrderedDict()
+_stats = {'hits': 0, 'misses': 0, 'not_modified': 0, 'evictions': 0, 'bytes': 0}
+_budget = int(os.environ.get('CURRY_API_BYTES', DEFAULT_BUDGET))
+_lock = threading.Lock()
+
+_executor = ThreadPoolExecutor(max_workers = int(os.environ.get('CURRY_API_WORKERS', DEFAULT_WORKERS)), thread_name_prefix = 'curry-api')
+
+# Cálculos em andamento no loop: chave -> asyncio.Future
+_inflight = {}
+
+# =======================================
+# Funções
+# =======================================
+
+def parse_filters(arguments):
+
+    """ Esta função tem a responsabilidade de converter os parâmetros da URL nos filtros dos KPIs
+
+    Input: Dicionário parâmetro -> lista de valores (bytes), como o request.arguments do Tornado
+    Output: Dicionário de filtros (ValueError para parâmetros desconhecidos ou datas inválidas) """
+
+    filtros = {}
+    for nome, valores in arguments.items():
+        if nome not in kpis.FILTERS:
+            raise ValueError('filtro desconhecido: %s' % nome)
+        valores = [item.strip() for valor in valores for item in valor.decode().split(',') if item.strip()]
+        if nome in ('date_start', 'date_end'):
+            if len(valores) != 1:
+                raise ValueError('%s precisa de uma única data' % nome)
+            filtros[nome] = pd.Timestamp(valores[0])
+        else:
+            filtros[nome] = valores
+    return filtros
+
+def response_key(name, filtros, path = DATASET_PATH, snapshot = None):
+
+    """ Esta função tem a responsabilidade de montar a chave e o ETag de uma resposta
+
+    Input: Nome do KPI, filtros, caminho do dataset, versão do dataset (Snapshot; padrão: a atual)
+    Output: (chave, ETag) """
+
+    version = snapshot.version if snapshot is not None else load_version(path)
+    key = (name, normalize_filters(filtros), path, version)
+    etag = '"%s"' % hashlib.blake2b(repr(key).encode(), digest_size = 16).hexdigest()
+    return key, etag
+
+def render_kpi(name, filtros, path = DATASET_PATH, snapshot = None):
+
+    """ Esta função tem a responsabilidade de calcular um KPI e gerar o corpo JSON da resposta
+
+    Input: Nome do KPI, filtros, caminho do dataset, versão do dataset (Snapshot; padrão: a atual)
+    Output: Corpo (bytes) """
+
+    # Cada cálculo é medido como um rerun da "página" api
+    with using(snapshot), profiling.rerun('api'):
+        result = kpis.compute_kpi(name, filtros, path)
+        with profiling.stage('json/' + name):
+            payload = {'kpi': name,
+                       'filters': {nome: (valor.isoformat() if isinstance(valor, pd.Timestamp) else valor) for nome, valor in filtros.items()},
+                       'data': kpis.to_jsonable(result, kpis.KPIS[name].get('fields'))}
+            return json.dumps(payload, ensure_ascii = False, allow_nan = False).encode()
+
+def _cached_body(key):
+    with _lock:
+        cached = _responses.get(key)
+        if cached is not None:
+            _responses.move_to_end(key)
+            _stats['hits'] += 1
+        return cached
+
+def _store_body(key, etag, body):
+    with _lock:
+        if key in _responses or len(body) > _budget:
+            return
+        # Respostas de versões anteriores do dataset não voltam a ser pedidas
+        for old in [old for old in _responses if old[2] == key[2] and old[3] != key[3]]:
+            _stats['bytes'] -= len(_responses.pop(old)[1])
+        _responses[key] = (etag, body)
+        _stats['bytes'] += len(body)
+        while _stats['bytes'] > _budget:
+            _stats['bytes'] -= len(_responses.popitem(last = False)[1][1])
+            _stats['evictions'] += 1
+
+async def kpi_etag(name, filtros, path = DATASET_PATH):
+
+    """ Esta função tem a responsabilidade de obter a chave e o ETag de um pedido sem bloquear o loop
+
+    A versão do dataset é conferida no pool de threads (pode esperar a carga do
+    dataset) e devolvida junto: o corpo é calculado nessa mesma versão, mesmo
+    que outra seja publicada no meio do pedido.
+
+    Input: Nome do KPI, filtros, caminho do dataset
+    Output: (chave, ETag, Snapshot) """
+
+    snapshot = await asyncio.get_running_loop().run_in_executor(_executor, current_snapshot, path)
+    return response_key(name, filtros, path, snapshot) + (snapshot,)
+
+async def kpi_body(key, etag, name, filtros, path = DATASET_PATH, snapshot = None):
+
+    """ Esta função tem a responsabilidade de obter o corpo JSON de um KPI, do cache ou calculando-o no pool
+
+    Input: Chave, ETag e Snapshot de kpi_etag, nome do KPI, filtros, caminho do dataset
+    Output: Corpo (bytes) """
+
+    cached = _cached_body(key)
+    if cached is not None:
+        return cached[1]
+    future = _inflight.get(key)
+    if future is not None:
+        return await asyncio.shield(future)
+    with _lock:
+        _stats['misses'] += 1
+    future = _inflight[key] = asyncio.get_running_loop().run_in_executor(_executor, render_kpi, name, filtros, path, snapshot)
+    try:
+        body = await future
+    finally:
+        _inflight.pop(key, None)
+    _store_body(key, etag, body)
+    return body
+
+def response_stats():
+
+    """ Esta função tem a responsabilidade de informar o uso do cache de respostas
+
+    Input: None
+    Output: Dicionário com hits, misses, not_modified, evictions, entries, bytes e budget """
+
+    with _lock:
+        return dict(_stats, entries = len(_responses), budget = _budget)
+
+def _etag_matches(header, etag):
+    return header is not None and (header.strip() == '*' or etag in [item.strip() for item in header.split(',')])
+
+class JSONHandler(tornado.web.RequestHandler):
+
+    """ Handler base: respostas e erros em JSON """
+
+    def initialize(self, path = DATASET_PATH):
+        self.path = path
+
+    def write_json(self, obj):
+        self.set_header('Content-Type', 'application/json; charset=utf-8')
+        self.finish(json.dumps(obj, ensure_ascii = False))
+
+    def write_error(self, status_code, **kwargs):
+        error = kwargs.get('exc_info', (None, None))[1]
+        if isinstance(error, tornado.web.HTTPError) and error.log_message:
+            message = error.log_message % error.args if error.args else error.log_message
+        else:
+            message = self._reason
+        self.set_header('Content-Type', 'application/json; charset=utf-8')
+        self.finish(json.dumps({'error': message}, ensure_ascii = False))
+
+    def compute_etag(self):
+        # O ETag é definido pelos handlers a partir da chave, não do corpo
+        return None
+
+class KpiListHandler(JSONHandler):
+
+    def get(self):
+        self.write_json({'kpis': list(kpis.KPIS), 'filters': kpis.FILTERS})
+
+class KpiHandler(JSONHandler):
+
+    async def get(self, name):
+        if name not in kpis.KPIS:
+            raise tornado.web.HTTPError(404, 'KPI desconhecido: %s', name)
+        try:
+            filtros = parse_filters(self.request.arguments)
+        except ValueError as error:
+            raise tornado.web.HTTPError(400, '%s', error)
+        key, etag, snapshot = await kpi_etag(name, filtros, self.path)
+        self.set_header('ETag', etag)
+        # Os clientes podem guardar a resposta, mas devem revalidá-la (304 se o dataset não mudou)
+        self.set_header('Cache-Control', 'no-cache')
+        if _etag_matches(self.request.headers.get('If-None-Match'), etag):
+            with _lock:
+                _stats['not_modified'] += 1
+            self.set_status(304)
+            self.finish()
+            return
+        body = await kpi_body(key, etag, name, filtros, self.path, snapshot)
+        self.set_header('Content-Type', 'application/json; charset=utf-8')
+        self.finish(body)
+
+class StatsHandler(JSONHandler):
+
+    def get(self):
+        self.write_json({'responses': response_stats(), 'results': cache_stats(), 'precompute': precompute.scheduler_status(self.path)})
+
+class MetricsHandler(JSONHandler):
+
+    def get(self):
+        self.set_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.finish(profiling.prometheus_text())
+
+class HealthHandler(JSONHandler):
+
+    def get(self):
+        self.write_json({'status': 'ok'})
+
+def make_app(path = DATASET_PATH):
+
+    """ Esta função tem a responsabilidade de montar a aplicação Tornado da API
+
+    Input: Caminho do dataset
+    Output: tornado.web.Application """
+
+    options = {'path': path}
+    return tornado.web.Application([
+        (r'/kpis', KpiListHandler, options),
+        (r'/kpis/([A-Za-z0-9_]+)', KpiHandler, options),
+        (r'/stats', StatsHandler, options),
+        (r'/metrics', MetricsHandler, options),
+        (r'/health', HealthHandler, options),
+    ])
+
+async def serve(port = DEFAULT_PORT, path = DATASET_PATH, address = ''):
+
+    """ Esta função tem a responsabilidade de carregar o dataset e atender a API até o processo terminar
+
+    Input: Porta, caminho do dataset, endereço
+    Output: None """
+
+    # Carrega o dataset e as estruturas antes de aceitar conexões
+    await asyncio.get_running_loop().run_in_executor(_executor, kpis.load_structures, path)
+    precompute.start_scheduler(path)
+    make_app(path).listen(port, address = address)
+    await asyncio.Event().wait()
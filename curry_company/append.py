@@ -0,0 +1,71 @@
+""" Inclusão incremental de novos pedidos
+
+Um lote de pedidos é limpo sozinho, gravado como um novo arquivo de lote ao lado
+do arquivo colunar (com os IDs codificados pelos mesmos dicionários) e
+incorporado aos agregados gravados (pedidos por semana,
+entregadores únicos por semana, avaliação por entregador, momentos do tempo por
+cidade, cubo). O custo depende do tamanho do lote e não do histórico. """
+
+# Libraries
+import pandas as pd
+
+from curry_company import encoding, ingest, loader, store
+
+# =======================================
+# Funções
+# =======================================
+
+def _aggregates_meta(csv_path, segments):
+    return {'source_hash': store.store_meta(csv_path)['source_hash'], 'segments': list(segments)}
+
+def current_aggregates(csv_path = loader.DATASET_PATH):
+
+    """ Esta função tem a responsabilidade de carregar os agregados gravados, se corresponderem ao dataset atual
+
+    Se o CSV mudou ou os agregados não existem, eles são reconstruídos uma vez a partir
+    do arquivo colunar (CSV + lotes já anexados).
+
+    Input: Caminho do CSV
+    Output: Dicionário de agregados """
+
+    loader.build_dataset(csv_path)
+    directory = ingest.aggregates_path(csv_path)
+    segments = store.list_segments(csv_path)
+    meta = _aggregates_meta(csv_path, segments)
+    if ingest.load_meta(directory) == meta:
+        return ingest.load_aggregates(directory)
+    df1 = store.read_store(csv_path, segments)
+    dictionaries = encoding.load_dictionaries(encoding.dictionaries_path(csv_path), ['Delivery_person_ID'])
+    aggs = ingest.fold({}, ingest.chunk_aggregates(encoding.decode_columns(df1, dictionaries)))
+    ingest.save_aggregates(aggs, directory, meta)
+    return aggs
+
+def append_orders(batch, csv_path = loader.DATASET_PATH):
+
+    """ Esta função tem a responsabilidade de incluir um lote de pedidos novos no dataset
+
+    Parâmetros:
+        - batch: caminho de um CSV no formato do train.csv ou dataframe com as linhas brutas
+        - csv_path: dataset ao qual o lote é anexado
+
+    Input: Lote de pedidos, caminho do dataset
+    Output: Quantidade de pedidos válidos incluídos """
+
+    if isinstance(batch, pd.DataFrame):
+        df = loader.coerce_raw(batch)
+    else:
+        df = loader.read_raw(batch)
+    df1 = loader.clean_code(df)
+    if df1.empty:
+        return 0
+
+    aggs = current_aggregates(csv_path)
+
+    # Os dicionários são gravados antes do lote: só crescem, então nunca ficam atrás dos códigos
+    directory = encoding.dictionaries_path(csv_path)
+    encoded, dictionaries = encoding.encode_columns(df1, encoding.load_dictionaries(directory))
+    encoding.save_dictionaries(dictionaries, directory)
+    store.append_segment(encoded, csv_path)
+    aggs = ingest.fold(aggs, ingest.chunk_aggregates(df1))
+    ingest.save_aggregates(aggs, ingest.aggregates_path(csv_path), _aggregates_meta(csv_path, store.list_segments(csv_path)))
+    return len(df1)
@@ -0,0 +1,89 @@
+""" Índices bitmap para os filtros de múltipla escolha da barra lateral
+
+Para cada valor das colunas de baixa cardinalidade (trânsito, clima, festival) é
+guardado um bitmap com um bit por linha do dataset, empacotado em palavras de 64
+bits. Um multiselect vira o OR dos bitmaps dos valores escolhidos e filtros de
+colunas diferentes são combinados com AND; o custo depende de linhas / 64 e não do
+tamanho dos textos. Com o dataset ordenado por data (ver dateindex), apenas as
+palavras da fatia de datas selecionada entram na conta. """
+
+# Libraries
+import numpy as np
+
+BITMAP_COLUMNS = ['Road_traffic_density', 'Weatherconditions', 'Festival']
+
+# =======================================
+# Funções
+# =======================================
+
+def _pack(linhas_selecionadas):
+
+    """ Esta função tem a responsabilidade de empacotar uma máscara booleana em palavras de 64 bits
+
+    Input: Máscara booleana (uma posição por linha)
+    Output: Array uint64 com 64 linhas por palavra (bytes de np.packbits, completados com zeros) """
+
+    rows = len(linhas_selecionadas)
+    packed = np.zeros(-(-rows // 64) * 8, dtype = np.uint8)
+    packed[:-(-rows // 8)] = np.packbits(linhas_selecionadas, bitorder = 'little')
+    return packed.view(np.uint64)
+
+def build_bitmaps(df1, columns = BITMAP_COLUMNS):
+
+    """ Esta função tem a responsabilidade de montar os bitmaps de cada valor das colunas categóricas
+
+    Input: Dataframe limpo, colunas indexadas
+    Output: Dicionário com rows (quantidade de linhas) e bitmaps {coluna: {valor: palavras}} """
+
+    bitmaps = {}
+    for coluna in columns:
+        codes = df1[coluna].cat.codes.to_numpy()
+        categories = df1[coluna].cat.categories
+        bitmaps[coluna] = {label: _pack(codes == code) for code, label in enumerate(categories)}
+    return {'rows': len(df1), 'bitmaps': bitmaps}
+
+def select_mask(index, start = 0, stop = None, **filters):
+
+    """ Esta função tem a responsabilidade de resolver os filtros de múltipla escolha com operações bit a bit
+
+    Parâmetros:
+        - start, stop: posições das linhas consideradas (ex.: fatia de datas)
+        - filters: coluna = lista de valores aceitos (ex.: Road_traffic_density = ['Low', 'Jam'])
+
+    Input: Índice bitmap, intervalo de linhas, filtros
+    Output: Máscara booleana com uma posição por linha do intervalo """
+
+    if stop is None:
+        stop = index['rows']
+    first, last = start // 64, -(-stop // 64)
+    words = np.full(last - first, np.iinfo(np.uint64).max, dtype = np.uint64)
+    for coluna, values in filters.items():
+        bitmaps = index['bitmaps'][coluna]
+        selected = np.zeros(last - first, dtype = np.uint64)
+        for value in values:
+            if value in bitmaps:
+                selected |= bitmaps[value][first:last]
+        words &= selected
+    bits = np.unpackbits(words.view(np.uint8), bitorder = 'little')
+    return bits[start - first * 64:stop - first * 64].view(bool)
+
+def select_rows(df1, index, start = 0, stop = None, **filters):
+
+    """ Esta função tem a responsabilidade de aplicar os filtros de múltipla escolha dentro de um intervalo de linhas
+
+    Sem índice (ou com um índice de outra versão do dataset) os bitmaps do intervalo são
+    montados na hora.
+
+    Input: Dataframe limpo, índice bitmap, intervalo de linhas, filtros
+    Output: Dataframe filtrado (sem cópia se todas as linhas do intervalo forem aceitas) """
+
+    if stop is None:
+        stop = len(df1)
+    if index is None or index['rows'] != len(df1):
+        df1 = df1.iloc[start:stop]
+        index, start, stop = build_bitmaps(df1, list(filters)), 0, len(df1)
+    linhas_selecionadas = select_mask(index, start, stop, **filters)
+    df1 = df1.iloc[start:stop]
+    if linhas_selecionadas.all():
+        return df1
+    return df1.iloc[np.flatnonzero(linhas_selecionadas)]
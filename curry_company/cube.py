@@ -0,0 +1,127 @@
+""" Cubo pré-agregado para os filtros da barra lateral
+
+Cada célula do cubo é uma combinação de Order_Date x City x Road_traffic_density x
+Weatherconditions x Festival x Type_of_order e guarda a quantidade de pedidos e os
+momentos (count, sum, sumsq, min, max) de cada medida. Os gráficos filtram as
+células e somam os momentos, num custo proporcional ao número de células e não
+ao número de pedidos. """
+
+# Libraries
+import pandas as pd
+
+from curry_company.aggregates import MOMENTS, finalize
+
+DIMENSIONS = ['Order_Date', 'City', 'Road_traffic_density', 'Weatherconditions', 'Festival', 'Type_of_order']
+
+# Medida -> prefixo das colunas de momentos no cubo
+MEASURES = {
+    'Time_taken(min)': 'time_',
+    'Delivery_person_Ratings': 'rating_',
+    'distance': 'distance_',
+}
+
+# Forma de somar cada momento ao juntar células
+_MOMENT_AGG = {'count': 'sum', 'sum': 'sum', 'sumsq': 'sum', 'min': 'min', 'max': 'max'}
+
+# =======================================
+# Funções
+# =======================================
+
+def _aggregations():
+    aggs = {'orders': 'sum'}
+    for prefix in MEASURES.values():
+        for moment in MOMENTS:
+            aggs[prefix + moment] = _MOMENT_AGG[moment]
+    return aggs
+
+def build_cube(df1):
+
+    """ Esta função tem a responsabilidade de montar o cubo a partir do dataframe limpo
+
+    Input: Dataframe limpo
+    Output: Dataframe com uma linha por célula (dimensões como colunas) """
+
+    df_aux = df1.loc[:, DIMENSIONS]
+    aggs = {}
+    for measure, prefix in MEASURES.items():
+        values = df1[measure].astype('float64')
+        df_aux[prefix + 'value'] = values
+        df_aux[prefix + 'value_sq'] = values * values
+        aggs[prefix + 'count'] = (prefix + 'value', 'count')
+        aggs[prefix + 'sum'] = (prefix + 'value', 'sum')
+        aggs[prefix + 'sumsq'] = (prefix + 'value_sq', 'sum')
+        aggs[prefix + 'min'] = (prefix + 'value', 'min')
+        aggs[prefix + 'max'] = (prefix + 'value', 'max')
+    df_aux['orders'] = 1
+    aggs['orders'] = ('orders', 'sum')
+    return df_aux.groupby(DIMENSIONS, observed = True).agg(**aggs).reset_index()
+
+def merge_cubes(*cubes):
+
+    """ Esta função tem a responsabilidade de juntar cubos montados em partes diferentes dos dados
+
+    Input: Cubos
+    Output: Cubo combinado """
+
+    cubes = [cube for cube in cubes if cube is not None and len(cube)]
+    df_aux = pd.concat(cubes, ignore_index = True)
+    return df_aux.groupby(DIMENSIONS, observed = True).agg(_aggregations()).reset_index()
+
+def update_cube(cube, df1):
+
+    """ Esta função tem a responsabilidade de incorporar ao cubo apenas os pedidos novos
+
+    Input: Cubo, dataframe limpo com os pedidos novos
+    Output: Cubo atualizado """
+
+    return merge_cubes(cube, build_cube(df1))
+
+def slice_cube(cube, date_start = None, date_end = None, **filters):
+
+    """ Esta função tem a responsabilidade de selecionar as células que atendem aos filtros
+
+    Parâmetros:
+        - date_start: primeira data incluída
+        - date_end: data limite (exclusiva, como o fim do intervalo da barra lateral)
+        - filters: dimensão = lista de valores aceitos, ex.: Road_traffic_density = ['Low', 'Jam']
+
+    Input: Cubo
+    Output: Células selecionadas """
+
+    linhas_selecionadas = pd.Series(True, index = cube.index)
+    if date_start is not None:
+        linhas_selecionadas &= cube['Order_Date'] >= date_start
+    if date_end is not None:
+        linhas_selecionadas &= cube['Order_Date'] < date_end
+    for dimension, values in filters.items():
+        if values is not None:
+            linhas_selecionadas &= cube[dimension].isin(values)
+    return cube.loc[linhas_selecionadas, :]
+
+def rollup(cells, by, measure = None):
+
+    """ Esta função tem a responsabilidade de consolidar as células por um conjunto de dimensões
+
+    Input: Células do cubo, dimensões do resultado, medida opcional
+    Output: Dataframe com 'orders' e, se houver medida, as colunas avg_/std_/min_/max_ da medida """
+
+    df_aux = cells.groupby(by, observed = True).agg(_aggregations())
+    result = df_aux[['orders']]
+    if measure is not None:
+        prefix = MEASURES[measure]
+        stats = df_aux[[prefix + moment for moment in MOMENTS]]
+        stats.columns = MOMENTS
+        result = result.join(finalize(stats)).assign(min = stats['min'], max = stats['max'])
+    return result.reset_index()
+
+def total(cells, measure):
+
+    """ Esta função tem a responsabilidade de consolidar todas as células em um único resultado
+
+    Input: Células do cubo, medida
+    Output: Series com count, mean, std, min e max da medida """
+
+    prefix = MEASURES[measure]
+    stats = cells[[prefix + moment for moment in MOMENTS]].agg({prefix + moment: _MOMENT_AGG[moment] for moment in MOMENTS})
+    stats.index = MOMENTS
+    return pd.concat([stats, finalize(stats.to_frame().T).iloc[0]])
@@ -0,0 +1,100 @@
+""" Índice de datas sobre o dataset ordenado por Order_Date
+
+O dataframe limpo fica fisicamente ordenado pela data do pedido. O índice guarda,
+para cada dia, a posição da primeira linha daquele dia; um intervalo de datas
+vira duas buscas binárias (searchsorted) e uma fatia de linhas contíguas (iloc),
+que com copy-on-write não copia nenhum dado. Os demais filtros (trânsito, clima)
+são aplicados apenas dentro da fatia. """
+
+# Libraries
+import numpy as np
+import pandas as pd
+
+# Rótulos '%U' das semanas do ano ('00' a '53')
+WEEK_LABELS = np.array(['%02d' % week for week in range(54)], dtype = object)
+
+# =======================================
+# Funções
+# =======================================
+
+def sort_by_date(df1):
+
+    """ Esta função tem a responsabilidade de manter o dataframe limpo ordenado por Order_Date
+
+    A ordenação é estável (pedidos do mesmo dia mantêm a ordem de chegada) e só
+    acontece quando necessário, por exemplo quando um lote anexado traz datas antigas.
+
+    Input: Dataframe limpo
+    Output: Dataframe ordenado, com índice renumerado """
+
+    if df1['Order_Date'].is_monotonic_increasing:
+        return df1
+    return df1.sort_values('Order_Date', kind = 'stable', ignore_index = True)
+
+def build_date_index(df1):
+
+    """ Esta função tem a responsabilidade de montar o índice dia -> posição da primeira linha
+
+    Input: Dataframe limpo ordenado por Order_Date
+    Output: Dicionário com days (DatetimeIndex) e offsets (len(days) + 1 posições) """
+
+    dates = df1['Order_Date'].to_numpy()
+    days = pd.DatetimeIndex(pd.unique(dates))
+    offsets = np.append(np.searchsorted(dates, days.to_numpy(), side = 'left'), len(dates))
+    return {'days': days, 'offsets': offsets}
+
+def date_range(index, date_start = None, date_end = None):
+
+    """ Esta função tem a responsabilidade de converter um intervalo de datas em posições de linhas
+
+    Parâmetros:
+        - date_start: primeira data incluída
+        - date_end: data limite (exclusiva, como no cubo)
+
+    Input: Índice de datas, intervalo
+    Output: (posição inicial, posição final) """
+
+    days, offsets = index['days'], index['offsets']
+    start = offsets[days.searchsorted(date_start)] if date_start is not None else 0
+    stop = offsets[days.searchsorted(date_end)] if date_end is not None else offsets[-1]
+    return (int(start), int(max(start, stop)))
+
+def date_slice(df1, date_start = None, date_end = None, index = None):
+
+    """ Esta função tem a responsabilidade de selecionar os pedidos de um intervalo de datas sem varrer as linhas
+
+    Sem índice (ou com um índice de outra versão do dataset) as posições saem de uma
+    busca binária direto na coluna Order_Date.
+
+    Input: Dataframe limpo ordenado por Order_Date, intervalo (date_end exclusiva), índice de datas
+    Output: Fatia do dataframe (sem cópia) """
+
+    if index is None or index['offsets'][-1] != len(df1):
+        index = {'days': pd.DatetimeIndex(df1['Order_Date']), 'offsets': np.arange(len(df1) + 1)}
+    start, stop = date_range(index, date_start, date_end)
+    return df1.iloc[start:stop]
+
+def day_numbers(dates):
+
+    """ Esta função tem a responsabilidade de converter datas em números inteiros de dias
+
+    Input: Datas (Series, DatetimeIndex ou array datetime64)
+    Output: Array int64 de dias desde 1970-01-01 """
+
+    return np.asarray(dates, dtype = 'datetime64[ns]').astype('datetime64[D]').astype('int64')
+
+def week_of_year(days):
+
+    """ Esta função tem a responsabilidade de calcular a semana do ano ('%U') sem formatar datas
+
+    Semana '%U': o primeiro domingo do ano abre a semana 1; os dias anteriores são a semana 0.
+    O cálculo é aritmético sobre o número do dia (1970-01-01 foi uma quinta-feira).
+
+    Input: Números de dias (day_numbers)
+    Output: Array com os rótulos '00' a '53' """
+
+    days = np.asarray(days, dtype = 'int64')
+    year_start = days.astype('datetime64[D]').astype('datetime64[Y]').astype('datetime64[D]').astype('int64')
+    # Dia da semana com domingo = 0
+    weekday = (days + 4) % 7
+    return WEEK_LABELS[(days - year_start + 7 - weekday) // 7]
@@ -0,0 +1,251 @@
+""" Contagem de valores distintos (ex.: entregadores únicos) mesclável por célula
+
+O dataset é dividido em células Order_Date x Road_traffic_density x Weatherconditions
+x Festival (os mesmos filtros de kpis.FILTERS) e cada célula guarda um resumo dos
+valores distintos vistos nela:
+
+- modo 'exact': bitmap com um bit por entregador (IDs codificados como inteiros);
+  juntar células é um OR bit a bit e a contagem é exata.
+- modo 'hll': registradores HyperLogLog; juntar células é o máximo por registrador
+  e o erro relativo típico é 1.04 / sqrt(2^p), escolhido a partir do erro tolerado.
+
+Assim "entregadores únicos em qualquer período e filtro" vira a junção dos resumos
+das células selecionadas, sem varrer os pedidos. """
+
+# Libraries
+import math
+
+import numpy as np
+import pandas as pd
+
+DIMENSIONS = ['Order_Date', 'Road_traffic_density', 'Weatherconditions', 'Festival']
+
+DEFAULT_ERROR = 0.01
+
+# Quantidade de bits 1 de cada byte
+_POPCOUNT = np.array([bin(i).count('1') for i in range(256)], dtype = np.uint8)
+
+# =======================================
+# Funções
+# =======================================
+
+def hll_precision(error):
+
+    """ Esta função tem a responsabilidade de escolher a precisão do HyperLogLog para um erro relativo
+
+    Input: Erro relativo típico tolerado (ex.: 0.01)
+    Output: p (a estrutura usa 2^p registradores), entre 7 e 18 """
+
+    return min(18, max(7, math.ceil(math.log2((1.04 / error) ** 2))))
+
+def empty_distinct(column = 'Delivery_person_ID', mode = 'exact', error = DEFAULT_ERROR, dimensions = DIMENSIONS):
+
+    """ Esta função tem a responsabilidade de criar uma estrutura de contagem de distintos vazia
+
+    Parâmetros:
+        - column: coluna cujos valores distintos são contados
+        - mode: 'exact' (bitmap) ou 'hll' (HyperLogLog)
+        - error: erro relativo tolerado no modo 'hll'
+        - dimensions: dimensões das células
+
+    Output: Dicionário com as células (keys), os resumos (states) e a configuração """
+
+    if mode not in ('exact', 'hll'):
+        raise ValueError("mode deve ser 'exact' ou 'hll'")
+    p = hll_precision(error) if mode == 'hll' else None
+    width = 0 if mode == 'exact' else 2 ** p
+    return {'column': column, 'mode': mode, 'p': p, 'dimensions': list(dimensions),
+            'keys': pd.DataFrame({dimension: [] for dimension in dimensions}),
+            'states': np.zeros((0, width), dtype = np.uint8),
+            'values': pd.Index([], dtype = object)}
+
+def _cell_codes(sketch, df1):
+
+    """ Esta função tem a responsabilidade de localizar (ou criar) a célula de cada linha
+
+    Input: Estrutura de distintos, dataframe limpo
+    Output: (códigos das células, novas células) """
+
+    # Agrupa as linhas primeiro: só as combinações distintas são procuradas nas células conhecidas
+    grouper = df1.groupby(sketch['dimensions'], observed = True, sort = False)
+    local = grouper.ngroup().to_numpy()
+    groups = grouper.size().index
+    if len(sketch['keys']):
+        mapping = pd.MultiIndex.from_frame(sketch['keys']).get_indexer(groups)
+    else:
+        mapping = np.full(len(groups), -1)
+    missing = mapping < 0
+    mapping[missing] = len(sketch['keys']) + np.arange(missing.sum())
+    return mapping[local], groups[missing].to_frame(index = False)
+
+def _hll_registers(values, p):
+
+    """ Esta função tem a responsabilidade de calcular registrador e posto HyperLogLog de cada valor
+
+    Input: Valores, precisão p
+    Output: (índice do registrador, posto) """
+
+    h = pd.util.hash_array(np.asarray(values, dtype = object))
+    index = (h >> np.uint64(64 - p)).astype(np.int64)
+    rest = (h << np.uint64(p)) | np.uint64(1 << (p - 1))
+    # Posto = zeros à esquerda + 1, calculado por busca binária no comprimento em bits
+    bit_length = np.zeros(len(rest), dtype = np.int64)
+    for shift in (32, 16, 8, 4, 2, 1):
+        high = rest >> np.uint64(shift)
+        move = high > 0
+        bit_length[move] += shift
+        rest = np.where(move, high, rest)
+    bit_length += 1
+    return index, (65 - bit_length).astype(np.uint8)
+
+def update_distinct(sketch, df1):
+
+    """ Esta função tem a responsabilidade de incorporar pedidos a uma estrutura de distintos
+
+    Serve tanto para montar a estrutura (a partir de uma vazia) quanto para incluir
+    lotes novos: o custo é proporcional às linhas novas.
+
+    Input: Estrutura de distintos, dataframe limpo
+    Output: Estrutura atualizada """
+
+    sketch = dict(sketch)
+    cells, new_keys = _cell_codes(sketch, df1)
+    states = sketch['states']
+    if len(new_keys):
+        sketch['keys'] = pd.concat([sketch['keys'], new_keys], ignore_index = True) if len(sketch['keys']) else new_keys
+        states = np.vstack([states, np.zeros((len(new_keys), states.shape[1]), dtype = np.uint8)])
+    else:
+        states = states.copy()
+
+    values = df1[sketch['column']].to_numpy()
+    if sketch['mode'] == 'exact':
+        # Códigos estáveis: valores novos entram no fim do dicionário
+        new_values = pd.Index(pd.unique(values)).difference(sketch['values'], sort = False)
+        if len(new_values):
+            sketch['values'] = sketch['values'].append(new_values) if len(sketch['values']) else new_values
+        width = (len(sketch['values']) + 7) // 8
+        if width > states.shape[1]:
+            states = np.hstack([states, np.zeros((states.shape[0], width - states.shape[1]), dtype = np.uint8)])
+        codes = sketch['values'].get_indexer(values)
+        pairs = np.unique(cells.astype(np.int64) * len(sketch['values']) + codes)
+        cells, codes = np.divmod(pairs, len(sketch['values']))
+        np.bitwise_or.at(states, (cells, codes >> 3), (128 >> (codes & 7)).astype(np.uint8))
+    else:
+        index, rank = _hll_registers(values, sketch['p'])
+        np.maximum.at(states, (cells, index), rank)
+    sketch['states'] = states
+    return sketch
+
+def build_distinct(df1, column = 'Delivery_person_ID', mode = 'exact', error = DEFAULT_ERROR, dimensions = DIMENSIONS):
+
+    """ Esta função tem a responsabilidade de montar a estrutura de distintos a partir do dataframe limpo
+
+    Input: Dataframe limpo e os parâmetros de empty_distinct
+    Output: Estrutura de distintos """
+
+    return update_distinct(empty_distinct(column, mode, error, dimensions), df1)
+
+def merge_distinct(*sketches):
+
+    """ Esta função tem a responsabilidade de juntar estruturas de distintos montadas em partes diferentes dos dados
+
+    Células iguais são combinadas (OR dos bitmaps ou máximo dos registradores). No modo
+    'exact' os valores de cada parte são remapeados para o dicionário da primeira.
+
+    Input: Estruturas de distintos com a mesma configuração
+    Output: Estrutura combinada """
+
+    sketches = [sketch for sketch in sketches if sketch is not None]
+    merged = dict(sketches[0])
+    for other in sketches[1:]:
+        if len(merged['keys']):
+            mapping = pd.MultiIndex.from_frame(merged['keys']).get_indexer(pd.MultiIndex.from_frame(other['keys']))
+        else:
+            mapping = np.full(len(other['keys']), -1)
+        missing = mapping < 0
+        mapping[missing] = len(merged['keys']) + np.arange(missing.sum())
+        states = merged['states']
+        if missing.any():
+            new_keys = other['keys'].loc[missing].reset_index(drop = True)
+            merged['keys'] = pd.concat([merged['keys'], new_keys], ignore_index = True) if len(merged['keys']) else new_keys
+            states = np.vstack([states, np.zeros((missing.sum(), states.shape[1]), dtype = np.uint8)])
+        else:
+            states = states.copy()
+        if merged['mode'] == 'exact':
+            new_values = other['values'].difference(merged['values'], sort = False)
+            if len(new_values):
+                merged['values'] = merged['values'].append(new_values) if len(merged['values']) else new_values
+            width = (len(merged['values']) + 7) // 8
+            if width > states.shape[1]:
+                states = np.hstack([states, np.zeros((states.shape[0], width - states.shape[1]), dtype = np.uint8)])
+            cells, codes = np.nonzero(np.unpackbits(other['states'], axis = 1, count = len(other['values'])))
+            codes = merged['values'].get_indexer(other['values'])[codes]
+            np.bitwise_or.at(states, (mapping[cells], codes >> 3), (128 >> (codes & 7)).astype(np.uint8))
+        else:
+            states[mapping] = np.maximum(states[mapping], other['states'])
+        merged['states'] = states
+    return merged
+
+def _select(sketch, date_start, date_end, filters):
+    keys = sketch['keys']
+    linhas_selecionadas = np.ones(len(keys), dtype = bool)
+    if date_start is not None:
+        linhas_selecionadas &= (keys['Order_Date'] >= date_start).to_numpy()
+    if date_end is not None:
+        linhas_selecionadas &= (keys['Order_Date'] < date_end).to_numpy()
+    for dimension, values in filters.items():
+        if values is not None:
+            linhas_selecionadas &= keys[dimension].isin(values).to_numpy()
+    return linhas_selecionadas
+
+def _estimate(sketch, state):
+
+    """ Esta função tem a responsabilidade de contar os distintos de um resumo já juntado
+
+    Input: Estrutura de distintos, resumo (bitmap ou registradores)
+    Output: Quantidade de distintos """
+
+    if sketch['mode'] == 'exact':
+        return int(_POPCOUNT[state].sum())
+    m = state.size
+    alpha = 0.7213 / (1 + 1.079 / m)
+    estimate = alpha * m * m / np.sum(np.ldexp(1.0, -state.astype(np.int64)))
+    zeros = np.count_nonzero(state == 0)
+    if estimate <= 2.5 * m and zeros:
+        estimate = m * math.log(m / zeros)
+    return int(round(estimate))
+
+def _merge(sketch, states):
+    if sketch['mode'] == 'exact':
+        return np.bitwise_or.reduce(states, axis = 0)
+    return states.max(axis = 0)
+
+def count_distinct(sketch, date_start = None, date_end = None, **filters):
+
+    """ Esta função tem a responsabilidade de contar os distintos das células selecionadas
+
+    Parâmetros:
+        - date_start: primeira data incluída
+        - date_end: data limite (exclusiva)
+        - filters: dimensão = lista de valores aceitos
+
+    Input: Estrutura de distintos
+    Output: Quantidade de distintos """
+
+    states = sketch['states'][_select(sketch, date_start, date_end, filters)]
+    if not len(states):
+        return 0
+    return _estimate(sketch, _merge(sketch, states))
+
+def count_distinct_by(sketch, labels, date_start = None, date_end = None, **filters):
+
+    """ Esta função tem a responsabilidade de contar os distintos por grupo de células (ex.: por semana)
+
+    Input: Estrutura de distintos, rótulo do grupo de cada célula (alinhado com sketch['keys']), filtros como em count_distinct
+    Output: Series rótulo -> quantidade de distintos """
+
+    linhas_selecionadas = _select(sketch, date_start, date_end, filters)
+    labels = pd.Series(np.asarray(labels)[linhas_selecionadas])
+    states = sketch['states'][linhas_selecionadas]
+    counts = {label: _estimate(sketch, _merge(sketch, states[positions])) for label, positions in labels.groupby(labels).indices.items()}
+    return pd.Series(counts, dtype = 'int64').sort_index()
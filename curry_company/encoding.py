@@ -0,0 +1,153 @@
+""" Dicionários de dimensões: colunas de texto guardadas como códigos inteiros
+
+Cada coluna de texto (IDs e horários) vira um código int32 e o texto fica num
+dicionário persistido ao lado do arquivo colunar. Os dicionários só crescem:
+valores novos recebem o próximo código, então os códigos já gravados (e as
+estruturas montadas com eles) continuam válidos depois de anexar pedidos.
+Filtros e agrupamentos usam os códigos; o texto só é recuperado na hora de
+exibir uma tabela ou gráfico. """
+
+# Libraries
+import glob
+import os
+import shutil
+import tempfile
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+
+ENCODED_COLUMNS = ['ID', 'Delivery_person_ID', 'Time_Orderd', 'Time_Order_picked']
+
+CODE_DTYPE = 'int32'
+
+# =======================================
+# Funções
+# =======================================
+
+def dictionaries_path(csv_path):
+
+    """ Esta função tem a responsabilidade de retornar o diretório dos dicionários ao lado do CSV
+
+    Input: Caminho do CSV
+    Output: Caminho do diretório """
+
+    return os.path.splitext(csv_path)[0] + '.dictionaries'
+
+def encode_columns(df1, dictionaries = None):
+
+    """ Esta função tem a responsabilidade de trocar o texto das colunas codificadas por códigos inteiros
+
+    Valores ausentes viram -1. Valores que ainda não estão no dicionário são
+    acrescentados ao fim dele.
+
+    Input: Dataframe limpo com texto, dicionários existentes (coluna -> pd.Index)
+    Output: (Dataframe com códigos, dicionários atualizados) """
+
+    dictionaries = dict(dictionaries or {})
+    df1 = df1.copy(deep = False)
+    for coluna in ENCODED_COLUMNS:
+        if coluna not in df1.columns:
+            continue
+        dictionary = dictionaries.get(coluna, pd.Index([], dtype = object))
+        codes, uniques = pd.factorize(df1[coluna])
+        new_values = pd.Index(uniques).difference(dictionary, sort = False)
+        if len(new_values):
+            dictionary = dictionary.append(new_values)
+        mapping = dictionary.get_indexer(uniques)
+        df1[coluna] = np.append(mapping, -1)[codes].astype(CODE_DTYPE)
+        dictionaries[coluna] = dictionary
+    return df1, dictionaries
+
+def decode(codes, dictionary):
+
+    """ Esta função tem a responsabilidade de recuperar o texto de um array de códigos
+
+    Input: Códigos, dicionário da coluna
+    Output: Array de texto (NaN para -1) """
+
+    codes = np.asarray(codes)
+    labels = np.append(dictionary.to_numpy(dtype = object), np.nan)
+    return labels[np.where(codes < 0, len(dictionary), codes)]
+
+def decode_columns(df, dictionaries, columns = None):
+
+    """ Esta função tem a responsabilidade de recuperar o texto das colunas codificadas de um dataframe pequeno
+
+    Usada na hora de exibir uma tabela; colunas sem dicionário carregado ficam como estão.
+
+    Input: Dataframe, dicionários, colunas (padrão: todas as codificadas presentes)
+    Output: Dataframe com texto """
+
+    df = df.copy(deep = False)
+    for coluna in columns or ENCODED_COLUMNS:
+        if coluna in df.columns and coluna in dictionaries:
+            df[coluna] = decode(df[coluna].to_numpy(), dictionaries[coluna])
+    return df
+
+def save_dictionaries(dictionaries, directory):
+
+    """ Esta função tem a responsabilidade de gravar os dicionários em arquivos Feather (um por coluna)
+
+    Input: Dicionários, diretório de destino
+    Output: Diretório de destino """
+
+    os.makedirs(directory, exist_ok = True)
+    for coluna, dictionary in dictionaries.items():
+        path = os.path.join(directory, coluna + '.arrow')
+        tmp = path + '.tmp'
+        feather.write_feather(pa.table({'label': pa.array(dictionary.to_numpy(dtype = object), type = pa.string())}), tmp)
+        os.replace(tmp, path)
+    return directory
+
+def publish_dictionaries(dictionaries, csv_path):
+
+    """ Esta função tem a responsabilidade de trocar todos os dicionários do dataset de uma vez
+
+    Os dicionários são gravados num diretório novo e o caminho de dictionaries_path
+    (um link simbólico) passa a apontar para ele com os.replace, como o arquivo
+    colunar: leitores concorrentes enxergam o diretório antigo inteiro ou o novo
+    inteiro, nunca um diretório apagado ou pela metade. Os diretórios anteriores
+    são removidos depois da troca.
+
+    Input: Dicionários, caminho do CSV
+    Output: Diretório gravado """
+
+    path = dictionaries_path(csv_path)
+    directory = tempfile.mkdtemp(prefix = os.path.basename(path) + '-', dir = os.path.dirname(path) or '.')
+    os.chmod(directory, 0o755)
+    save_dictionaries(dictionaries, directory)
+    tmp = path + '.tmp'
+    if os.path.lexists(tmp):
+        os.remove(tmp)
+    os.symlink(os.path.basename(directory), tmp)
+    # Diretório comum do formato anterior: os.replace não troca um diretório por um link
+    if os.path.isdir(path) and not os.path.islink(path):
+        shutil.rmtree(path)
+    os.replace(tmp, path)
+    for old in glob.glob(glob.escape(path) + '-*'):
+        if old != directory:
+            shutil.rmtree(old, ignore_errors = True)
+    return directory
+
+def load_dictionary(directory, coluna):
+
+    """ Esta função tem a responsabilidade de ler o dicionário de uma coluna
+
+    Input: Diretório dos dicionários, coluna
+    Output: pd.Index com o texto de cada código (vazio se ainda não existir) """
+
+    path = os.path.join(directory, coluna + '.arrow')
+    if not os.path.exists(path):
+        return pd.Index([], dtype = object)
+    return pd.Index(feather.read_table(path).column('label').to_numpy(zero_copy_only = False), dtype = object)
+
+def load_dictionaries(directory, columns = None):
+
+    """ Esta função tem a responsabilidade de ler os dicionários das colunas informadas
+
+    Input: Diretório dos dicionários, colunas (padrão: todas as codificadas)
+    Output: Dicionários (coluna -> pd.Index) """
+
+    return {coluna: load_dictionary(directory, coluna) for coluna in columns or ENCODED_COLUMNS}
@@ -0,0 +1,34 @@
+# Libraries
+import numpy as np
+
+# Raio médio da Terra em km (o mesmo usado pelo pacote haversine)
+EARTH_RADIUS_KM = 6371.0088
+
+# Colunas de coordenadas do dataset
+LOCATION_COLUMNS = ['Restaurant_latitude', 'Restaurant_longitude', 'Delivery_location_latitude', 'Delivery_location_longitude']
+
+# =======================================
+# Funções
+# =======================================
+
+def haversine_km(lat1, lon1, lat2, lon2):
+
+    """ Esta função tem a responsabilidade de calcular a distância do grande círculo entre pares de pontos
+
+    Versão vetorizada do haversine: opera sobre arrays inteiros, sem chamada Python por linha.
+
+    Input: Arrays de latitude/longitude (graus) da origem e do destino
+    Output: Array de distâncias em km (float64) """
+
+    lat1, lon1, lat2, lon2 = (np.radians(np.asarray(coord, dtype = np.float64)) for coord in (lat1, lon1, lat2, lon2))
+    d = np.sin((lat2 - lat1) * 0.5) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) * 0.5) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(d))
+
+def delivery_distance(df):
+
+    """ Esta função tem a responsabilidade de calcular a distância entre o restaurante e o local de entrega
+
+    Input: Dataframe com as colunas de LOCATION_COLUMNS
+    Output: Array float32 com a distância em km """
+
+    return haversine_km(*(df[coluna].to_numpy() for coluna in LOCATION_COLUMNS)).astype(np.float32)
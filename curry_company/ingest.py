@@ -0,0 +1,175 @@
+""" Ingestão em blocos do dataset para arquivos maiores que a memória
+
+O CSV é lido em pedaços de tamanho fixo, cada pedaço é limpo com as mesmas
+regras de clean_code() e incorporado aos agregados exibidos pelas páginas.
+Nenhum momento o dataset inteiro fica em memória. """
+
+# Libraries
+import json
+import os
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+
+from curry_company import loader
+from curry_company.aggregates import merge_moments, moments, weekly_orders
+from curry_company.cube import build_cube, merge_cubes
+from curry_company.dateindex import day_numbers, week_of_year
+
+DEFAULT_CHUNKSIZE = 250_000
+
+# Chaves de cada agregado (índice do dataframe guardado; None = cubo, com as dimensões como colunas)
+AGGREGATE_KEYS = {
+    'daily_orders': ['Order_Date'],
+    'weekly_orders': ['week_of_year'],
+    'weekly_couriers': ['week_of_year', 'Delivery_person_ID'],
+    'time_by_city_traffic': ['City', 'Road_traffic_density'],
+    'courier_min_time': ['City', 'Delivery_person_ID'],
+    'courier_ratings': ['Delivery_person_ID'],
+    'cube': None,
+}
+
+# =======================================
+# Funções
+# =======================================
+
+def aggregates_path(csv_path):
+
+    """ Esta função tem a responsabilidade de retornar o diretório dos agregados ao lado do CSV
+
+    Input: Caminho do CSV
+    Output: Caminho do diretório """
+
+    return os.path.splitext(csv_path)[0] + '.aggregates'
+
+def courier_min_time(df1):
+
+    """ Esta função tem a responsabilidade de calcular o menor tempo de entrega de cada entregador por cidade
+
+    Input: Dataframe limpo
+    Output: Dataframe indexado por (City, Delivery_person_ID) com Time_taken(min) """
+
+    return df1.groupby(['City', 'Delivery_person_ID'], observed = True)['Time_taken(min)'].min().to_frame()
+
+def chunk_aggregates(df1):
+
+    """ Esta função tem a responsabilidade de calcular os agregados parciais de um pedaço já limpo
+
+    Input: Dataframe limpo
+    Output: Dicionário nome -> dataframe parcial """
+
+    # Pares (dia, entregador) primeiro; a semana sai do número do dia, sem formatar datas
+    daily_couriers = df1.groupby(['Order_Date', 'Delivery_person_ID']).size().rename('orders').reset_index()
+    week = pd.Series(week_of_year(day_numbers(daily_couriers['Order_Date'])), name = 'week_of_year')
+    return {
+        'daily_orders': df1.groupby('Order_Date').size().rename('orders').to_frame(),
+        'weekly_couriers': daily_couriers.groupby([week, 'Delivery_person_ID'])[['orders']].sum(),
+        'time_by_city_traffic': moments(df1, ['City', 'Road_traffic_density'], 'Time_taken(min)'),
+        'courier_min_time': courier_min_time(df1),
+        'courier_ratings': moments(df1, ['Delivery_person_ID'], 'Delivery_person_Ratings'),
+        'cube': build_cube(df1),
+    }
+
+def _sum(*frames):
+    df_aux = pd.concat(frames)
+    return df_aux.groupby(level = list(range(df_aux.index.nlevels)), observed = True).sum()
+
+def _min(*frames):
+    df_aux = pd.concat(frames)
+    return df_aux.groupby(level = list(range(df_aux.index.nlevels)), observed = True).min()
+
+# Forma de juntar cada agregado
+_MERGE = {
+    'daily_orders': _sum,
+    'weekly_couriers': _sum,
+    'time_by_city_traffic': merge_moments,
+    'courier_min_time': _min,
+    'courier_ratings': merge_moments,
+    'cube': merge_cubes,
+}
+
+def fold(aggs, partial):
+
+    """ Esta função tem a responsabilidade de incorporar agregados parciais aos acumulados
+
+    Input: Agregados acumulados (ou vazio), agregados parciais
+    Output: Agregados acumulados """
+
+    if not aggs:
+        aggs = dict(partial)
+    else:
+        aggs = {name: merge(aggs[name], partial[name]) for name, merge in _MERGE.items()}
+    aggs['daily_orders'] = aggs['daily_orders'].sort_index()
+    aggs['weekly_orders'] = weekly_orders(aggs['daily_orders'])
+    return aggs
+
+def ingest_chunked(path = loader.DATASET_PATH, chunksize = DEFAULT_CHUNKSIZE):
+
+    """ Esta função tem a responsabilidade de ler o CSV em blocos e acumular os agregados
+
+    A memória máxima é limitada pelo tamanho do bloco e pelo tamanho dos agregados,
+    independente do tamanho do arquivo.
+
+    Input: Caminho do CSV, linhas por bloco
+    Output: Dicionário nome -> dataframe agregado """
+
+    aggs = {}
+    for chunk in loader.read_raw(path, chunksize = chunksize):
+        aggs = fold(aggs, chunk_aggregates(loader.clean_code(chunk)))
+    return aggs
+
+def save_aggregates(aggs, directory, meta = None):
+
+    """ Esta função tem a responsabilidade de gravar os agregados em arquivos Feather
+
+    Os metadados (opcionais) identificam a versão do dataset que gerou os agregados.
+
+    Input: Dicionário de agregados, diretório de destino, metadados
+    Output: Diretório de destino """
+
+    os.makedirs(directory, exist_ok = True)
+    for name, df_aux in aggs.items():
+        tmp = os.path.join(directory, name + '.arrow.tmp')
+        keys = AGGREGATE_KEYS[name]
+        if keys is not None:
+            df_aux = df_aux.reset_index()
+            for coluna in keys:
+                if isinstance(df_aux[coluna].dtype, pd.CategoricalDtype):
+                    df_aux[coluna] = df_aux[coluna].astype(str)
+        feather.write_feather(pa.Table.from_pandas(df_aux, preserve_index = False), tmp)
+        os.replace(tmp, os.path.join(directory, name + '.arrow'))
+    if meta is not None:
+        tmp = os.path.join(directory, 'meta.json.tmp')
+        with open(tmp, 'w') as f:
+            json.dump(meta, f)
+        os.replace(tmp, os.path.join(directory, 'meta.json'))
+    return directory
+
+def load_aggregates(directory):
+
+    """ Esta função tem a responsabilidade de ler os agregados gravados por save_aggregates
+
+    Input: Diretório dos agregados
+    Output: Dicionário nome -> dataframe agregado """
+
+    aggs = {}
+    for name, keys in AGGREGATE_KEYS.items():
+        file = os.path.join(directory, name + '.arrow')
+        if os.path.exists(file):
+            df_aux = feather.read_feather(file)
+            aggs[name] = df_aux if keys is None else df_aux.set_index(keys)
+    return aggs
+
+def load_meta(directory):
+
+    """ Esta função tem a responsabilidade de ler os metadados gravados junto com os agregados
+
+    Input: Diretório dos agregados
+    Output: Dicionário de metadados (None se não existir) """
+
+    try:
+        with open(os.path.join(directory, 'meta.json')) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
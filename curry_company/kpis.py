@@ -0,0 +1,346 @@
+""" KPIs do Growth Dashboard, sem Streamlit
+
+Os cálculos que antes existiam só dentro das páginas ficam aqui: recebem as
+estruturas pré-agregadas (células do cubo, entregadores distintos) ou as linhas
+filtradas e devolvem dataframes ou valores. As páginas montam as figuras a
+partir deles e a API (curry_company.api) os serve em JSON.
+
+KPIS liga o nome público de cada KPI à página e ao gráfico em que ele aparece
+no painel: compute_kpi usa a mesma chave do cache de resultados, de modo que a
+API e o painel compartilham os resultados já calculados para os mesmos filtros. """
+
+# Libraries
+import json
+
+import numpy as np
+import pandas as pd
+
+from curry_company.bitmap import BITMAP_COLUMNS, build_bitmaps, select_rows
+from curry_company.cube import rollup, slice_cube, total, update_cube
+from curry_company.dateindex import build_date_index, date_range, day_numbers, week_of_year
+from curry_company.distinct import count_distinct, count_distinct_by, update_distinct
+from curry_company.loader import DATASET_PATH, decode_columns, load_dataset, load_derived, load_dictionary
+from curry_company.parallel import parallel_builder
+from curry_company.profiles import update_profiles
+from curry_company.results import cached_result
+from curry_company.timeseries import build_timeseries, daily_series, update_timeseries, weekly_series
+from curry_company.topk import top_k
+
+# Filtros aceitos (os mesmos da barra lateral); listas vazias não selecionam nada
+FILTERS = ['date_start', 'date_end', 'Road_traffic_density', 'Weatherconditions', 'Festival']
+
+# =======================================
+# Funções - Visão Empresa
+# =======================================
+
+def order_metric(ts, filtros):
+
+    """ Esta função tem a responsabilidade de calcular a quantidade de pedidos por dia
+
+    Input: Série temporal (curry_company.timeseries), filtros
+    Output: Dataframe com Order_Date e orders (dias com pedidos) """
+
+    df_aux = daily_series(ts, **filtros)[['Order_Date', 'orders']]
+    return df_aux.loc[df_aux['orders'] > 0].reset_index(drop = True)
+
+def order_by_week(ts, filtros):
+
+    """ Esta função tem a responsabilidade de somar os pedidos por semana
+
+    Input: Série temporal, filtros
+    Output: Dataframe com week_of_year e orders """
+
+    return weekly_series(ts, **filtros)
+
+def order_trends(ts, filtros):
+
+    """ Esta função tem a responsabilidade de calcular as tendências diárias de pedidos
+
+    Janelas móveis de 7 e 28 dias, crescimento semana contra semana, acumulado no
+    intervalo e tempo médio de entrega em 7 dias (ver timeseries.daily_series).
+
+    Input: Série temporal, filtros
+    Output: Dataframe com uma linha por dia do intervalo """
+
+    return daily_series(ts, **filtros)
+
+def order_by_deliver_by_week(couriers, ts, filtros):
+
+    """ Esta função tem a responsabilidade de calcular a quantidade de pedidos por entregador por semana
+
+    Input: Entregadores distintos por célula, série temporal, filtros
+    Output: Dataframe com week_of_year, orders, Delivery_person_ID (entregadores distintos) e order_by_deliver """
+
+    df_aux1 = order_by_week(ts, filtros)
+    weeks = week_of_year(day_numbers(couriers['keys']['Order_Date']))
+    df_aux2 = count_distinct_by(couriers, weeks, **filtros).rename('Delivery_person_ID').rename_axis('week_of_year').reset_index()
+    df_aux = pd.merge(df_aux1, df_aux2, how = 'inner')
+    df_aux['order_by_deliver'] = df_aux['orders'] / df_aux['Delivery_person_ID']
+    return df_aux
+
+def traffic_order_share(cells):
+
+    """ Esta função tem a responsabilidade de calcular a distribuição dos pedidos por tipo de tráfego
+
+    Input: Células do cubo
+    Output: Dataframe com Road_traffic_density, orders e entregas_perc """
+
+    df_aux = rollup(cells, ['Road_traffic_density'])
+    df_aux['entregas_perc'] = df_aux['orders'] / df_aux['orders'].sum()
+    return df_aux
+
+def traffic_order_city(cells):
+
+    """ Esta função tem a responsabilidade de calcular o volume de pedidos por cidade e tipo de tráfego
+
+    Input: Células do cubo
+    Output: Dataframe com City, Road_traffic_density e orders """
+
+    return rollup(cells, ['City', 'Road_traffic_density'])
+
+def city_traffic_medians(df1):
+
+    """ Esta função tem a responsabilidade de calcular a localização central de cada cidade por tipo de tráfego
+
+    Input: Dataframe
+    Output: Dataframe com as medianas """
+
+    colunas = ['Road_traffic_density', 'City', 'Delivery_location_latitude', 'Delivery_location_longitude']
+    return df1.loc[:, colunas].groupby(['City', 'Road_traffic_density'], observed = True).median().reset_index() # Utiliza-se mediana para obter o ponto central do banco de dados -> a média altera os dados
+
+# =======================================
+# Funções - Visão Entregadores
+# =======================================
+
+def avg_std_rating(cells, by):
+
+    """ Esta função tem a responsabilidade de calcular a avaliação média e o desvio padrão a partir do cubo
+
+    Input: Células do cubo, dimensão do agrupamento
+    Output: Dataframe indexado pela dimensão com delivery_mean e delivery_std """
+
+    df_aux = rollup(cells, [by], 'Delivery_person_Ratings').set_index(by)
+    df_aux = df_aux.loc[:, ['mean', 'std']]
+    df_aux.columns = ['delivery_mean', 'delivery_std']
+    return (df_aux)
+
+def top_delivers(df1, labels = None):
+
+    """ Esta função tem a responsabilidade de calcular os 10 entregadores mais rápidos e os 10 mais lentos de cada cidade
+
+    O menor tempo de cada entregador é calculado uma vez e os extremos de cada cidade
+    saem por seleção parcial, sem ordenar todos os entregadores. Com o dicionário
+    de Delivery_person_ID, empates saem na ordem do ID, como no ranking original,
+    seja o dataset montado de uma vez ou com lotes anexados.
+
+    Input: Dataframe, dicionário de Delivery_person_ID (load_dictionary)
+    Output: (Dataframe dos mais rápidos, Dataframe dos mais lentos) """
+
+    return top_k(df1, 'City', 'Delivery_person_ID', 'Time_taken(min)', k = 10, agg = 'min', labels = labels)
+
+def avg_rating_per_deliver(df1):
+
+    """ Esta função tem a responsabilidade de calcular a avaliação média de cada entregador
+
+    Input: Dataframe
+    Output: Dataframe com Delivery_person_ID (código) e Delivery_person_Ratings """
+
+    col = ['Delivery_person_Ratings', 'Delivery_person_ID']
+    return df1.loc[:, col].groupby('Delivery_person_ID').mean().reset_index()
+
+def overall_metrics(df1):
+
+    """ Esta função tem a responsabilidade de calcular as idades e as condições de veículo extremas
+
+    Input: Dataframe
+    Output: (maior idade, menor idade, melhor condição, pior condição) """
+
+    return (df1.loc[:, 'Delivery_person_Age'].max(), df1.loc[:, 'Delivery_person_Age'].min(),
+            df1.loc[:, 'Vehicle_condition'].max(), df1.loc[:, 'Vehicle_condition'].min())
+
+# =======================================
+# Funções - Visão Restaurantes
+# =======================================
+
+def avg_std_time(cells, by):
+
+    """ Esta função tem a responsabilidade de calcular o tempo médio e o desvio padrão de entrega a partir do cubo
+
+    Input: Células do cubo, dimensões do agrupamento
+    Output: Dataframe com avg_time e std_time """
+
+    df_aux = rollup(cells, by, 'Time_taken(min)')
+    df_aux = df_aux.loc[:, by + ['mean', 'std']]
+    df_aux.columns = by + ['avg_time', 'std_time']
+    return (df_aux)
+
+def festival_time(df_festival, op, festival):
+
+    """ Esta função tem a responsabilidade de selecionar o tempo médio ou o desvio padrão com ou sem festival
+
+    Input: Dataframe de avg_std_time por Festival, 'avg_time' ou 'std_time', 'Yes' ou 'No'
+    Output: Valor arredondado (None se não houver pedidos) """
+
+    df_aux = df_festival.loc[df_festival['Festival'] == festival, op]
+    if df_aux.empty:
+        return None
+    return np.round(df_aux.iloc[0], 2)
+
+def avg_std_time_festival_delivery(cells, op, festival):
+
+    """ Esta função tem a responsabilidade de calcular o tempo médio e o desvio padrão do tempo de entrega
+        Parâmetros:
+            Input:
+                - cells: Células do cubo
+                - op: Tipo de operação
+                    'avg_time' = Calcula o tempo médio
+                    'std_time' = Calcula o desvio padrão
+                - festival: Com ou sem festival
+                    'Yes' = Calcula com festival
+                    'No' = Calcula sem festival
+            Output:
+                - Valor arredondado (None se não houver pedidos) """
+
+    return festival_time(avg_std_time(cells, ['Festival']), op, festival)
+
+def distance(cells):
+
+    """ Esta função tem a responsabilidade de calcular a distância média entre os restaurantes.
+    A distância já vem calculada na limpeza do dataset e somada nas células do cubo.
+
+    Input: Células do cubo
+    Output: Distância média"""
+
+    avg_distance = np.round(total(cells, 'distance')['mean'],2)
+    return avg_distance
+
+def distance_by_city(cells):
+
+    """ Esta função tem a responsabilidade de calcular a distância média por cidade
+
+    Input: Células do cubo
+    Output: Dataframe com City e distance (arredondada) """
+
+    avg_distance = rollup(cells, ['City'], 'distance').rename(columns = {'mean': 'distance'})
+    return np.round(avg_distance.loc[:, ['City', 'distance']], 2)
+
+# =======================================
+# Funções - KPIs por nome
+# =======================================
+
+def load_structures(path = DATASET_PATH):
+
+    """ Esta função tem a responsabilidade de carregar o dataset e as estruturas derivadas usadas pelos KPIs
+
+    Input: Caminho do dataset
+    Output: Dicionário com df1, cube, date_index, bitmaps, couriers, timeseries, profiles (perfis por entregador)
+            e courier_ids (dicionário de Delivery_person_ID) """
+
+    return {'df1': load_dataset(path),
+            'cube': load_derived('cube', parallel_builder('cube'), path, update = update_cube),
+            'date_index': load_derived('date_index', build_date_index, path),
+            'bitmaps': load_derived('bitmaps', build_bitmaps, path),
+            'couriers': load_derived('couriers', parallel_builder('couriers'), path, update = update_distinct),
+            'timeseries': load_derived('timeseries', build_timeseries, path, update = update_timeseries),
+            'profiles': load_derived('courier_profiles', parallel_builder('courier_profiles'), path, update = update_profiles),
+            'courier_ids': load_dictionary('Delivery_person_ID', path)}
+
+def select_cells(structures, filtros):
+
+    """ Esta função tem a responsabilidade de selecionar as células do cubo para os filtros
+
+    Input: Estruturas de load_structures, filtros
+    Output: Células do cubo """
+
+    return slice_cube(structures['cube'], **filtros)
+
+def select_orders(structures, filtros):
+
+    """ Esta função tem a responsabilidade de selecionar as linhas do dataset para os filtros
+
+    Input: Estruturas de load_structures, filtros
+    Output: Dataframe filtrado """
+
+    inicio, fim = date_range(structures['date_index'], filtros.get('date_start'), filtros.get('date_end'))
+    multiselect = {coluna: valores for coluna, valores in filtros.items() if coluna in BITMAP_COLUMNS}
+    return select_rows(structures['df1'], structures['bitmaps'], inicio, fim, **multiselect)
+
+def _cells(function, *args):
+    return lambda structures, filtros: function(select_cells(structures, filtros), *args)
+
+def _orders(function):
+    return lambda structures, filtros: function(select_orders(structures, filtros))
+
+def _series(function):
+    return lambda structures, filtros: function(structures['timeseries'], filtros)
+
+# Nome -> página e gráfico no cache de resultados, cálculo(estruturas, filtros),
+# colunas codificadas a decodificar e nomes das partes de resultados em tupla
+KPIS = {
+    'orders_per_day': {'page': 'visao_empresa', 'chart': 'order_metric', 'compute': _series(order_metric)},
+    'orders_per_week': {'page': 'visao_empresa', 'chart': 'order_by_week', 'compute': _series(order_by_week)},
+    'order_trends': {'page': 'visao_empresa', 'chart': 'order_trends', 'compute': _series(order_trends)},
+    'orders_per_deliver_per_week': {'page': 'visao_empresa', 'chart': 'order_by_deliver_by_week',
+                                    'compute': lambda structures, filtros: order_by_deliver_by_week(structures['couriers'], structures['timeseries'], filtros)},
+    'traffic_order_share': {'page': 'visao_empresa', 'chart': 'traffic_order_share', 'compute': _cells(traffic_order_share)},
+    'traffic_order_city': {'page': 'visao_empresa', 'chart': 'traffic_order_city', 'compute': _cells(traffic_order_city)},
+    'city_traffic_medians': {'page': 'visao_empresa', 'chart': 'country_maps', 'compute': _orders(city_traffic_medians)},
+    'overall_metrics': {'page': 'visao_entregadores', 'chart': 'overall_metrics', 'compute': _orders(overall_metrics),
+                        'fields': ['maior_idade', 'menor_idade', 'melhor_condicao', 'pior_condicao']},
+    'avg_rating_per_deliver': {'page': 'visao_entregadores', 'chart': 'avg_rating_per_deliver', 'compute': _orders(avg_rating_per_deliver),
+                               'decode': ['Delivery_person_ID']},
+    'avg_std_rating_by_traffic': {'page': 'visao_entregadores', 'chart': 'avg_std_rating_by_traffic', 'compute': _cells(avg_std_rating, 'Road_traffic_density')},
+    'avg_std_rating_by_weather': {'page': 'visao_entregadores', 'chart': 'avg_std_rating_by_weather', 'compute': _cells(avg_std_rating, 'Weatherconditions')},
+    'top_delivers': {'page': 'visao_entregadores', 'chart': 'top_delivers',
+                     'compute': lambda structures, filtros: top_delivers(select_orders(structures, filtros), structures['courier_ids']),
+                     'decode': ['Delivery_person_ID'], 'fields': ['fastest', 'slowest']},
+    'delivery_unique': {'page': 'visao_restaurantes', 'chart': 'delivery_unique',
+                        'compute': lambda structures, filtros: count_distinct(structures['couriers'], **filtros)},
+    'distance': {'page': 'visao_restaurantes', 'chart': 'distance', 'compute': _cells(distance)},
+    'distance_by_city': {'page': 'visao_restaurantes', 'chart': 'distance_by_city', 'compute': _cells(distance_by_city)},
+    'avg_std_time_by_city': {'page': 'visao_restaurantes', 'chart': 'avg_std_time_by_city', 'compute': _cells(avg_std_time, ['City'])},
+    'avg_std_time_by_city_order': {'page': 'visao_restaurantes', 'chart': 'avg_std_time_by_city_order', 'compute': _cells(avg_std_time, ['City', 'Type_of_order'])},
+    'avg_std_time_by_city_traffic': {'page': 'visao_restaurantes', 'chart': 'avg_std_time_by_city_traffic', 'compute': _cells(avg_std_time, ['City', 'Road_traffic_density'])},
+    'avg_std_time_by_festival': {'page': 'visao_restaurantes', 'chart': 'avg_std_time_by_festival', 'compute': _cells(avg_std_time, ['Festival'])},
+}
+
+def compute_kpi(name, filtros = None, path = DATASET_PATH):
+
+    """ Esta função tem a responsabilidade de calcular um KPI pelo nome, passando pelo cache de resultados
+
+    Input: Nome do KPI (chave de KPIS), filtros (chaves de FILTERS), caminho do dataset
+    Output: Resultado (dataframe, tupla ou valor), com as colunas codificadas já decodificadas """
+
+    kpi = KPIS[name]
+    filtros = {nome: valor for nome, valor in (filtros or {}).items() if valor is not None}
+    structures = load_structures(path)
+    result = cached_result(kpi['page'], kpi['chart'], filtros, kpi['compute'], structures, filtros, path = path)
+    if kpi.get('decode'):
+        decode = lambda obj: decode_columns(obj, kpi['decode'], path) if isinstance(obj, pd.DataFrame) else obj
+        result = tuple(decode(item) for item in result) if isinstance(result, tuple) else decode(result)
+    return result
+
+def to_jsonable(result, fields = None):
+
+    """ Esta função tem a responsabilidade de converter o resultado de um KPI em tipos do JSON
+
+    Dataframes viram listas de registros (datas em ISO 8601, NaN como null, índice
+    nomeado como coluna) e tuplas viram objetos com os nomes de fields.
+
+    Input: Resultado de compute_kpi, nomes das partes (opcional)
+    Output: dict, list, número, texto ou None """
+
+    if isinstance(result, pd.Series):
+        result = result.to_frame()
+    if isinstance(result, pd.DataFrame):
+        if any(name is not None for name in result.index.names):
+            result = result.reset_index()
+        return json.loads(result.to_json(orient = 'records', date_format = 'iso'))
+    if isinstance(result, tuple):
+        items = [to_jsonable(item) for item in result]
+        return dict(zip(fields, items)) if fields else items
+    if isinstance(result, np.generic):
+        result = result.item()
+    if isinstance(result, float) and not np.isfinite(result):
+        return None
+    return result
@@ -0,0 +1,566 @@
+# Libraries
+import os
+import threading
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+
+from curry_company import encoding, profiling, store
+from curry_company.dateindex import sort_by_date
+from curry_company.geo import delivery_distance
+
+# Copy-on-write garante que filtros e novas colunas criados pelas páginas
+# nunca escrevam nos buffers do dataframe compartilhado entre as sessões
+pd.set_option('mode.copy_on_write', True)
+
+# CURRY_DATASET aponta o painel e a API para outro CSV (ex.: um arquivo sintético)
+DATASET_PATH = os.environ.get('CURRY_DATASET', 'dataset/train.csv')
+
+# Colunas de baixa cardinalidade guardadas como category
+CATEGORY_COLUMNS = ['City', 'Road_traffic_density', 'Weatherconditions', 'Festival', 'Type_of_order', 'Type_of_vehicle']
+
+# Tipos aplicados pelo parser do read_csv
+RAW_DTYPES = {
+    'ID': 'object',
+    'Delivery_person_ID': 'object',
+    'Delivery_person_Age': 'float32',
+    'Delivery_person_Ratings': 'float32',
+    'Restaurant_latitude': 'float32',
+    'Restaurant_longitude': 'float32',
+    'Delivery_location_latitude': 'float32',
+    'Delivery_location_longitude': 'float32',
+    'Vehicle_condition': 'int8',
+    'multiple_deliveries': 'float32',
+    'Order_Date': 'category',
+    'Time_taken(min)': 'category',
+    **{coluna: 'category' for coluna in CATEGORY_COLUMNS},
+}
+
+# Sentinelas de valor ausente do dataset. O clima ausente vem como 'conditions NaN'
+# (sem espaço no final): a Visão Empresa original comparava com 'conditions NaN ',
+# que nunca casava, e contava 845 pedidos (~2%) que as outras visões descartavam
+NA_VALUES = ['NaN ', 'conditions NaN', 'conditions NaN ']
+
+# Linhas com NaN nessas colunas são descartadas
+REQUIRED_COLUMNS = ['Road_traffic_density', 'City', 'Weatherconditions', 'Delivery_person_Age', 'Festival', 'multiple_deliveries']
+
+# Versão publicada de cada dataset no processo: caminho -> Snapshot
+_cache = {}
+# Caminhos cujas versões novas só chegam às sessões por publish (ver curry_company.precompute)
+_held = set()
+# Versões sendo preparadas em segundo plano, ainda não publicadas: caminho -> Snapshot
+_staged = {}
+_cache_lock = threading.RLock()
+# Versões fixadas pela thread atual (rerun, pedido da API, preparo em segundo plano): caminho -> Snapshot
+_local = threading.local()
+
+class Snapshot:
+
+    """ Uma versão do dataset carregada no processo: dataframe limpo, estruturas derivadas e dicionários
+
+    Tudo o que é calculado a partir de uma versão fica no mesmo objeto, de modo
+    que trocar de versão é trocar o objeto publicado (ver publish). """
+
+    def __init__(self, path, version, df1, previous = None):
+        self.path = path
+        self.version = version
+        self.df1 = df1
+        # Estruturas derivadas: nome -> objeto, e nome -> (builder, update) de cada uma
+        self.derived = {}
+        self.builders = dict(previous.builders) if previous is not None else {}
+        self.dictionaries = {}
+        # Estruturas da versão anterior ainda não incorporadas, se a mudança for só de lotes anexados
+        self.previous = None
+        if previous is not None and _new_segments(previous.version, version) is not None:
+            self.previous = (previous.version, dict(previous.derived))
+        self.lock = threading.RLock()
+
+# =======================================
+# Funções
+# =======================================
+
+def _strip_categories(s):
+
+    """ Esta função tem a responsabilidade de remover espaços de uma coluna categórica
+
+    O strip é feito apenas nas categorias (poucos valores) e não em cada linha.
+    Categorias que ficam iguais depois do strip (ex.: 'High' e 'High ') são unidas.
+
+    Input: Series categórica
+    Output: Series categórica """
+
+    stripped = s.cat.categories.str.strip()
+    categories = stripped.unique()
+    if len(categories) == len(stripped):
+        return s.cat.rename_categories(stripped)
+    mapping = np.append(categories.get_indexer(stripped), -1)
+    codes = mapping[s.cat.codes.to_numpy()]
+    return pd.Series(pd.Categorical.from_codes(codes, categories), index = s.index, name = s.name)
+
+def _time_taken(s):
+
+    """ Esta função tem a responsabilidade de converter '(min) 24' em 24
+
+    A conversão é feita nas categorias e propagada pelos códigos.
+
+    Input: Series categórica
+    Output: Series int16 """
+
+    minutes = s.cat.categories.str.replace('(min)', '', regex = False).str.strip().astype('int16')
+    return pd.Series(minutes.to_numpy()[s.cat.codes.to_numpy()], index = s.index, name = s.name)
+
+def _order_date(s):
+
+    """ Esta função tem a responsabilidade de converter a data do pedido para datetime
+
+    Só as datas distintas (categorias) passam pelo pd.to_datetime.
+
+    Input: Series categórica
+    Output: Series datetime64 """
+
+    dates = pd.to_datetime(s.cat.categories, format = '%d-%m-%Y')
+    return pd.Series(dates.to_numpy()[s.cat.codes.to_numpy()], index = s.index, name = s.name)
+
+def read_raw(path = DATASET_PATH, **kwargs):
+
+    """ Esta função tem a responsabilidade de ler o CSV já com os tipos convertidos na leitura
+
+    Os sentinelas 'NaN ' viram NaN e as colunas de baixa cardinalidade (inclusive a
+    data e o tempo de entrega) são lidas como category.
+
+    Input: Caminho do dataset (demais argumentos vão para o pd.read_csv, ex.: chunksize)
+    Output: Dataframe bruto tipado """
+
+    return pd.read_csv(path, dtype = RAW_DTYPES, na_values = NA_VALUES, **kwargs)
+
+def coerce_raw(df):
+
+    """ Esta função tem a responsabilidade de aplicar a um dataframe de texto os mesmos tipos do read_raw
+
+    Usada para lotes de pedidos que não vêm de um arquivo CSV.
+
+    Input: Dataframe bruto (colunas como texto)
+    Output: Dataframe bruto tipado """
+
+    df = df.replace(NA_VALUES, np.nan)
+    return df.astype({coluna: dtype for coluna, dtype in RAW_DTYPES.items() if coluna in df.columns})
+
+def clean_code(df):
+
+    """ Esta função tem a responsabilidade de limpar o dataframe lido por read_raw
+
+    Tipos de Limpeza:
+    1. Remove o NaN de linhas específicas com uma única máscara
+    2. Conversão de colunas
+    3. Remove espaços (nas categorias das colunas categóricas)
+    4. Retira o (min) de time_taken
+    5. Converte a data do pedido
+    6. Calcula a distância restaurante -> entrega (km, float32)
+
+    Input: Dataframe
+    Output: Dataframe """
+
+    # Removendo NaN de linhas (uma única cópia do dataframe)
+
+    linhas_selecionadas = df[REQUIRED_COLUMNS].notna().all(axis = 1)
+    df1 = df.loc[linhas_selecionadas, :]
+
+    # Conversão de colunas
+
+    df1 = df1.astype({'Delivery_person_Age': 'int8', 'multiple_deliveries': 'int8'})
+
+    # Retirando espaços
+
+    df1['ID'] = df1['ID'].str.strip()
+    df1['Delivery_person_ID'] = df1['Delivery_person_ID'].str.strip()
+    for coluna in CATEGORY_COLUMNS:
+        df1[coluna] = _strip_categories(df1[coluna])
+
+    # Retirando o (min) de time_taken
+
+    df1['Time_taken(min)'] = _time_taken(df1['Time_taken(min)'])
+
+    # Conversão da data
+
+    df1['Order_Date'] = _order_date(df1['Order_Date'])
+
+    # Distância entre restaurante e local de entrega
+
+    df1['distance'] = profiling.profiled('delivery_distance', delivery_distance, df1)
+
+    return (df1)
+
+def file_key(path):
+
+    """ Esta função tem a responsabilidade de identificar a versão do arquivo pelo mtime e pelo tamanho
+
+    Input: Caminho do arquivo
+    Output: Tupla (mtime_ns, tamanho) """
+
+    stat = os.stat(path)
+    return (stat.st_mtime_ns, stat.st_size)
+
+def dataset_version(path = DATASET_PATH):
+
+    """ Esta função tem a responsabilidade de identificar a versão do dataset
+
+    A versão muda quando o CSV muda (mtime/tamanho) ou quando um lote de pedidos é anexado.
+
+    Input: Caminho do dataset
+    Output: Tupla (chave do CSV, lotes anexados) """
+
+    return (file_key(path), store.list_segments(path))
+
+def _new_segments(cached_version, version):
+
+    """ Esta função tem a responsabilidade de descobrir os lotes anexados desde a versão em cache
+
+    Input: Versão em cache, versão atual
+    Output: Lotes novos, ou None se a mudança exige recarregar tudo """
+
+    if cached_version is None or cached_version[0] != version[0]:
+        return None
+    segments = cached_version[1]
+    if version[1][:len(segments)] != segments:
+        return None
+    return version[1][len(segments):]
+
+def concat_cleaned(df1, df2):
+
+    """ Esta função tem a responsabilidade de juntar dois dataframes limpos mantendo as colunas categóricas
+
+    Se as categorias dos dois lados forem diferentes, ambas passam a usar a união delas
+    (o pd.concat converteria a coluna para texto).
+
+    O índice é renumerado (RangeIndex), como no arquivo colunar.
+
+    Input: Dataframes limpos
+    Output: Dataframe limpo com as linhas dos dois """
+
+    df1, df2 = df1.copy(deep = False), df2.copy(deep = False)
+    for coluna in CATEGORY_COLUMNS:
+        categories = df1[coluna].cat.categories.union(df2[coluna].cat.categories)
+        if len(categories) != len(df1[coluna].cat.categories) or len(categories) != len(df2[coluna].cat.categories):
+            df1[coluna] = df1[coluna].cat.set_categories(categories)
+            df2[coluna] = df2[coluna].cat.set_categories(categories)
+    return pd.concat([df1, df2], ignore_index = True)
+
+def read_dataset(path = DATASET_PATH):
+
+    """ Esta função tem a responsabilidade de ler o CSV bruto e limpá-lo
+
+    Input: Caminho do dataset
+    Output: Dataframe limpo """
+
+    df = profiling.profiled('read_raw', read_raw, path)
+    return profiling.profiled('clean_code', clean_code, df)
+
+def prepare_dataset(path = DATASET_PATH):
+
+    """ Esta função tem a responsabilidade de preparar o dataset para o cache: limpo, renumerado e codificado
+
+    As linhas são ordenadas por Order_Date (ver dateindex), o índice vira um RangeIndex
+    (sem custo de memória) e as colunas de texto viram códigos.
+
+    Input: Caminho do dataset
+    Output: (Dataframe codificado, dicionários) """
+
+    df1 = sort_by_date(read_dataset(path).reset_index(drop = True))
+    return encoding.encode_columns(df1)
+
+def build_dataset(path = DATASET_PATH, force = False):
+
+    """ Esta função tem a responsabilidade de gerar o arquivo colunar do dataset limpo
+
+    O arquivo só é reconstruído quando o hash do CSV muda (ou com force=True).
+    As colunas de texto são gravadas como códigos, com os dicionários ao lado.
+
+    Input: Caminho do dataset
+    Output: Caminho do arquivo colunar """
+
+    if force or not store.is_fresh(path):
+        df1, dictionaries = prepare_dataset(path)
+        store.write_store(df1, path, dictionaries = dictionaries)
+    return store.store_path(path)
+
+def _read_snapshot(path, base = None):
+
+    """ Esta função tem a responsabilidade de carregar a versão do dataset que está no disco
+
+    Na partida a leitura vem do arquivo colunar mapeado em memória; o CSV só é
+    processado novamente quando o seu hash muda. Se a diferença para a versão
+    base for apenas de lotes anexados, eles são lidos sozinhos e juntados ao
+    dataframe da base, que continua ordenado por Order_Date.
+
+    Input: Caminho do dataset, versão carregada anteriormente (Snapshot ou None)
+    Output: Snapshot (a própria base se o disco não mudou) """
+
+    version = dataset_version(path)
+    if base is not None and base.version == version:
+        return base
+    dictionaries = {}
+    with profiling.stage('load_dataset') as item:
+        new_segments = _new_segments(base and base.version, version)
+        if new_segments is not None:
+            df1 = sort_by_date(concat_cleaned(base.df1, store.read_segments(path, new_segments)))
+        elif store.is_fresh(path):
+            df1 = sort_by_date(store.read_store(path, segments = version[1]))
+        else:
+            df1, dictionaries = prepare_dataset(path)
+            try:
+                store.write_store(df1, path, dictionaries = dictionaries)
+                # Troca a cópia privada pelo arquivo mapeado, compartilhado com os outros processos
+                df1 = store.read_store(path, segments = ())
+            except OSError:
+                # Diretório somente leitura: segue apenas com o cache em memória
+                pass
+            # O CSV novo substitui os lotes anexados à versão anterior
+            version = (version[0], ())
+        if item is not None:
+            item.rows_out = len(df1)
+    snapshot = Snapshot(path, version, df1, base)
+    snapshot.dictionaries.update(dictionaries)
+    return snapshot
+
+def _pins():
+    if not hasattr(_local, 'pins'):
+        _local.pins = {}
+    return _local.pins
+
+def current_snapshot(path = DATASET_PATH):
+
+    """ Esta função tem a responsabilidade de retornar a versão do dataset que a thread atual deve usar
+
+    É a versão fixada na thread (pin_version, using) ou, sem ela, a publicada. A
+    versão publicada acompanha o disco (mtime/tamanho do CSV e lotes anexados),
+    exceto nos caminhos entregues a hold_versions, que só mudam por publish.
+
+    Input: Caminho do dataset
+    Output: Snapshot """
+
+    snapshot = _pins().get(path)
+    if snapshot is not None:
+        return snapshot
+    with _cache_lock:
+        snapshot = _cache.get(path)
+        if snapshot is None or path not in _held:
+            snapshot = _cache[path] = _read_snapshot(path, snapshot)
+        return snapshot
+
+def pin_version(path = DATASET_PATH):
+
+    """ Esta função tem a responsabilidade de fixar a versão publicada do dataset para a thread atual
+
+    Chamada no início de cada rerun: todas as leituras do rerun (dataset,
+    estruturas, chaves do cache de resultados) usam a mesma versão, mesmo que
+    outra seja publicada no meio dele.
+
+    Input: Caminho do dataset
+    Output: Snapshot fixado """
+
+    pins = _pins()
+    pins.pop(path, None)
+    snapshot = pins[path] = current_snapshot(path)
+    return snapshot
+
+@contextmanager
+def using(*snapshots):
+
+    """ Esta função tem a responsabilidade de fixar versões do dataset na thread atual durante um bloco
+
+    Input: Snapshots (None é ignorado)
+    Output: Context manager """
+
+    pins = _pins()
+    saved = dict(pins)
+    pins.update((snapshot.path, snapshot) for snapshot in snapshots if snapshot is not None)
+    try:
+        yield
+    finally:
+        pins.clear()
+        pins.update(saved)
+
+def bind_versions(func):
+
+    """ Esta função tem a responsabilidade de levar as versões fixadas na thread atual para outra thread
+
+    Input: Função sem argumentos (ex.: aquecimento de uma seção)
+    Output: Função que roda com as mesmas versões fixadas """
+
+    snapshots = list(_pins().values())
+    def bound():
+        with using(*snapshots):
+            return func()
+    return bound
+
+def load_dataset(path = DATASET_PATH):
+
+    """ Esta função tem a responsabilidade de ler e limpar o dataset uma única vez por versão
+
+    As colunas de ENCODED_COLUMNS vêm como códigos inteiros (ver load_dictionary).
+    O dataframe limpo fica no Snapshot da versão (ver current_snapshot). Todas as
+    sessões recebem uma cópia rasa: com copy-on-write nenhum dado é copiado, e
+    alterações feitas pelas páginas não afetam o dataframe compartilhado. As
+    colunas apontam direto para o arquivo mapeado (somente leitura), cujas
+    páginas o sistema operacional compartilha entre todos os processos que
+    servem o painel; só as linhas de lotes anexados ficam numa cópia privada,
+    até o próximo build.
+
+    Input: Caminho do dataset
+    Output: Dataframe limpo """
+
+    return current_snapshot(path).df1.copy(deep = False)
+
+def load_version(path = DATASET_PATH):
+
+    """ Esta função tem a responsabilidade de retornar a versão do dataset usada pela thread atual
+
+    É a versão usada por load_derived; serve de chave para resultados calculados a partir dela.
+
+    Input: Caminho do dataset
+    Output: Tupla (chave do CSV, lotes anexados) """
+
+    return current_snapshot(path).version
+
+def load_derived(name, builder, path = DATASET_PATH, update = None):
+
+    """ Esta função tem a responsabilidade de manter em cache uma estrutura derivada do dataset limpo
+
+    A estrutura (cubo, índices...) é construída uma única vez por versão do dataset
+    e compartilhada por todas as sessões do processo. Se for informada a função
+    update(estrutura, linhas_novas), lotes anexados são incorporados sem reconstruir
+    a estrutura a partir do histórico inteiro.
+
+    Input: Nome da estrutura, função que a constrói a partir do dataframe, caminho do dataset, função de atualização
+    Output: Estrutura construída """
+
+    snapshot = current_snapshot(path)
+    with snapshot.lock:
+        if name not in snapshot.derived:
+            snapshot.builders[name] = (builder, update)
+            old = snapshot.previous[1].pop(name, None) if snapshot.previous is not None else None
+            with profiling.stage('build/' + name, len(snapshot.df1)):
+                if update is not None and old is not None:
+                    obj = update(old, store.read_segments(path, _new_segments(snapshot.previous[0], snapshot.version)))
+                else:
+                    obj = builder(snapshot.df1.copy(deep = False))
+            snapshot.derived[name] = obj
+        return snapshot.derived[name]
+
+def build_structures(snapshot):
+
+    """ Esta função tem a responsabilidade de construir numa versão as estruturas que a versão anterior já tinha
+
+    Input: Snapshot (ex.: de stage_snapshot)
+    Output: Nomes das estruturas construídas """
+
+    with using(snapshot):
+        for name, (builder, update) in list(snapshot.builders.items()):
+            load_derived(name, builder, snapshot.path, update)
+    return list(snapshot.builders)
+
+def load_dictionary(coluna, path = DATASET_PATH):
+
+    """ Esta função tem a responsabilidade de retornar o dicionário de uma coluna codificada
+
+    O dicionário é lido do disco só quando alguma tela precisa exibir o texto, e fica
+    no Snapshot da versão.
+
+    Input: Coluna (ex.: 'Delivery_person_ID'), caminho do dataset
+    Output: pd.Index com o texto de cada código """
+
+    snapshot = current_snapshot(path)
+    with snapshot.lock:
+        if coluna not in snapshot.dictionaries:
+            snapshot.dictionaries[coluna] = encoding.load_dictionary(encoding.dictionaries_path(path), coluna)
+        return snapshot.dictionaries[coluna]
+
+def hold_versions(path = DATASET_PATH):
+
+    """ Esta função tem a responsabilidade de parar a troca automática de versão de um dataset
+
+    A partir daqui as sessões continuam na versão publicada mesmo que o disco
+    mude (e deixam de conferir o disco a cada leitura); a versão nova só chega
+    a elas por publish.
+
+    Input: Caminho do dataset
+    Output: None """
+
+    with _cache_lock:
+        _held.add(path)
+
+def stage_snapshot(path = DATASET_PATH):
+
+    """ Esta função tem a responsabilidade de carregar a versão do disco sem publicá-la
+
+    Se o CSV mudou (o arquivo colunar e os dicionários serão regravados), os
+    dicionários da versão publicada são lidos antes, para que ela continue
+    decodificando com os seus.
+
+    Input: Caminho do dataset
+    Output: Snapshot novo, ou None se a versão publicada já é a do disco """
+
+    with _cache_lock:
+        published = _cache.get(path)
+    if published is None:
+        published = current_snapshot(path)
+    version = dataset_version(path)
+    if published.version == version:
+        return None
+    if _new_segments(published.version, version) is None:
+        with published.lock:
+            for coluna in encoding.ENCODED_COLUMNS:
+                if coluna not in published.dictionaries:
+                    published.dictionaries[coluna] = encoding.load_dictionary(encoding.dictionaries_path(path), coluna)
+    snapshot = _read_snapshot(path, published)
+    with _cache_lock:
+        _staged[path] = snapshot
+    return snapshot
+
+def publish(snapshot):
+
+    """ Esta função tem a responsabilidade de trocar a versão publicada de uma vez
+
+    As leituras seguintes (e os reruns que começarem depois) usam o novo
+    Snapshot; reruns em andamento terminam na versão que fixaram.
+
+    Input: Snapshot
+    Output: Snapshot publicado antes (ou None) """
+
+    with _cache_lock:
+        previous = _cache.get(snapshot.path)
+        _cache[snapshot.path] = snapshot
+        if _staged.get(snapshot.path) is snapshot:
+            del _staged[snapshot.path]
+    return previous
+
+def discard_staged(snapshot):
+
+    """ Esta função tem a responsabilidade de abandonar uma versão preparada que não será publicada
+
+    Input: Snapshot
+    Output: None """
+
+    with _cache_lock:
+        if _staged.get(snapshot.path) is snapshot:
+            del _staged[snapshot.path]
+
+def live_versions(path = DATASET_PATH):
+
+    """ Esta função tem a responsabilidade de informar as versões do dataset que ainda podem ser pedidas
+
+    Input: Caminho do dataset
+    Output: Conjunto de versões (a publicada e a que está sendo preparada) """
+
+    with _cache_lock:
+        return {snapshot.version for snapshot in (_cache.get(path), _staged.get(path)) if snapshot is not None}
+
+def decode_columns(df, columns, path = DATASET_PATH):
+
+    """ Esta função tem a responsabilidade de trocar os códigos pelo texto num dataframe já agregado
+
+    Input: Dataframe (pequeno, pronto para exibir), colunas codificadas, caminho do dataset
+    Output: Dataframe com texto """
+
+    return encoding.decode_columns(df, {coluna: load_dictionary(coluna, path) for coluna in columns}, columns)
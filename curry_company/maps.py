@@ -0,0 +1,118 @@
+""" Camadas de mapa geradas em lote a partir de arrays NumPy
+
+Em vez de um folium.Marker por ponto (um objeto Python e um trecho de JavaScript
+por linha), os pontos viram uma única camada:
+
+- GeoJSON: uma FeatureCollection montada direto dos arrays, com as colunas
+  escolhidas como propriedades (popup/tooltip);
+- FastMarkerCluster: todos os pontos num único array, agrupados no navegador;
+- agrupamento no servidor: os pontos são somados numa grade (cell graus) e só
+  o centro de cada célula, com a quantidade de pedidos, vai para o navegador.
+  Serve para exibir todos os locais de entrega sem enviar todas as linhas;
+- mapa de calor: as células do índice espacial (ver spatial) com um peso cada. """
+
+# Libraries
+import folium
+import numpy as np
+import pandas as pd
+from folium.plugins import FastMarkerCluster, HeatMap
+
+DEFAULT_CELL = 0.05
+
+# Casas decimais das coordenadas enviadas (~1 m)
+COORDINATE_DECIMALS = 5
+
+# =======================================
+# Funções
+# =======================================
+
+def points_geojson(lat, lon, properties = None):
+
+    """ Esta função tem a responsabilidade de montar uma FeatureCollection de pontos a partir de arrays
+
+    Input: Latitudes, longitudes, dicionário {propriedade: array} (opcional)
+    Output: Dicionário GeoJSON """
+
+    coordinates = np.column_stack([np.asarray(lon, dtype = np.float64), np.asarray(lat, dtype = np.float64)])
+    coordinates = np.round(coordinates, COORDINATE_DECIMALS).tolist()
+    properties = {nome: np.asarray(valores).tolist() for nome, valores in (properties or {}).items()}
+    nomes = list(properties)
+    linhas = zip(*properties.values()) if nomes else ([] for _ in coordinates)
+    features = [{'type': 'Feature',
+                 'geometry': {'type': 'Point', 'coordinates': coordinate},
+                 'properties': dict(zip(nomes, valores))}
+                for coordinate, valores in zip(coordinates, linhas)]
+    return {'type': 'FeatureCollection', 'features': features}
+
+def geojson_layer(df_aux, lat, lon, fields, name = None):
+
+    """ Esta função tem a responsabilidade de criar uma camada GeoJSON com um marcador por linha e popup
+
+    Input: Dataframe, colunas de latitude e longitude, colunas exibidas no popup, nome da camada
+    Output: folium.GeoJson """
+
+    properties = {campo: df_aux[campo].astype(str).to_numpy() for campo in fields}
+    data = points_geojson(df_aux[lat].to_numpy(), df_aux[lon].to_numpy(), properties)
+    # Sem linhas (ex.: nenhum pedido nos filtros) a camada fica vazia e sem popup:
+    # o folium recusa um popup cujos campos não aparecem em nenhuma feature
+    popup = folium.GeoJsonPopup(fields = fields) if fields and len(df_aux) else None
+    return folium.GeoJson(data, name = name, popup = popup)
+
+def fast_marker_layer(lat, lon, name = None):
+
+    """ Esta função tem a responsabilidade de criar uma camada com todos os pontos agrupados no navegador
+
+    Input: Latitudes, longitudes, nome da camada
+    Output: FastMarkerCluster """
+
+    coordinates = np.round(np.column_stack([lat, lon]).astype(np.float64), COORDINATE_DECIMALS)
+    return FastMarkerCluster(coordinates.tolist(), name = name)
+
+def cluster_points(lat, lon, cell = DEFAULT_CELL):
+
+    """ Esta função tem a responsabilidade de agrupar pontos numa grade regular (agrupamento no servidor)
+
+    Input: Latitudes, longitudes, tamanho da célula em graus
+    Output: Dataframe com latitude e longitude médias e orders por célula ocupada """
+
+    lat = np.asarray(lat, dtype = np.float64)
+    lon = np.asarray(lon, dtype = np.float64)
+    linhas_selecionadas = np.isfinite(lat) & np.isfinite(lon)
+    lat, lon = lat[linhas_selecionadas], lon[linhas_selecionadas]
+    keys = np.floor(lat / cell).astype(np.int64) * (1 << 32) + np.floor(lon / cell).astype(np.int64)
+    _, inverse = np.unique(keys, return_inverse = True)
+    orders = np.bincount(inverse)
+    return pd.DataFrame({'latitude': np.bincount(inverse, lat) / orders,
+                         'longitude': np.bincount(inverse, lon) / orders,
+                         'orders': orders})
+
+def cluster_layer(clusters, name = None):
+
+    """ Esta função tem a responsabilidade de criar uma camada GeoJSON com um círculo por célula agrupada
+
+    O raio cresce com o logaritmo da quantidade de pedidos da célula.
+
+    Input: Dataframe de cluster_points, nome da camada
+    Output: folium.GeoJson """
+
+    radius = np.round(3 + 2 * np.log2(clusters['orders'].to_numpy()), 1)
+    data = points_geojson(clusters['latitude'].to_numpy(), clusters['longitude'].to_numpy(),
+                          {'orders': clusters['orders'].to_numpy(), 'radius': radius})
+    return folium.GeoJson(data, name = name,
+                          marker = folium.CircleMarker(fill = True, fill_opacity = 0.6, weight = 1),
+                          style_function = lambda feature: {'radius': feature['properties']['radius']},
+                          tooltip = folium.GeoJsonTooltip(fields = ['orders']) if len(clusters) else None)
+
+def heatmap_layer(tiles, weight = 'orders', name = None):
+
+    """ Esta função tem a responsabilidade de criar um mapa de calor a partir das células do índice espacial
+
+    O peso é normalizado pelo maior valor, como o Leaflet.heat espera.
+
+    Input: Dataframe de spatial.heatmap_tiles, coluna do peso (ex.: 'orders', 'time_mean'), nome da camada
+    Output: HeatMap """
+
+    weights = tiles[weight].to_numpy(dtype = np.float64, na_value = 0.0)
+    weights = weights / weights.max() if len(weights) and weights.max() > 0 else weights
+    data = np.column_stack([tiles['latitude'].to_numpy(), tiles['longitude'].to_numpy(), weights])
+    return HeatMap(np.round(data, COORDINATE_DECIMALS).tolist(), name = name, min_opacity = 0.3, radius = 20, blur = 15)
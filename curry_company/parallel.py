@@ -0,0 +1,229 @@
+""" Agregação em paralelo sobre colunas em memória compartilhada
+
+As colunas usadas pelos agregados são copiadas uma única vez para blocos de
+memória compartilhada (multiprocessing.shared_memory); os processos do pool se
+conectam a esses blocos pelo nome e montam um dataframe sem copiar os dados.
+Cada tarefa calcula os agregados parciais de uma partição (um intervalo de dias
+contíguo, já que o dataset é ordenado por Order_Date, ou uma cidade) e o processo
+principal junta os parciais com as mesmas funções usadas para lotes anexados:
+
+- cube: momentos (count/sum/sumsq/min/max) por célula -> merge_cubes
+- couriers: resumos de distintos por célula -> merge_distinct
+- grid: índice espacial -> merge_grids
+- courier_min_time: menor tempo por entregador e cidade -> mínimo dos parciais
+- courier_profiles: perfis por código de entregador -> merge_profiles
+
+A quantidade de processos vem da variável de ambiente CURRY_WORKERS (padrão: os
+núcleos da máquina). """
+
+# Libraries
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+
+from curry_company import cube, distinct, ingest, profiles, spatial
+from curry_company.dateindex import build_date_index
+
+# Abaixo dessa quantidade de linhas o custo de iniciar as tarefas supera o ganho
+PARALLEL_MIN_ROWS = 500_000
+
+# Nome -> (função do parcial, função que junta os parciais, colunas usadas)
+PARTIALS = {
+    'cube': (cube.build_cube, cube.merge_cubes, cube.DIMENSIONS + list(cube.MEASURES)),
+    'couriers': (distinct.build_distinct, distinct.merge_distinct, distinct.DIMENSIONS + ['Delivery_person_ID']),
+    'grid': (spatial.build_grid, spatial.merge_grids,
+             spatial.DIMENSIONS + ['Time_taken(min)'] + [coluna for colunas in spatial.POINTS.values() for coluna in colunas]),
+    'courier_min_time': (ingest.courier_min_time, ingest._MERGE['courier_min_time'], ['City', 'Delivery_person_ID', 'Time_taken(min)']),
+    'courier_profiles': (profiles.build_profiles, profiles.merge_profiles, profiles.COLUMNS),
+}
+
+_pool = None
+_pool_lock = threading.Lock()
+
+# Blocos abertos pelo processo do pool: nome do bloco -> SharedMemory
+_attached = {}
+
+# =======================================
+# Funções
+# =======================================
+
+def default_workers():
+
+    """ Esta função tem a responsabilidade de definir a quantidade de processos do pool
+
+    Input: None
+    Output: CURRY_WORKERS ou a quantidade de núcleos disponíveis """
+
+    if 'CURRY_WORKERS' in os.environ:
+        return max(1, int(os.environ['CURRY_WORKERS']))
+    return len(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else os.cpu_count() or 1
+
+def share_columns(df1, columns):
+
+    """ Esta função tem a responsabilidade de publicar colunas do dataframe em memória compartilhada
+
+    Colunas categóricas são publicadas pelos códigos; as categorias (poucas) vão no layout.
+
+    Input: Dataframe limpo, colunas
+    Output: (layout para attach_columns, blocos criados) """
+
+    layout = {'rows': len(df1), 'columns': {}}
+    blocks = []
+    for coluna in columns:
+        serie = df1[coluna]
+        categories = None
+        if isinstance(serie.dtype, pd.CategoricalDtype):
+            categories = serie.cat.categories
+            values = serie.cat.codes.to_numpy()
+        else:
+            values = serie.to_numpy()
+        block = shared_memory.SharedMemory(create = True, size = max(values.nbytes, 1))
+        blocks.append(block)
+        np.ndarray(values.shape, dtype = values.dtype, buffer = block.buf)[:] = values
+        layout['columns'][coluna] = (block.name, values.dtype.str, categories)
+    return layout, blocks
+
+def release(blocks):
+
+    """ Esta função tem a responsabilidade de liberar os blocos de memória compartilhada criados
+
+    Input: Blocos de share_columns
+    Output: None """
+
+    for block in blocks:
+        block.close()
+        block.unlink()
+
+def attach_columns(layout):
+
+    """ Esta função tem a responsabilidade de montar um dataframe sobre os blocos de memória compartilhada
+
+    Nenhum dado é copiado: as colunas são arrays NumPy que apontam para os blocos,
+    e as categóricas envolvem os códigos do bloco (já validados em share_columns,
+    por isso sem a varredura de validação do from_codes).
+
+    Input: Layout de share_columns
+    Output: Dataframe (somente leitura) """
+
+    data = {}
+    for coluna, (name, dtype, categories) in layout['columns'].items():
+        block = _attached.get(name)
+        if block is None:
+            block = _attached[name] = shared_memory.SharedMemory(name = name)
+        values = np.ndarray(layout['rows'], dtype = np.dtype(dtype), buffer = block.buf)
+        values.flags.writeable = False
+        if categories is not None:
+            values = pd.Categorical.from_codes(values, dtype = pd.CategoricalDtype(categories), validate = False)
+        data[coluna] = values
+    return pd.DataFrame(data, copy = False)
+
+def _detach(layout):
+
+    """ Esta função tem a responsabilidade de fechar, no processo do pool, blocos que não serão mais usados
+
+    Input: Layout em uso
+    Output: None """
+
+    names = {name for name, _, _ in layout['columns'].values()}
+    for name in [name for name in _attached if name not in names]:
+        try:
+            _attached[name].close()
+        except BufferError:
+            # Ainda há arrays apontando para o bloco: fica para a próxima tarefa
+            continue
+        del _attached[name]
+
+def _partial(layout, names, partition):
+
+    """ Esta função tem a responsabilidade de calcular, no processo do pool, os agregados parciais de uma partição
+
+    Input: Layout das colunas, agregados pedidos, partição ('rows', início, fim) ou ('City', código)
+    Output: Dicionário nome -> parcial """
+
+    _detach(layout)
+    df1 = attach_columns(layout)
+    if partition[0] == 'rows':
+        df1 = df1.iloc[partition[1]:partition[2]]
+    else:
+        df1 = df1.loc[df1[partition[0]].cat.codes.to_numpy() == partition[1], :]
+    return {name: PARTIALS[name][0](df1) for name in names}
+
+def partitions(df1, tasks, partition = 'date'):
+
+    """ Esta função tem a responsabilidade de dividir o dataset em partições independentes
+
+    Parâmetros:
+        - partition: 'date' (intervalos de dias contíguos com ~mesma quantidade de linhas) ou 'city'
+
+    Input: Dataframe limpo ordenado por Order_Date, quantidade de tarefas, tipo de partição
+    Output: Lista de partições """
+
+    if partition == 'city':
+        return [('City', code) for code in range(len(df1['City'].cat.categories))]
+    offsets = build_date_index(df1)['offsets']
+    targets = np.linspace(0, len(df1), tasks + 1)[1:-1]
+    cuts = np.unique(np.concatenate([[0], offsets[np.searchsorted(offsets, targets)], [len(df1)]]))
+    return [('rows', int(start), int(stop)) for start, stop in zip(cuts[:-1], cuts[1:]) if stop > start]
+
+def get_pool(workers):
+
+    """ Esta função tem a responsabilidade de manter o pool de processos do módulo
+
+    Os processos são criados com 'spawn' (seguro dentro do servidor do Streamlit, que usa threads)
+    e reaproveitados entre chamadas.
+
+    Input: Quantidade de processos
+    Output: ProcessPoolExecutor """
+
+    global _pool
+    with _pool_lock:
+        if _pool is None or _pool._max_workers != workers:
+            if _pool is not None:
+                _pool.shutdown()
+            _pool = ProcessPoolExecutor(max_workers = workers, mp_context = multiprocessing.get_context('spawn'))
+        return _pool
+
+def parallel_aggregates(df1, names = tuple(PARTIALS), workers = None, partition = 'date', tasks = None):
+
+    """ Esta função tem a responsabilidade de calcular agregados do dataset em vários processos
+
+    Parâmetros:
+        - names: agregados de PARTIALS
+        - workers: processos (padrão: default_workers())
+        - partition: 'date' ou 'city'
+        - tasks: quantidade de partições por data (padrão: 2 por processo, para equilibrar a carga)
+
+    Input: Dataframe limpo ordenado por Order_Date
+    Output: Dicionário nome -> agregado completo """
+
+    workers = workers or default_workers()
+    columns = list(dict.fromkeys(coluna for name in names for coluna in PARTIALS[name][2]))
+    parts = partitions(df1, tasks or 2 * workers, partition)
+    layout, blocks = share_columns(df1, columns)
+    try:
+        pool = get_pool(workers)
+        partials = list(pool.map(_partial, [layout] * len(parts), [list(names)] * len(parts), parts))
+    finally:
+        release(blocks)
+    return {name: PARTIALS[name][1](*[partial[name] for partial in partials]) for name in names}
+
+def parallel_builder(name, min_rows = PARALLEL_MIN_ROWS):
+
+    """ Esta função tem a responsabilidade de criar uma função de construção para load_derived
+
+    Datasets pequenos (ou máquinas com um só núcleo) são agregados no próprio processo.
+
+    Input: Nome do agregado, quantidade mínima de linhas para usar o pool
+    Output: Função builder(df1) """
+
+    def builder(df1):
+        if len(df1) < min_rows or default_workers() < 2:
+            return PARTIALS[name][0](df1)
+        return parallel_aggregates(df1, [name])[name]
+    builder.__name__ = 'parallel_' + name
+    return builder
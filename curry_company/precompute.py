@@ -0,0 +1,202 @@
+""" Pré-cálculo em segundo plano das visões caras a cada nova versão do dataset
+
+Algumas visões custam caro e só mudam quando os dados mudam: os rankings de
+entregadores, as medianas por cidade e trânsito do country_maps() e o tempo por
+cidade e trânsito do sunburst da Visão Restaurantes. Uma thread por processo
+confere a versão do dataset a cada CURRY_PRECOMPUTE_INTERVAL segundos (padrão:
+5) e, quando ela muda:
+
+1. carrega a versão nova sem publicá-la (loader.stage_snapshot): as sessões
+   continuam na versão anterior, com os seus resultados em cache;
+2. constrói na versão nova as estruturas derivadas que a anterior já tinha;
+3. calcula VIEWS para os estados de filtro mais pedidos de cada página (mais o
+   estado inicial da barra lateral) num pool de threads
+   (CURRY_PRECOMPUTE_WORKERS, padrão: 2), guardando os resultados no cache de
+   resultados sob a versão nova;
+4. publica a versão nova de uma vez (loader.publish) e descarta os resultados
+   da anterior.
+
+Cada rerun fixa uma versão no início (loader.pin_version), de modo que nenhuma
+tela mistura versões, e a primeira tela depois da troca já encontra estruturas
+e resultados prontos. Na partida, a versão carregada é aquecida da mesma forma.
+CURRY_PRECOMPUTE=0 desliga o agendador (as sessões voltam a trocar de versão
+sozinhas); CURRY_PRECOMPUTE_STATES (padrão: 8) limita os estados por página. """
+
+# Libraries
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import pandas as pd
+
+from curry_company import kpis, loader, results
+from curry_company.loader import DATASET_PATH
+
+DEFAULT_INTERVAL = 5
+DEFAULT_WORKERS = 2
+DEFAULT_STATES = 8
+
+# Visões calculadas de antemão (nomes de kpis.KPIS): rankings de entregadores,
+# medianas do country_maps() e tempo por cidade e trânsito do sunburst
+VIEWS = ['top_delivers', 'avg_rating_per_deliver', 'city_traffic_medians', 'avg_std_time_by_city_traffic']
+
+# Estado inicial da barra lateral de cada página
+_TRAFFIC = ['Low', 'Medium', 'High', 'Jam']
+_WEATHER = ['conditions Cloudy', 'conditions Fog', 'conditions Sandstorm', 'conditions Sunny', 'conditions Windy']
+DEFAULT_FILTERS = {
+    'visao_empresa': {'date_start': pd.Timestamp(2022, 2, 11), 'date_end': pd.Timestamp(2022, 3, 3), 'Road_traffic_density': _TRAFFIC},
+    'visao_entregadores': {'date_start': pd.Timestamp(2022, 2, 11), 'date_end': pd.Timestamp(2022, 3, 3),
+                           'Road_traffic_density': _TRAFFIC, 'Weatherconditions': _WEATHER},
+    'visao_restaurantes': {'date_start': pd.Timestamp(2022, 2, 11), 'date_end': pd.Timestamp(2022, 3, 3),
+                           'Road_traffic_density': _TRAFFIC, 'Weatherconditions': _WEATHER},
+}
+
+_enabled = os.environ.get('CURRY_PRECOMPUTE', '1') != '0'
+_interval = float(os.environ.get('CURRY_PRECOMPUTE_INTERVAL', DEFAULT_INTERVAL))
+_workers = int(os.environ.get('CURRY_PRECOMPUTE_WORKERS', DEFAULT_WORKERS))
+_states = int(os.environ.get('CURRY_PRECOMPUTE_STATES', DEFAULT_STATES))
+_executor = None
+# Agendadores em execução: caminho -> Thread
+_threads = {}
+# Último pré-cálculo de cada dataset: caminho -> dicionário (ver scheduler_status)
+_status = {}
+_lock = threading.Lock()
+
+logger = logging.getLogger(__name__)
+
+# =======================================
+# Funções
+# =======================================
+
+def _get_executor():
+
+    """ Esta função tem a responsabilidade de manter o pool de threads do pré-cálculo
+
+    Input: None
+    Output: ThreadPoolExecutor """
+
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers = max(_workers, 1), thread_name_prefix = 'curry-precompute')
+    return _executor
+
+def filter_states(page, limit = None):
+
+    """ Esta função tem a responsabilidade de escolher os estados de filtro a calcular de antemão numa página
+
+    O estado inicial da barra lateral vem primeiro; depois, os mais pedidos ao
+    cache de resultados (só os que usam os filtros dos KPIs).
+
+    Input: Página, quantidade máxima de estados (padrão: CURRY_PRECOMPUTE_STATES)
+    Output: Lista de dicionários de filtros """
+
+    limit = _states if limit is None else limit
+    estados = [results.normalize_filters(DEFAULT_FILTERS[page])] if page in DEFAULT_FILTERS else []
+    for filtros in results.common_filters(page, limit + 1):
+        if filtros not in estados and all(nome in kpis.FILTERS for nome, _ in filtros):
+            estados.append(filtros)
+    return [{nome: list(valor) if isinstance(valor, tuple) else valor for nome, valor in filtros} for filtros in estados[:limit]]
+
+def _compute(snapshot, name, filtros):
+    with loader.using(snapshot):
+        kpis.compute_kpi(name, filtros, snapshot.path)
+
+def warm_views(snapshot, views = VIEWS, limit = None):
+
+    """ Esta função tem a responsabilidade de calcular as visões de uma versão do dataset para os estados mais pedidos
+
+    As estruturas derivadas são construídas antes, nesta thread; as visões são
+    calculadas no pool e guardadas no cache de resultados sob a versão do Snapshot.
+    Uma visão que falha é apenas registrada: será calculada quando for pedida.
+
+    Input: Snapshot, nomes de KPIs, estados por página
+    Output: (visões calculadas, falhas) """
+
+    loader.build_structures(snapshot)
+    with loader.using(snapshot):
+        kpis.load_structures(snapshot.path)
+    executor = _get_executor()
+    tarefas = [(name, executor.submit(_compute, snapshot, name, filtros))
+               for name in views for filtros in filter_states(kpis.KPIS[name]['page'], limit)]
+    falhas = 0
+    for name, tarefa in tarefas:
+        try:
+            tarefa.result()
+        except Exception:
+            falhas += 1
+            logger.exception('Falha ao pré-calcular %s', name)
+    return len(tarefas) - falhas, falhas
+
+def refresh(path = DATASET_PATH):
+
+    """ Esta função tem a responsabilidade de executar um ciclo do agendador
+
+    Se a versão do disco for nova, ela é preparada, aquecida e publicada; se a
+    versão publicada ainda não foi aquecida (partida), é aquecida no lugar.
+
+    Input: Caminho do dataset
+    Output: Dicionário do ciclo (ver scheduler_status), ou None se não havia nada a fazer """
+
+    start = time.perf_counter()
+    snapshot = loader.stage_snapshot(path)
+    if snapshot is None:
+        snapshot = loader.current_snapshot(path)
+        with _lock:
+            if _status.get(path, {}).get('version') == snapshot.version:
+                return None
+        views, falhas = warm_views(snapshot)
+    else:
+        try:
+            views, falhas = warm_views(snapshot)
+        except Exception:
+            loader.discard_staged(snapshot)
+            raise
+        loader.publish(snapshot)
+        results.drop_stale(path)
+    status = {'version': snapshot.version, 'rows': len(snapshot.df1), 'views': views, 'errors': falhas,
+              'seconds': round(time.perf_counter() - start, 3), 'published_at': datetime.now().isoformat(timespec = 'seconds')}
+    with _lock:
+        _status[path] = status
+    return status
+
+def _loop(path):
+    while True:
+        try:
+            refresh(path)
+        except Exception:
+            logger.exception('Falha ao preparar a nova versão de %s', path)
+        time.sleep(_interval)
+
+def start_scheduler(path = DATASET_PATH):
+
+    """ Esta função tem a responsabilidade de iniciar o agendador de um dataset, uma única vez por processo
+
+    A partir daqui as versões novas do dataset só chegam às sessões depois de
+    aquecidas (loader.hold_versions).
+
+    Input: Caminho do dataset
+    Output: Thread do agendador (None se desligado por CURRY_PRECOMPUTE=0) """
+
+    if not _enabled or _interval <= 0:
+        return None
+    with _lock:
+        thread = _threads.get(path)
+        if thread is None:
+            loader.hold_versions(path)
+            thread = _threads[path] = threading.Thread(target = _loop, args = (path,), name = 'curry-precompute-scheduler', daemon = True)
+            thread.start()
+    return thread
+
+def scheduler_status(path = DATASET_PATH):
+
+    """ Esta função tem a responsabilidade de informar o último pré-cálculo de um dataset
+
+    Input: Caminho do dataset
+    Output: Dicionário com running, version, rows, views, errors, seconds e published_at """
+
+    with _lock:
+        return dict(_status.get(path, {}), running = path in _threads)
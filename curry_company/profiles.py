@@ -0,0 +1,242 @@
+""" Perfis por entregador: consulta O(1) pelo código inteiro, varreduras ordenadas paginadas e busca
+
+Cada entregador tem um código inteiro (dicionário de Delivery_person_ID, ver
+curry_company.encoding), e os perfis são arrays densos indexados por esse
+código: consultar um entregador é ler a posição do código em cada array, sem
+agrupar os pedidos. Para cada entregador são guardados:
+
+- quantidade de pedidos;
+- momentos da avaliação (count, sum, sumsq), para média e desvio padrão;
+- count, sum, min e max de Time_taken(min);
+- idade (a maior vista) e pedidos por veículo e por cidade.
+
+Os perfis se juntam como os momentos do cubo (somas, mínimos e máximos), de
+modo que lotes anexados são incorporados sem reler o histórico e o pool de
+processos (curry_company.parallel) pode montá-los por partição. A ordem de cada
+varredura (ex.: avaliação média decrescente) é calculada uma vez por versão e
+cada página custa O(tamanho da página). A busca por texto percorre só o
+dicionário de IDs (um valor por entregador), nunca os pedidos. """
+
+# Libraries
+import numpy as np
+import pandas as pd
+
+# Colunas do dataset usadas pelos perfis
+COLUMNS = ['Delivery_person_ID', 'Delivery_person_Ratings', 'Time_taken(min)', 'Delivery_person_Age', 'Type_of_vehicle', 'City']
+
+# Arrays somados ao juntar perfis; os demais são mínimos ou máximos
+SUMS = ['orders', 'rating_count', 'rating_sum', 'rating_sumsq', 'time_count', 'time_sum']
+
+# Colunas pelas quais uma varredura pode ser ordenada
+SORT_KEYS = ['orders', 'rating_mean', 'rating_std', 'time_min', 'time_mean', 'time_max', 'age']
+
+PAGE_SIZE = 20
+
+# =======================================
+# Funções
+# =======================================
+
+def _values(df1, coluna, valid):
+    return df1[coluna].to_numpy(dtype = 'float64', na_value = np.nan)[valid]
+
+def _counts(codes, labels, categories, size):
+
+    """ Esta função tem a responsabilidade de contar os pedidos de cada entregador por categoria
+
+    Input: Códigos dos entregadores, códigos das categorias (-1 = ausente), categorias, quantidade de entregadores
+    Output: Array (entregadores, categorias) """
+
+    present = labels >= 0
+    flat = codes[present] * len(categories) + labels[present]
+    return np.bincount(flat, minlength = size * len(categories)).reshape(size, len(categories)).astype('int32')
+
+def build_profiles(df1):
+
+    """ Esta função tem a responsabilidade de montar os perfis de todos os entregadores de um dataframe limpo
+
+    Input: Dataframe limpo (Delivery_person_ID codificado)
+    Output: Dicionário com size (códigos), os arrays de cada medida e as categorias de veículo e cidade """
+
+    codes = df1['Delivery_person_ID'].to_numpy()
+    valid = codes >= 0
+    codes = codes[valid].astype('int64')
+    size = int(codes.max()) + 1 if len(codes) else 0
+    profiles = {'size': size, 'orders': np.bincount(codes, minlength = size)}
+    for prefix, coluna in (('rating_', 'Delivery_person_Ratings'), ('time_', 'Time_taken(min)')):
+        values = _values(df1, coluna, valid)
+        present = ~np.isnan(values)
+        profiles[prefix + 'count'] = np.bincount(codes[present], minlength = size)
+        profiles[prefix + 'sum'] = np.bincount(codes[present], weights = values[present], minlength = size)
+        if prefix == 'rating_':
+            profiles['rating_sumsq'] = np.bincount(codes[present], weights = values[present] ** 2, minlength = size)
+    time = _values(df1, 'Time_taken(min)', valid)
+    profiles['time_min'] = np.full(size, np.nan)
+    profiles['time_max'] = np.full(size, np.nan)
+    np.fmin.at(profiles['time_min'], codes, time)
+    np.fmax.at(profiles['time_max'], codes, time)
+    profiles['age'] = np.full(size, np.nan)
+    np.fmax.at(profiles['age'], codes, _values(df1, 'Delivery_person_Age', valid))
+    for name, coluna in (('vehicle', 'Type_of_vehicle'), ('city', 'City')):
+        categorias = pd.Categorical(df1[coluna])
+        profiles[name + '_labels'] = pd.Index(categorias.categories)
+        profiles[name + '_orders'] = _counts(codes, categorias.codes[valid].astype('int64'), categorias.categories, size)
+    # Ordens das varreduras já calculadas: (coluna, crescente) -> códigos
+    profiles['orderings'] = {}
+    return profiles
+
+def _resize(values, size, fill):
+    return np.pad(values, (0, size - len(values)), constant_values = fill)
+
+def _align(profiles, name, labels, size):
+
+    """ Esta função tem a responsabilidade de colocar as contagens por categoria na ordem das categorias juntadas
+
+    Input: Perfis, 'vehicle' ou 'city', categorias juntadas, quantidade de entregadores
+    Output: Array (entregadores, categorias) """
+
+    counts = np.zeros((size, len(labels)), dtype = 'int32')
+    counts[:profiles['size'], labels.get_indexer(profiles[name + '_labels'])] = profiles[name + '_orders']
+    return counts
+
+def merge_profiles(*parts):
+
+    """ Esta função tem a responsabilidade de juntar perfis calculados em partes diferentes dos dados
+
+    Códigos novos (entregadores que só aparecem numa parte) ampliam os arrays;
+    categorias novas de veículo ou cidade ganham uma coluna.
+
+    Input: Perfis (build_profiles)
+    Output: Perfis juntados """
+
+    size = max(part['size'] for part in parts)
+    merged = {'size': size}
+    for name in SUMS:
+        merged[name] = sum(_resize(part[name], size, 0) for part in parts)
+    for name, combine in (('time_min', np.fmin), ('time_max', np.fmax), ('age', np.fmax)):
+        merged[name] = combine.reduce([_resize(part[name], size, np.nan) for part in parts])
+    for name in ('vehicle', 'city'):
+        labels = parts[0][name + '_labels']
+        for part in parts[1:]:
+            labels = labels.append(part[name + '_labels'].difference(labels))
+        merged[name + '_labels'] = labels
+        merged[name + '_orders'] = sum(_align(part, name, labels, size) for part in parts)
+    merged['orderings'] = {}
+    return merged
+
+def update_profiles(profiles, df1):
+
+    """ Esta função tem a responsabilidade de incorporar aos perfis apenas os pedidos novos
+
+    Input: Perfis, dataframe limpo com os pedidos novos
+    Output: Perfis atualizados """
+
+    if not len(df1):
+        return profiles
+    return merge_profiles(profiles, build_profiles(df1))
+
+def _columns(profiles, codes):
+
+    """ Esta função tem a responsabilidade de calcular as colunas do perfil de uma lista de entregadores
+
+    Input: Perfis, códigos
+    Output: Dicionário coluna -> array (uma posição por código) """
+
+    codes = np.asarray(codes, dtype = 'int64')
+    get = lambda name: profiles[name][codes]
+    rating_count, rating_sum = get('rating_count').astype('float64'), get('rating_sum')
+    rating_mean = rating_sum / np.where(rating_count > 0, rating_count, np.nan)
+    # Desvio padrão amostral (ddof=1), como em aggregates.finalize
+    rating_var = (get('rating_sumsq') - rating_sum * rating_mean) / np.where(rating_count > 1, rating_count - 1, np.nan)
+    time_count = get('time_count').astype('float64')
+    vehicle_orders = get('vehicle_orders')
+    vehicles = np.append(profiles['vehicle_labels'].to_numpy(dtype = object), None)
+    vehicle = np.where(vehicle_orders.sum(axis = 1) > 0, vehicle_orders.argmax(axis = 1), len(vehicles) - 1)
+    columns = {'Delivery_person_ID': codes.astype('int32'), 'orders': get('orders'),
+               'rating_mean': rating_mean, 'rating_std': np.sqrt(np.clip(rating_var, 0, None)),
+               'time_min': get('time_min'), 'time_mean': get('time_sum') / np.where(time_count > 0, time_count, np.nan),
+               'time_max': get('time_max'), 'age': get('age'), 'vehicle': vehicles[vehicle]}
+    city_orders = get('city_orders')
+    for position, city in enumerate(profiles['city_labels']):
+        columns[city] = city_orders[:, position]
+    return columns
+
+def lookup(profiles, code):
+
+    """ Esta função tem a responsabilidade de consultar o perfil de um entregador pelo código, em O(1)
+
+    Input: Perfis, código do entregador
+    Output: Dicionário coluna -> valor (None se o código não tiver pedidos) """
+
+    if not 0 <= code < profiles['size'] or profiles['orders'][code] == 0:
+        return None
+    return {coluna: values[0] for coluna, values in _columns(profiles, [code]).items()}
+
+def profile_frame(profiles, codes):
+
+    """ Esta função tem a responsabilidade de montar a tabela de perfis de uma lista de entregadores
+
+    Input: Perfis, códigos (na ordem desejada)
+    Output: Dataframe com uma linha por código (Delivery_person_ID ainda codificado) """
+
+    return pd.DataFrame(_columns(profiles, codes))
+
+def active_codes(profiles):
+
+    """ Esta função tem a responsabilidade de listar os códigos de entregadores com pedidos
+
+    Input: Perfis
+    Output: Array de códigos, crescente """
+
+    return np.flatnonzero(profiles['orders'] > 0)
+
+def ordering(profiles, sort_by = 'orders', ascending = False):
+
+    """ Esta função tem a responsabilidade de ordenar os entregadores por uma coluna do perfil, uma vez por versão
+
+    Valores ausentes ficam no fim; empates mantêm a ordem dos códigos.
+
+    Input: Perfis, coluna (SORT_KEYS), crescente ou decrescente
+    Output: Array de códigos ordenados """
+
+    if sort_by not in SORT_KEYS:
+        raise ValueError('coluna de ordenação desconhecida: %s' % sort_by)
+    key = (sort_by, bool(ascending))
+    order = profiles['orderings'].get(key)
+    if order is None:
+        codes = active_codes(profiles)
+        values = _columns(profiles, codes)[sort_by].astype('float64')
+        order = codes[np.argsort(values if ascending else -values, kind = 'stable')]
+        profiles['orderings'][key] = order
+    return order
+
+def scan(profiles, sort_by = 'orders', ascending = False, page = 0, page_size = PAGE_SIZE):
+
+    """ Esta função tem a responsabilidade de retornar uma página da varredura ordenada dos perfis
+
+    Input: Perfis, coluna de ordenação, crescente ou decrescente, página (a partir de 0), tamanho da página
+    Output: (Dataframe da página, quantidade total de entregadores) """
+
+    order = ordering(profiles, sort_by, ascending)
+    start = page * page_size
+    return profile_frame(profiles, order[start:start + page_size]), len(order)
+
+def search(profiles, dictionary, text, limit = PAGE_SIZE):
+
+    """ Esta função tem a responsabilidade de encontrar entregadores pelo ID ou por parte dele
+
+    O ID exato é achado pela tabela hash do dicionário; sem ele, o texto é
+    procurado (sem diferenciar maiúsculas) nos IDs do dicionário, um por entregador.
+
+    Input: Perfis, dicionário de Delivery_person_ID (pd.Index), texto, quantidade máxima de resultados
+    Output: Array de códigos encontrados (com pedidos), até limit """
+
+    text = text.strip()
+    if not text:
+        return np.zeros(0, dtype = 'int64')
+    code = dictionary.get_indexer([text])[0]
+    if code >= 0:
+        codes = np.array([code])
+    else:
+        codes = np.flatnonzero(dictionary.str.contains(text, case = False, regex = False))
+    codes = codes[codes < profiles['size']]
+    return codes[profiles['orders'][codes] > 0][:limit]
@@ -0,0 +1,343 @@
+""" Instrumentação dos reruns: tempo, linhas e memória de cada estágio nomeado
+
+Cada página abre um perfil no início do rerun (begin_rerun) e o fecha no fim
+(end_rerun). Entre os dois, os estágios marcados com stage() (leitura, limpeza,
+estruturas derivadas, consultas do cache de resultados, montagem das figuras,
+serialização dos mapas...) registram:
+
+- tempo de parede (com estágios aninhados, como load_dataset > read_raw);
+- linhas de entrada e de saída, quando o estágio as informa;
+- bytes alocados (pico acima da memória do início do estágio), só com
+  CURRY_PROFILE_MEMORY=1, que liga o tracemalloc no processo (o tracemalloc
+  deixa o código mais lento e mede as alocações de todas as threads).
+
+O perfil é guardado por thread: os estágios executados fora de um rerun (o
+aquecimento das seções em segundo plano, scripts) não são registrados e custam
+só uma consulta ao thread-local. Cada rerun fechado alimenta:
+
+- o histórico por página (page_summary: p50/p95 dos últimos reruns);
+- as métricas no formato texto do Prometheus (prometheus_text), servidas pela
+  API em /metrics e, no processo do Streamlit, numa porta própria quando
+  CURRY_METRICS_PORT estiver definida;
+- uma linha JSON por rerun no arquivo CURRY_PROFILE_LOG, se definido. """
+
+# Libraries
+import json
+import logging
+import os
+import threading
+import time
+import tracemalloc
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+import pandas as pd
+
+# Limites dos buckets do histograma de duração dos reruns (segundos)
+BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+# Reruns guardados por página para os percentis do painel
+HISTORY = 500
+
+DEBUG = os.environ.get('CURRY_DEBUG') == '1'
+MEMORY = os.environ.get('CURRY_PROFILE_MEMORY') == '1'
+LOG_PATH = os.environ.get('CURRY_PROFILE_LOG')
+
+if MEMORY and not tracemalloc.is_tracing():
+    tracemalloc.start()
+
+_local = threading.local()
+_lock = threading.Lock()
+# Página -> durações dos últimos reruns
+_history = defaultdict(lambda: deque(maxlen = HISTORY))
+# Página -> [contagem por bucket, soma, quantidade]
+_reruns = {}
+# (página, estágio) -> [segundos, chamadas, linhas de saída, bytes]
+_stages = defaultdict(lambda: [0.0, 0, 0, 0])
+_server = None
+
+logger = logging.getLogger(__name__)
+
+class Stage:
+
+    """ Um estágio medido: nome, tempo, linhas de entrada/saída e bytes alocados """
+
+    __slots__ = ('name', 'depth', 'seconds', 'rows_in', 'rows_out', 'alloc_bytes', 'cache', '_start', '_memory', '_peak')
+
+    def __init__(self, name, depth, rows_in = None):
+        self.name, self.depth, self.rows_in = name, depth, rows_in
+        self.seconds = self.rows_out = self.alloc_bytes = self.cache = None
+
+    def as_dict(self):
+        return {'stage': self.name, 'depth': self.depth, 'seconds': self.seconds, 'rows_in': self.rows_in,
+                'rows_out': self.rows_out, 'alloc_bytes': self.alloc_bytes, 'cache': self.cache}
+
+class Profile:
+
+    """ Os estágios de um rerun de uma página, na ordem em que começaram """
+
+    def __init__(self, page):
+        self.page = page
+        self.stages = []
+        self.open = []
+        self.seconds = None
+        self._start = time.perf_counter()
+
+# =======================================
+# Funções
+# =======================================
+
+def rows_of(obj):
+
+    """ Esta função tem a responsabilidade de contar as linhas de um resultado
+
+    Input: Dataframe, série, array, tupla deles ou outro objeto
+    Output: Quantidade de linhas (None se não se aplicar) """
+
+    if isinstance(obj, (pd.DataFrame, pd.Series, np.ndarray)):
+        return len(obj)
+    if isinstance(obj, tuple):
+        rows = [rows_of(item) for item in obj]
+        return sum(rows) if any(row is not None for row in rows) and None not in rows else None
+    return None
+
+def current():
+
+    """ Esta função tem a responsabilidade de retornar o perfil do rerun em andamento nesta thread
+
+    Input: None
+    Output: Profile ou None """
+
+    return getattr(_local, 'profile', None)
+
+def begin_rerun(page):
+
+    """ Esta função tem a responsabilidade de abrir o perfil de um rerun da página
+
+    Um perfil deixado aberto por um rerun interrompido é descartado.
+
+    Input: Nome da página
+    Output: Profile """
+
+    if 'CURRY_METRICS_PORT' in os.environ:
+        start_metrics_server(int(os.environ['CURRY_METRICS_PORT']))
+    _local.profile = Profile(page)
+    return _local.profile
+
+def end_rerun():
+
+    """ Esta função tem a responsabilidade de fechar o perfil do rerun e publicá-lo nas métricas
+
+    Input: None
+    Output: Profile fechado (None se não havia rerun aberto) """
+
+    profile = current()
+    if profile is None:
+        return None
+    _local.profile = None
+    profile.seconds = time.perf_counter() - profile._start
+    with _lock:
+        _history[profile.page].append(profile.seconds)
+        buckets, _, _ = rerun = _reruns.setdefault(profile.page, [[0] * len(BUCKETS), 0.0, 0])
+        for i, limite in enumerate(BUCKETS):
+            buckets[i] += profile.seconds <= limite
+        rerun[1] += profile.seconds
+        rerun[2] += 1
+        for item in profile.stages:
+            totals = _stages[(profile.page, item.name)]
+            totals[0] += item.seconds
+            totals[1] += 1
+            totals[2] += item.rows_out or 0
+            totals[3] += item.alloc_bytes or 0
+    if LOG_PATH:
+        _write_log(profile)
+    return profile
+
+@contextmanager
+def rerun(page):
+
+    """ Esta função tem a responsabilidade de medir um bloco como um rerun (ex.: um pedido da API)
+
+    Se já houver um rerun aberto na thread, o bloco é medido como um estágio dele.
+
+    Input: Nome da página
+    Output: Context manager que fornece o Profile """
+
+    if current() is not None:
+        with stage(page):
+            yield current()
+        return
+    profile = begin_rerun(page)
+    try:
+        yield profile
+    finally:
+        end_rerun()
+
+@contextmanager
+def stage(name, rows_in = None):
+
+    """ Esta função tem a responsabilidade de medir um estágio nomeado do rerun em andamento
+
+    O estágio fornecido pode receber rows_out (e cache = 'hit'/'miss') dentro do
+    bloco. Fora de um rerun o bloco apenas executa.
+
+    Input: Nome do estágio, linhas de entrada (opcional)
+    Output: Context manager que fornece o Stage (ou None fora de um rerun) """
+
+    profile = current()
+    if profile is None:
+        yield None
+        return
+    item = Stage(name, len(profile.open), rows_in)
+    profile.stages.append(item)
+    if MEMORY:
+        item._memory = tracemalloc.get_traced_memory()[0]
+        # O pico é global: o do estágio de fora é guardado antes de zerá-lo para este
+        if profile.open:
+            parent = profile.open[-1]
+            parent._peak = max(parent._peak, tracemalloc.get_traced_memory()[1])
+        tracemalloc.reset_peak()
+        item._peak = 0
+    profile.open.append(item)
+    item._start = time.perf_counter()
+    try:
+        yield item
+    finally:
+        item.seconds = time.perf_counter() - item._start
+        profile.open.pop()
+        if MEMORY:
+            peak = max(item._peak, tracemalloc.get_traced_memory()[1])
+            item.alloc_bytes = max(0, peak - item._memory)
+            if profile.open:
+                profile.open[-1]._peak = max(profile.open[-1]._peak, peak)
+
+def profiled(name, func, *args, **kwargs):
+
+    """ Esta função tem a responsabilidade de executar uma função como um estágio, contando as linhas
+
+    As linhas de entrada vêm do primeiro argumento com linhas; as de saída, do resultado.
+
+    Input: Nome do estágio, função e argumentos
+    Output: Resultado da função """
+
+    rows_in = next((rows for rows in map(rows_of, args) if rows is not None), None)
+    with stage(name, rows_in) as item:
+        result = func(*args, **kwargs)
+        if item is not None:
+            item.rows_out = rows_of(result)
+    return result
+
+def stage_table(profile):
+
+    """ Esta função tem a responsabilidade de montar a tabela de estágios de um rerun para o painel
+
+    Input: Profile fechado
+    Output: Dataframe com estágio (indentado pela profundidade), ms, linhas, KB alocados e cache """
+
+    rows = [{'estágio': '  ' * item.depth + item.name, 'ms': round(item.seconds * 1000, 1),
+             'linhas (entrada)': item.rows_in, 'linhas (saída)': item.rows_out,
+             'KB alocados': None if item.alloc_bytes is None else round(item.alloc_bytes / 1024, 1), 'cache': item.cache}
+            for item in profile.stages]
+    rows.append({'estágio': 'total do rerun', 'ms': round(profile.seconds * 1000, 1)})
+    table = pd.DataFrame(rows).astype({'linhas (entrada)': 'Int64', 'linhas (saída)': 'Int64'})
+    return table.dropna(axis = 1, how = 'all')
+
+def page_summary():
+
+    """ Esta função tem a responsabilidade de resumir a duração dos últimos reruns de cada página
+
+    Input: None
+    Output: Dataframe com reruns, p50, p95 e máximo (ms) por página """
+
+    with _lock:
+        history = {page: np.array(durations) * 1000 for page, durations in _history.items() if durations}
+    return pd.DataFrame([{'página': page, 'reruns': len(ms), 'p50 (ms)': round(float(np.percentile(ms, 50)), 1),
+                          'p95 (ms)': round(float(np.percentile(ms, 95)), 1), 'máx. (ms)': round(float(ms.max()), 1)}
+                         for page, ms in sorted(history.items())])
+
+def _label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def prometheus_text():
+
+    """ Esta função tem a responsabilidade de exportar as métricas no formato texto do Prometheus
+
+    curry_rerun_seconds é um histograma por página (o p95 sai de
+    histogram_quantile(0.95, rate(curry_rerun_seconds_bucket[5m])));
+    curry_stage_* são contadores por página e estágio.
+
+    Input: None
+    Output: Texto (versão 0.0.4 do formato) """
+
+    with _lock:
+        reruns = {page: (list(buckets), total, count) for page, (buckets, total, count) in _reruns.items()}
+        stages = {key: list(values) for key, values in _stages.items()}
+    linhas = ['# HELP curry_rerun_seconds Duração dos reruns por página.', '# TYPE curry_rerun_seconds histogram']
+    for page, (buckets, total, count) in sorted(reruns.items()):
+        for limite, quantidade in zip(BUCKETS, buckets):
+            linhas.append(f'curry_rerun_seconds_bucket{{page="{_label(page)}",le="{limite}"}} {quantidade}')
+        linhas.append(f'curry_rerun_seconds_bucket{{page="{_label(page)}",le="+Inf"}} {count}')
+        linhas.append(f'curry_rerun_seconds_sum{{page="{_label(page)}"}} {total}')
+        linhas.append(f'curry_rerun_seconds_count{{page="{_label(page)}"}} {count}')
+    metricas = [('curry_stage_seconds_total', 'Tempo gasto em cada estágio.', 0),
+                ('curry_stage_calls_total', 'Execuções de cada estágio.', 1),
+                ('curry_stage_rows_total', 'Linhas produzidas por cada estágio.', 2),
+                ('curry_stage_alloc_bytes_total', 'Bytes alocados por cada estágio (CURRY_PROFILE_MEMORY=1).', 3)]
+    for nome, ajuda, posicao in metricas:
+        linhas += [f'# HELP {nome} {ajuda}', f'# TYPE {nome} counter']
+        for (page, name), values in sorted(stages.items()):
+            linhas.append(f'{nome}{{page="{_label(page)}",stage="{_label(name)}"}} {values[posicao]}')
+    return '\n'.join(linhas) + '\n'
+
+def _write_log(profile):
+
+    """ Esta função tem a responsabilidade de gravar o rerun como uma linha JSON no CURRY_PROFILE_LOG
+
+    Input: Profile fechado
+    Output: None """
+
+    record = {'time': time.time(), 'page': profile.page, 'seconds': profile.seconds,
+              'stages': [item.as_dict() for item in profile.stages]}
+    try:
+        with open(LOG_PATH, 'a') as f:
+            f.write(json.dumps(record) + '\n')
+    except OSError:
+        logger.exception('Falha ao gravar o log de perfil em %s', LOG_PATH)
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        if self.path.split('?')[0] != '/metrics':
+            self.send_error(404)
+            return
+        body = prometheus_text().encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+def start_metrics_server(port, address = ''):
+
+    """ Esta função tem a responsabilidade de servir /metrics numa thread do processo (uma vez por processo)
+
+    Usada no processo do Streamlit, que não permite rotas próprias.
+
+    Input: Porta, endereço
+    Output: ThreadingHTTPServer (None se a porta estiver ocupada) """
+
+    global _server
+    with _lock:
+        if _server is None:
+            try:
+                _server = ThreadingHTTPServer((address, port), _MetricsHandler)
+            except OSError:
+                logger.exception('Falha ao abrir a porta de métricas %s', port)
+                _server = False
+            else:
+                threading.Thread(target = _server.serve_forever, name = 'curry-metrics', daemon = True).start()
+    return _server or None
@@ -0,0 +1,153 @@
+""" Cache de renderização: figuras Plotly em JSON e mapas Folium em HTML
+
+A chave é o gráfico mais o hash do conteúdo do dataframe agregado (e dos
+parâmetros do gráfico): filtros diferentes que produzem o mesmo agregado
+compartilham a mesma figura. Num acerto, o Plotly Express e o Folium não são
+chamados: o JSON guardado vai direto para o navegador (plotly_chart, sem montar
+nem serializar um go.Figure de novo) e o mapa já vem como HTML pronto. O
+orçamento de memória pode ser definido pela variável de ambiente
+CURRY_RENDER_BYTES. """
+
+# Libraries
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+
+import folium
+import pandas as pd
+import streamlit as st
+from streamlit.elements.form import current_form_id
+from streamlit.proto.PlotlyChart_pb2 import PlotlyChart as PlotlyChartProto
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+from streamlit.runtime.state.common import compute_widget_id
+
+from curry_company import profiling
+
+DEFAULT_BUDGET = 32 * 2 ** 20
+
+# Renderizações: chave -> texto (JSON ou HTML), da usada há mais tempo para a mais recente
+_renders = OrderedDict()
+_stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'bytes': 0}
+_budget = int(os.environ.get('CURRY_RENDER_BYTES', DEFAULT_BUDGET))
+_lock = threading.Lock()
+
+# =======================================
+# Funções
+# =======================================
+
+def content_hash(df_aux, **params):
+
+    """ Esta função tem a responsabilidade de calcular o hash do conteúdo de um dataframe agregado
+
+    Parâmetros que também são dataframes (ex.: uma segunda camada do mapa) entram pelo conteúdo.
+
+    Input: Dataframe (colunas, tipos, índice e valores), parâmetros do gráfico
+    Output: Texto hexadecimal """
+
+    h = hashlib.blake2b(digest_size = 16)
+    h.update(repr((list(df_aux.columns), [str(dtype) for dtype in df_aux.dtypes])).encode())
+    h.update(pd.util.hash_pandas_object(df_aux, index = True).to_numpy().tobytes())
+    for nome, valor in sorted(params.items()):
+        h.update(nome.encode())
+        h.update((content_hash(valor) if isinstance(valor, pd.DataFrame) else repr(valor)).encode())
+    return h.hexdigest()
+
+def _cached_text(key, render):
+
+    """ Esta função tem a responsabilidade de retornar o texto renderizado, gerando-o só uma vez
+
+    No perfil do rerun, cada consulta é o estágio 'figure/<gráfico>' ou 'map/<gráfico>'.
+
+    Input: Chave, função que gera o texto
+    Output: Texto (JSON ou HTML) """
+
+    with profiling.stage('%s/%s' % key[:2]) as item:
+        with _lock:
+            text = _renders.get(key)
+            if text is not None:
+                _renders.move_to_end(key)
+                _stats['hits'] += 1
+            else:
+                _stats['misses'] += 1
+        if item is not None:
+            item.cache = 'miss' if text is None else 'hit'
+        if text is None:
+            text = _render(key, render)
+    return text
+
+def _render(key, render):
+    text = render()
+    with _lock:
+        if key not in _renders and len(text) <= _budget:
+            _renders[key] = text
+            _stats['bytes'] += len(text)
+            while _stats['bytes'] > _budget:
+                _stats['bytes'] -= len(_renders.popitem(last = False)[1])
+                _stats['evictions'] += 1
+    return text
+
+def cached_figure(chart, build, df_aux, **params):
+
+    """ Esta função tem a responsabilidade de retornar a figura Plotly de um agregado sem reconstruí-la
+
+    Parâmetros:
+        - chart: nome do gráfico
+        - build: função que monta a figura, chamada como build(df_aux, **params) em caso de falta
+          (ex.: px.bar com params x = 'Order_Date', y = 'orders')
+
+    Input: Nome, função, dataframe agregado, parâmetros
+    Output: JSON da figura (texto), para plotly_chart """
+
+    key = ('figure', chart, content_hash(df_aux, **params))
+    return _cached_text(key, lambda: build(df_aux, **params).to_json())
+
+def plotly_chart(spec, use_container_width = False):
+
+    """ Esta função tem a responsabilidade de exibir uma figura já serializada, sem montá-la nem serializá-la de novo
+
+    Faz o mesmo que st.plotly_chart (tema do Streamlit, sem seleção), mas o
+    st.plotly_chart reconstrói e serializa a figura a cada rerun; aqui o JSON de
+    cached_figure vai como está. Usa a mensagem interna do Streamlit 1.35
+    (versão fixada em requirements.txt).
+
+    Input: JSON da figura (cached_figure), usar a largura do contêiner
+    Output: DeltaGenerator do gráfico """
+
+    # Como st.plotly_chart: o gerador principal encaminha para o contêiner ativo (with col1:)
+    dg = st._main
+    proto = PlotlyChartProto()
+    proto.use_container_width = use_container_width
+    proto.theme = 'streamlit'
+    proto.form_id = current_form_id(dg)
+    proto.spec = spec
+    proto.config = json.dumps({'showLink': False, 'linkText': False})
+    ctx = get_script_run_ctx()
+    proto.id = compute_widget_id('plotly_chart', user_key = None, key = None, plotly_spec = proto.spec, plotly_config = proto.config,
+                                 selection_mode = ('points', 'box', 'lasso'), is_selection_activated = False, theme = 'streamlit',
+                                 form_id = proto.form_id, use_container_width = use_container_width,
+                                 page = ctx.page_script_hash if ctx else None)
+    return dg._enqueue('plotly_chart', proto)
+
+def cached_map_html(chart, build, df_aux, **params):
+
+    """ Esta função tem a responsabilidade de retornar o HTML de um mapa Folium sem reconstruí-lo
+
+    O HTML é o mesmo que o streamlit_folium.folium_static envia ao navegador.
+
+    Input: Nome, função que monta o folium.Map (build(df_aux, **params)), dataframe agregado, parâmetros
+    Output: HTML """
+
+    key = ('map', chart, content_hash(df_aux, **params))
+    return _cached_text(key, lambda: folium.Figure().add_child(build(df_aux, **params)).render())
+
+def render_stats():
+
+    """ Esta função tem a responsabilidade de informar o uso do cache de renderização
+
+    Input: None
+    Output: Dicionário com hits, misses, evictions, entries, bytes e budget """
+
+    with _lock:
+        return dict(_stats, entries = len(_renders), budget = _budget)
@@ -0,0 +1,241 @@
+""" Cache de resultados por combinação de filtros, compartilhado por todas as sessões
+
+Cada gráfico guarda o dataframe agregado (não a figura) sob a chave
+(página, gráfico, filtros normalizados, versão do dataset). Quando a soma dos
+tamanhos passa do orçamento de memória, os resultados usados há mais tempo são
+descartados (LRU). Os contadores de acertos e faltas ajudam a dimensionar o
+orçamento, que pode ser definido pela variável de ambiente CURRY_RESULTS_BYTES.
+
+Cada consulta também conta o estado de filtros pedido em cada página: são os
+estados que curry_company.precompute calcula de antemão quando o dataset muda. """
+
+# Libraries
+import os
+import sys
+import threading
+from collections import Counter, OrderedDict
+from datetime import date, datetime
+
+import numpy as np
+import pandas as pd
+
+from curry_company import profiling
+from curry_company.loader import DATASET_PATH, live_versions, load_version
+
+DEFAULT_BUDGET = 64 * 2 ** 20
+# Estados de filtro distintos contados; acima disso, ficam só os mais pedidos
+DEMAND_STATES = 1024
+
+# Resultados: chave -> (objeto, bytes), do usado há mais tempo para o mais recente
+_results = OrderedDict()
+_stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'bytes': 0}
+_budget = int(os.environ.get('CURRY_RESULTS_BYTES', DEFAULT_BUDGET))
+# Consultas por (página, filtros normalizados)
+_demand = Counter()
+_lock = threading.Lock()
+
+# =======================================
+# Funções
+# =======================================
+
+def _normalize(value):
+
+    """ Esta função tem a responsabilidade de normalizar o valor de um filtro para uso na chave
+
+    Listas de opções viram tuplas ordenadas sem repetição (a ordem escolhida no
+    multiselect não muda o resultado) e datas viram pd.Timestamp.
+
+    Input: Valor do filtro
+    Output: Valor imutável e comparável """
+
+    if isinstance(value, (list, tuple, set, frozenset, np.ndarray, pd.Index)):
+        return tuple(sorted({_normalize(item) for item in value}, key = repr))
+    if isinstance(value, (datetime, date, np.datetime64)):
+        return pd.Timestamp(value)
+    return value
+
+def normalize_filters(filtros):
+
+    """ Esta função tem a responsabilidade de transformar o estado da barra lateral numa chave de cache
+
+    Input: Dicionário de filtros (ex.: date_end, Road_traffic_density)
+    Output: Tupla ordenada de (filtro, valor normalizado) """
+
+    return tuple(sorted((nome, _normalize(valor)) for nome, valor in filtros.items()))
+
+def _nbytes(obj):
+
+    """ Esta função tem a responsabilidade de estimar a memória ocupada por um resultado
+
+    Input: Dataframe, série, array, tupla/lista de resultados ou valor simples
+    Output: Bytes """
+
+    if isinstance(obj, pd.DataFrame):
+        return int(obj.memory_usage(index = True, deep = True).sum())
+    if isinstance(obj, pd.Series):
+        return int(obj.memory_usage(index = True, deep = True))
+    if isinstance(obj, np.ndarray):
+        return obj.nbytes
+    if isinstance(obj, (tuple, list)):
+        return sys.getsizeof(obj) + sum(_nbytes(item) for item in obj)
+    return sys.getsizeof(obj)
+
+def _share(obj):
+
+    """ Esta função tem a responsabilidade de entregar o resultado sem expor o objeto guardado
+
+    Com copy-on-write a cópia rasa não copia dados, e alterações feitas por quem
+    recebeu o resultado não chegam ao cache.
+
+    Input: Resultado guardado
+    Output: Resultado para a sessão """
+
+    if isinstance(obj, (pd.DataFrame, pd.Series)):
+        return obj.copy(deep = False)
+    if isinstance(obj, tuple):
+        return tuple(_share(item) for item in obj)
+    return obj
+
+def cached_result(page, chart, filtros, compute, *args, path = DATASET_PATH, **kwargs):
+
+    """ Esta função tem a responsabilidade de retornar o resultado agregado de um gráfico, calculando-o só uma vez
+
+    Parâmetros:
+        - page, chart: nomes da página e do gráfico
+        - filtros: estado da barra lateral que determina o resultado
+        - compute, args, kwargs: função que calcula o resultado, chamada como compute(*args, **kwargs) em caso de falta
+
+    No perfil do rerun, cada consulta é um estágio com o nome do gráfico.
+
+    Input: Página, gráfico, filtros, função e argumentos, caminho do dataset
+    Output: Resultado (dataframe agregado, série, valor...) """
+
+    key = (page, chart, normalize_filters(filtros), path, load_version(path))
+    with profiling.stage(chart) as item:
+        with _lock:
+            _count_demand(page, key[2])
+            cached = _results.get(key)
+            if cached is not None:
+                _results.move_to_end(key)
+                _stats['hits'] += 1
+            else:
+                _stats['misses'] += 1
+        if cached is not None:
+            obj = cached[0]
+        else:
+            obj = compute(*args, **kwargs)
+            _store(key, obj)
+        if item is not None:
+            item.cache = 'miss' if cached is None else 'hit'
+            item.rows_out = profiling.rows_of(obj)
+    return _share(obj)
+
+def _store(key, obj):
+
+    """ Esta função tem a responsabilidade de guardar um resultado respeitando o orçamento de memória
+
+    Resultados de versões anteriores do mesmo dataset são descartados primeiro,
+    exceto os da versão publicada e da que está sendo preparada (ver loader.live_versions).
+
+    Input: Chave, resultado
+    Output: None """
+
+    nbytes = _nbytes(obj)
+    live = live_versions(key[3]) | {key[4]}
+    with _lock:
+        _drop_versions(key[3], live)
+        if key in _results:
+            _stats['bytes'] -= _results.pop(key)[1]
+        if nbytes > _budget:
+            return
+        _results[key] = (obj, nbytes)
+        _stats['bytes'] += nbytes
+        _evict()
+
+def _drop_versions(path, live):
+    for old in [old for old in _results if old[3] == path and old[4] not in live]:
+        _stats['bytes'] -= _results.pop(old)[1]
+
+def drop_stale(path = DATASET_PATH):
+
+    """ Esta função tem a responsabilidade de descartar os resultados de versões do dataset que não voltam a ser pedidas
+
+    Input: Caminho do dataset
+    Output: None """
+
+    live = live_versions(path)
+    with _lock:
+        _drop_versions(path, live)
+
+def _count_demand(page, filtros):
+
+    """ Esta função tem a responsabilidade de contar uma consulta ao estado de filtros de uma página
+
+    Input: Página, filtros normalizados (chamada com o lock adquirido)
+    Output: None """
+
+    _demand[(page, filtros)] += 1
+    if len(_demand) > DEMAND_STATES:
+        mais_pedidos = _demand.most_common(DEMAND_STATES // 2)
+        _demand.clear()
+        _demand.update(dict(mais_pedidos))
+
+def common_filters(page, limit):
+
+    """ Esta função tem a responsabilidade de listar os estados de filtro mais pedidos de uma página
+
+    Input: Página, quantidade máxima de estados
+    Output: Lista de filtros normalizados (tuplas de normalize_filters), do mais pedido para o menos """
+
+    with _lock:
+        estados = [(count, filtros) for (pagina, filtros), count in _demand.items() if pagina == page]
+    estados.sort(key = lambda item: -item[0])
+    return [filtros for _, filtros in estados[:limit]]
+
+def _evict():
+
+    """ Esta função tem a responsabilidade de descartar os resultados usados há mais tempo até caber no orçamento
+
+    Input: None (chamada com o lock adquirido)
+    Output: None """
+
+    while _stats['bytes'] > _budget and _results:
+        _stats['bytes'] -= _results.popitem(last = False)[1][1]
+        _stats['evictions'] += 1
+
+def set_budget(nbytes):
+
+    """ Esta função tem a responsabilidade de alterar o orçamento de memória do cache
+
+    Input: Bytes
+    Output: None """
+
+    global _budget
+    with _lock:
+        _budget = int(nbytes)
+        _evict()
+
+def cache_stats():
+
+    """ Esta função tem a responsabilidade de informar o uso do cache
+
+    Input: None
+    Output: Dicionário com hits, misses, evictions, entries, bytes, budget e hit_rate """
+
+    with _lock:
+        stats = dict(_stats, entries = len(_results), budget = _budget)
+    consultas = stats['hits'] + stats['misses']
+    stats['hit_rate'] = stats['hits'] / consultas if consultas else 0.0
+    return stats
+
+def clear_results():
+
+    """ Esta função tem a responsabilidade de esvaziar o cache e zerar os contadores
+
+    Input: None
+    Output: None """
+
+    with _lock:
+        _results.clear()
+        _demand.clear()
+        _stats.update(hits = 0, misses = 0, evictions = 0, bytes = 0)
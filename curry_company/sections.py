@@ -0,0 +1,133 @@
+""" Seções preguiçosas: cada aba declara o que calcula e só a aba escolhida executa
+
+O st.tabs do Streamlit executa o conteúdo de todas as abas a cada rerun (o
+navegador apenas esconde as que não estão visíveis). Aqui cada seção é um par
+(render, warm):
+
+- render: desenha a seção (widgets, gráficos); roda só para a seção escolhida;
+- warm: o cálculo da seção, sem chamadas ao Streamlit (passa por cached_result e
+  cached_figure / cached_map_html). As seções escondidas têm o warm executado em
+  segundo plano depois que a seção visível foi desenhada, de modo que trocar de
+  aba encontra os resultados já no cache.
+
+Se a seção escolhida ainda estiver sendo aquecida em segundo plano, o render
+espera o aquecimento terminar em vez de repetir o cálculo. O aquecimento usa a
+mesma versão do dataset fixada pelo rerun que o agendou. A quantidade de
+threads de aquecimento vem da variável de ambiente CURRY_PREFETCH_WORKERS
+(padrão: 1; 0 desliga o aquecimento). """
+
+# Libraries
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from curry_company import loader, profiling
+from curry_company.results import normalize_filters
+
+DEFAULT_WORKERS = 1
+
+_workers = int(os.environ.get('CURRY_PREFETCH_WORKERS', DEFAULT_WORKERS))
+_executor = None
+# Aquecimentos em andamento: (página, seção, filtros normalizados) -> Future
+_pending = {}
+_lock = threading.Lock()
+
+logger = logging.getLogger(__name__)
+
+# =======================================
+# Funções
+# =======================================
+
+def _key(page, section, filtros):
+    return (page, section, normalize_filters(filtros))
+
+def _get_executor():
+
+    """ Esta função tem a responsabilidade de manter o pool de threads de aquecimento do processo
+
+    Input: None
+    Output: ThreadPoolExecutor """
+
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers = _workers, thread_name_prefix = 'curry-prefetch')
+    return _executor
+
+def _warm(key, warm):
+
+    """ Esta função tem a responsabilidade de executar o aquecimento de uma seção em segundo plano
+
+    Erros são apenas registrados: a seção será calculada normalmente quando for exibida.
+
+    Input: Chave do aquecimento, função warm
+    Output: None """
+
+    try:
+        warm()
+    except Exception:
+        logger.exception('Falha ao aquecer a seção %s', key[:2])
+    finally:
+        with _lock:
+            _pending.pop(key, None)
+
+def prefetch(page, section, filtros, warm):
+
+    """ Esta função tem a responsabilidade de agendar o aquecimento de uma seção escondida
+
+    Um mesmo aquecimento (página, seção, filtros) não é agendado duas vezes enquanto estiver em andamento.
+
+    Input: Página, seção, filtros da barra lateral, função warm
+    Output: Future (None se o aquecimento estiver desligado ou já agendado) """
+
+    if _workers <= 0:
+        return None
+    key = _key(page, section, filtros)
+    with _lock:
+        if key in _pending:
+            return None
+        future = _pending[key] = _get_executor().submit(_warm, key, loader.bind_versions(warm))
+    return future
+
+def wait_prefetch(page, section, filtros):
+
+    """ Esta função tem a responsabilidade de esperar o aquecimento em andamento de uma seção
+
+    Input: Página, seção, filtros da barra lateral
+    Output: None """
+
+    with _lock:
+        future = _pending.get(_key(page, section, filtros))
+    if future is not None:
+        future.result()
+
+def render_sections(page, sections, selected, filtros):
+
+    """ Esta função tem a responsabilidade de desenhar a seção escolhida e aquecer as demais
+
+    Parâmetros:
+        - sections: dicionário nome -> (render, warm); warm pode ser None (nada a aquecer)
+        - selected: nome da seção escolhida (ex.: valor de um st.radio)
+
+    Input: Página, seções, seção escolhida, filtros da barra lateral
+    Output: Valor retornado pelo render da seção escolhida """
+
+    render, _ = sections[selected]
+    with profiling.stage('wait_prefetch'):
+        wait_prefetch(page, selected, filtros)
+    with profiling.stage('section/' + selected):
+        result = render()
+    for section, (_, warm) in sections.items():
+        if section != selected and warm is not None:
+            prefetch(page, section, filtros, warm)
+    return result
+
+def pending_prefetches():
+
+    """ Esta função tem a responsabilidade de informar os aquecimentos em andamento
+
+    Input: None
+    Output: Lista de (página, seção) """
+
+    with _lock:
+        return [key[:2] for key in _pending]
@@ -0,0 +1,133 @@
+""" Índice espacial em grade hierárquica para os mapas de calor
+
+As coordenadas de restaurantes e locais de entrega são convertidas para a grade
+de tiles Web Mercator (a mesma dos mapas) no nível BASE_LEVEL. O índice de cada
+célula é (x, y): a célula-mãe no nível z é (x >> (BASE_LEVEL - z), y >> (BASE_LEVEL - z)),
+como nos prefixos de um geohash. Cada célula guarda, por dia e tipo de tráfego, a
+quantidade de pedidos e os momentos de Time_taken(min); um mapa de calor em
+qualquer nível de zoom soma as células filhas, sem voltar aos pedidos. """
+
+# Libraries
+import numpy as np
+import pandas as pd
+
+from curry_company.aggregates import MOMENTS, finalize
+
+# Nível da grade guardada (~2,4 km de lado no equador)
+BASE_LEVEL = 14
+
+# Latitude máxima da projeção Web Mercator
+MAX_LATITUDE = 85.05112878
+
+# Tipo de ponto -> colunas de latitude e longitude
+POINTS = {
+    'delivery': ('Delivery_location_latitude', 'Delivery_location_longitude'),
+    'restaurant': ('Restaurant_latitude', 'Restaurant_longitude'),
+}
+
+DIMENSIONS = ['Order_Date', 'Road_traffic_density']
+
+KEYS = DIMENSIONS + ['kind', 'x', 'y']
+
+# Forma de somar cada coluna ao juntar células
+_AGG = {'orders': 'sum', 'time_count': 'sum', 'time_sum': 'sum', 'time_sumsq': 'sum', 'time_min': 'min', 'time_max': 'max'}
+
+# =======================================
+# Funções
+# =======================================
+
+def tile_xy(lat, lon, level = BASE_LEVEL):
+
+    """ Esta função tem a responsabilidade de converter coordenadas na célula da grade de um nível
+
+    Input: Latitudes, longitudes (arrays), nível
+    Output: (x, y) inteiros """
+
+    n = 1 << level
+    lat = np.radians(np.clip(np.asarray(lat, dtype = np.float64), -MAX_LATITUDE, MAX_LATITUDE))
+    lon = np.asarray(lon, dtype = np.float64)
+    x = np.floor((lon + 180.0) / 360.0 * n)
+    y = np.floor((1.0 - np.log(np.tan(lat) + 1.0 / np.cos(lat)) / np.pi) / 2.0 * n)
+    return (np.clip(x, 0, n - 1).astype(np.int32), np.clip(y, 0, n - 1).astype(np.int32))
+
+def tile_center(x, y, level):
+
+    """ Esta função tem a responsabilidade de calcular o centro de células da grade
+
+    Input: x, y (arrays), nível
+    Output: (latitudes, longitudes) """
+
+    n = 1 << level
+    lon = (np.asarray(x, dtype = np.float64) + 0.5) / n * 360.0 - 180.0
+    lat = np.degrees(np.arctan(np.sinh(np.pi * (1.0 - 2.0 * (np.asarray(y, dtype = np.float64) + 0.5) / n))))
+    return (lat, lon)
+
+def build_grid(df1):
+
+    """ Esta função tem a responsabilidade de montar o índice espacial a partir do dataframe limpo
+
+    Input: Dataframe limpo
+    Output: Dataframe com uma linha por (dia, tráfego, tipo de ponto, célula) """
+
+    frames = []
+    values = df1['Time_taken(min)'].astype('float64')
+    for kind, (lat, lon) in POINTS.items():
+        x, y = tile_xy(df1[lat].to_numpy(), df1[lon].to_numpy())
+        frames.append(df1.loc[:, DIMENSIONS].assign(kind = kind, x = x, y = y, value = values, value_sq = values * values))
+    df_aux = pd.concat(frames, ignore_index = True)
+    df_aux['kind'] = df_aux['kind'].astype(pd.CategoricalDtype(list(POINTS)))
+    df_aux['orders'] = 1
+    return df_aux.groupby(KEYS, observed = True).agg(orders = ('orders', 'sum'),
+                                                     time_count = ('value', 'count'),
+                                                     time_sum = ('value', 'sum'),
+                                                     time_sumsq = ('value_sq', 'sum'),
+                                                     time_min = ('value', 'min'),
+                                                     time_max = ('value', 'max')).reset_index()
+
+def merge_grids(*grids):
+
+    """ Esta função tem a responsabilidade de juntar índices espaciais montados em partes diferentes dos dados
+
+    Input: Índices espaciais
+    Output: Índice espacial combinado """
+
+    grids = [grid for grid in grids if grid is not None and len(grid)]
+    df_aux = pd.concat(grids, ignore_index = True)
+    return df_aux.groupby(KEYS, observed = True).agg(_AGG).reset_index()
+
+def update_grid(grid, df1):
+
+    """ Esta função tem a responsabilidade de incorporar ao índice espacial apenas os pedidos novos
+
+    Input: Índice espacial, dataframe limpo com os pedidos novos
+    Output: Índice espacial atualizado """
+
+    return merge_grids(grid, build_grid(df1))
+
+def level_for_zoom(zoom):
+
+    """ Esta função tem a responsabilidade de escolher o nível da grade para um zoom do mapa
+
+    Cada tile de 256 px do mapa é dividido em 4 x 4 células do mapa de calor.
+
+    Input: Zoom do mapa
+    Output: Nível da grade (no máximo BASE_LEVEL) """
+
+    return int(min(BASE_LEVEL, max(0, zoom + 2)))
+
+def heatmap_tiles(cells, level, kind = 'delivery'):
+
+    """ Esta função tem a responsabilidade de somar as células selecionadas no nível de zoom pedido
+
+    Input: Células do índice espacial (já filtradas, ex.: com slice_cube), nível, tipo de ponto
+    Output: Dataframe com x, y, latitude, longitude, orders e time_mean/std/min/max por célula do nível """
+
+    shift = BASE_LEVEL - level
+    selected = cells.loc[cells['kind'] == kind, :]
+    df_aux = selected.loc[:, list(_AGG)].assign(x = selected['x'].to_numpy() >> shift, y = selected['y'].to_numpy() >> shift)
+    df_aux = df_aux.groupby(['x', 'y']).agg(_AGG)
+    stats = df_aux[['time_' + moment for moment in MOMENTS]]
+    stats.columns = MOMENTS
+    df_aux = df_aux[['orders']].join(finalize(stats, prefix = 'time_')).assign(time_min = stats['min'], time_max = stats['max']).reset_index()
+    lat, lon = tile_center(df_aux['x'].to_numpy(), df_aux['y'].to_numpy(), level)
+    return df_aux.assign(latitude = lat, longitude = lon)
@@ -0,0 +1,201 @@
+# Libraries
+import hashlib
+import json
+import os
+import shutil
+
+import pyarrow as pa
+import pyarrow.feather as feather
+
+from curry_company import encoding
+
+# Versão do formato gravado; incrementar sempre que a limpeza mudar as colunas
+STORE_VERSION = 6
+
+# =======================================
+# Funções
+# =======================================
+
+def store_path(csv_path):
+
+    """ Esta função tem a responsabilidade de retornar o caminho do arquivo colunar ao lado do CSV
+
+    Input: Caminho do CSV
+    Output: Caminho do arquivo .arrow """
+
+    return os.path.splitext(csv_path)[0] + '.arrow'
+
+def segments_path(csv_path):
+
+    """ Esta função tem a responsabilidade de retornar o diretório dos lotes de pedidos anexados
+
+    Input: Caminho do CSV
+    Output: Caminho do diretório """
+
+    return os.path.splitext(csv_path)[0] + '.segments'
+
+def list_segments(csv_path):
+
+    """ Esta função tem a responsabilidade de listar, em ordem, os lotes anexados ao arquivo colunar
+
+    Input: Caminho do CSV
+    Output: Tupla com os nomes dos arquivos de lote """
+
+    try:
+        names = os.listdir(segments_path(csv_path))
+    except FileNotFoundError:
+        return ()
+    return tuple(sorted(name for name in names if name.endswith('.arrow')))
+
+def file_hash(path, chunk_size = 1 << 20):
+
+    """ Esta função tem a responsabilidade de calcular o hash do conteúdo do arquivo em blocos
+
+    Input: Caminho do arquivo
+    Output: Hash hexadecimal (blake2b) """
+
+    digest = hashlib.blake2b(digest_size = 20)
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def _read_meta(path):
+    try:
+        with open(path + '.json') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def _write_meta(path, meta):
+    tmp = path + '.json.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(meta, f)
+    os.replace(tmp, path + '.json')
+
+def _source_meta(csv_path, source_hash):
+    stat = os.stat(csv_path)
+    return {'store_version': STORE_VERSION,
+            'source_hash': source_hash,
+            'source_mtime_ns': stat.st_mtime_ns,
+            'source_size': stat.st_size}
+
+def to_table(df):
+
+    """ Esta função tem a responsabilidade de converter o dataframe limpo numa tabela Arrow sem índice
+
+    NaN de colunas float são gravados como NaN e não como nulo: colunas sem nulos
+    são lidas do arquivo mapeado sem cópia (ver read_store).
+
+    Input: Dataframe limpo
+    Output: pa.Table """
+
+    table = pa.Table.from_pandas(df, preserve_index = False)
+    for i, coluna in enumerate(table.column_names):
+        if pa.types.is_floating(table.schema.field(i).type) and table.column(i).null_count:
+            table = table.set_column(i, coluna, pa.array(df[coluna].to_numpy(), from_pandas = False))
+    return table
+
+def write_store(df, csv_path, source_hash = None, dictionaries = None):
+
+    """ Esta função tem a responsabilidade de gravar o dataframe limpo em formato colunar (Arrow IPC / Feather v2)
+
+    O arquivo é gravado sem compressão e num único lote de linhas, para que cada coluna
+    seja um buffer contíguo mapeado em memória (lido sem cópia), e a troca
+    é atômica: leitores concorrentes nunca enxergam um arquivo pela metade. Os
+    dicionários são trocados do mesmo jeito (ver encoding.publish_dictionaries). Como o CSV
+    é a fonte da verdade, os lotes anexados à versão anterior são descartados.
+
+    Input: Dataframe limpo, caminho do CSV de origem, hash do CSV (opcional), dicionários das colunas codificadas
+    Output: Caminho do arquivo gravado """
+
+    if source_hash is None:
+        source_hash = file_hash(csv_path)
+    path = store_path(csv_path)
+    tmp = path + '.tmp'
+    if dictionaries is not None:
+        encoding.publish_dictionaries(dictionaries, csv_path)
+    table = to_table(df)
+    feather.write_feather(table, tmp, compression = 'uncompressed', chunksize = max(table.num_rows, 1))
+    os.replace(tmp, path)
+    _write_meta(path, _source_meta(csv_path, source_hash))
+    shutil.rmtree(segments_path(csv_path), ignore_errors = True)
+    return path
+
+def store_meta(csv_path):
+
+    """ Esta função tem a responsabilidade de ler os metadados do arquivo colunar (hash do CSV de origem etc.)
+
+    Input: Caminho do CSV
+    Output: Dicionário de metadados (None se o arquivo ainda não foi gerado) """
+
+    return _read_meta(store_path(csv_path))
+
+def is_fresh(csv_path):
+
+    """ Esta função tem a responsabilidade de verificar se o arquivo colunar corresponde ao CSV atual
+
+    Se mtime e tamanho não mudaram, o hash não é recalculado. Se mudaram mas o
+    conteúdo é o mesmo, apenas os metadados são atualizados.
+
+    Input: Caminho do CSV
+    Output: True se o arquivo colunar pode ser usado """
+
+    path = store_path(csv_path)
+    meta = _read_meta(path)
+    if meta is None or meta.get('store_version') != STORE_VERSION or not os.path.exists(path):
+        return False
+    stat = os.stat(csv_path)
+    if (meta['source_mtime_ns'], meta['source_size']) == (stat.st_mtime_ns, stat.st_size):
+        return True
+    source_hash = file_hash(csv_path)
+    if source_hash != meta['source_hash']:
+        return False
+    _write_meta(path, _source_meta(csv_path, source_hash))
+    return True
+
+def read_store(csv_path, segments = None):
+
+    """ Esta função tem a responsabilidade de abrir o arquivo colunar mapeado em memória
+
+    Input: Caminho do CSV, lotes anexados a incluir (padrão: todos)
+    Output: Dataframe limpo """
+
+    table = feather.read_table(store_path(csv_path), memory_map = True)
+    if segments is None:
+        segments = list_segments(csv_path)
+    if segments:
+        table = pa.concat_tables([table, read_segments(csv_path, segments, as_table = True)], promote_options = 'permissive')
+    return table.to_pandas(split_blocks = True)
+
+def read_segments(csv_path, segments, as_table = False):
+
+    """ Esta função tem a responsabilidade de ler apenas os lotes anexados informados
+
+    Input: Caminho do CSV, nomes dos lotes
+    Output: Dataframe limpo com as linhas dos lotes """
+
+    directory = segments_path(csv_path)
+    tables = [feather.read_table(os.path.join(directory, name), memory_map = True) for name in segments]
+    table = pa.concat_tables(tables, promote_options = 'permissive')
+    return table if as_table else table.to_pandas(split_blocks = True)
+
+def append_segment(df, csv_path):
+
+    """ Esta função tem a responsabilidade de anexar um lote de pedidos limpos ao arquivo colunar
+
+    O lote é gravado num arquivo próprio: o custo depende do tamanho do lote e não do histórico.
+    O índice não é gravado: as linhas são renumeradas (RangeIndex) na leitura.
+
+    Input: Dataframe limpo do lote, caminho do CSV
+    Output: Nome do arquivo do lote """
+
+    directory = segments_path(csv_path)
+    os.makedirs(directory, exist_ok = True)
+    segments = list_segments(csv_path)
+    name = 'segment-%06d.arrow' % (len(segments) + 1)
+    tmp = os.path.join(directory, name + '.tmp')
+    table = to_table(df)
+    feather.write_feather(table, tmp, compression = 'uncompressed', chunksize = max(table.num_rows, 1))
+    os.replace(tmp, os.path.join(directory, name))
+    return name
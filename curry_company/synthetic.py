@@ -0,0 +1,195 @@
+""" Gerador de pedidos sintéticos no formato do dataset/train.csv
+
+Produz arquivos que passam pela mesma leitura e limpeza do dataset original
+(read_raw + clean_code), em qualquer escala (10^5 a 10^8 linhas), gravados em
+blocos para que a memória não cresça com o tamanho do arquivo. A sujeira do
+arquivo original é reproduzida:
+
+- sentinelas 'NaN ' (e 'conditions NaN') nas colunas que a limpeza descarta ou converte;
+- textos com espaço no final ('Urban ', 'Low ', IDs);
+- tempo de entrega no formato '(min) 24' e datas como '18-03-2022';
+- algumas coordenadas de restaurante zeradas ou com o sinal trocado.
+
+Os valores seguem relações parecidas com as do dataset real (o tempo de entrega
+cresce com a distância, o trânsito, o clima e o festival; cada entregador tem
+idade e avaliação próprias), para que os gráficos não fiquem planos. O arquivo
+é gerado em blocos de BLOCK_ROWS linhas, cada um com seu próprio gerador
+aleatório: o mesmo seed gera sempre o mesmo arquivo. Os textos repetidos (datas,
+horários, idades, avaliações, tempos) são formatados uma vez por valor distinto,
+e a escrita do CSV é feita pelo pyarrow. """
+
+# Libraries
+import os
+
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+
+import numpy as np
+import pandas as pd
+
+from curry_company.loader import NA_VALUES
+
+COLUMNS = ['ID', 'Delivery_person_ID', 'Delivery_person_Age', 'Delivery_person_Ratings', 'Restaurant_latitude', 'Restaurant_longitude',
+           'Delivery_location_latitude', 'Delivery_location_longitude', 'Order_Date', 'Time_Orderd', 'Time_Order_picked',
+           'Weatherconditions', 'Road_traffic_density', 'Vehicle_condition', 'Type_of_order', 'Type_of_vehicle',
+           'multiple_deliveries', 'Festival', 'City', 'Time_taken(min)']
+
+CITY_TYPES = ['Metropolitian', 'Urban', 'Semi-Urban']
+TRAFFIC = ['Low', 'Medium', 'High', 'Jam']
+WEATHER = ['Sunny', 'Stormy', 'Fog', 'Windy', 'Sandstorm', 'Cloudy']
+ORDER_TYPES = ['Snack', 'Meal', 'Buffet', 'Drinks']
+VEHICLES = ['motorcycle', 'scooter', 'electric_scooter']
+
+# Centro aproximado das 20 cidades (CITY00 a CITY19) do dataset original
+CITY_CENTERS = np.array([
+    [12.97, 77.59], [22.72, 75.86], [19.08, 72.88], [13.08, 80.27], [17.39, 78.49],
+    [18.52, 73.86], [26.91, 75.79], [23.02, 72.57], [21.15, 79.09], [30.73, 76.78],
+    [26.85, 80.95], [11.02, 76.96], [15.36, 75.12], [22.57, 88.36], [28.61, 77.21],
+    [9.93, 76.27], [21.17, 72.83], [25.59, 85.14], [11.66, 78.15], [15.49, 73.83],
+])
+
+# Minutos extras por trânsito e clima (mesma ordem de TRAFFIC e WEATHER)
+TRAFFIC_MINUTES = np.array([0, 4, 8, 14])
+WEATHER_MINUTES = np.array([0, 6, 5, 3, 4, 2])
+
+START_DATE = '2022-02-11'
+DEFAULT_DAYS = 55
+DEFAULT_DIRT = 0.02
+BLOCK_ROWS = 500_000
+
+# Textos do CSV indexados pelo valor: horário do dia pelo minuto ('11:45:00'),
+# avaliação por décimos (47 -> '4.7') e tempo de entrega pelos minutos ('(min) 24')
+TIME_LABELS = np.array(['%02d:%02d:00' % divmod(minute, 60) for minute in range(24 * 60)], dtype = object)
+RATING_LABELS = np.array(['%.1f' % (tenths / 10) for tenths in range(51)], dtype = object)
+MINUTE_LABELS = np.array(['(min) %d' % minutes for minutes in range(100)], dtype = object)
+NUMBER_LABELS = np.array([str(number) for number in range(100)], dtype = object)
+# Pedidos por entregador no dataset original (~45 mil pedidos / 1.200 entregadores)
+ORDERS_PER_COURIER = 38
+
+# =======================================
+# Funções
+# =======================================
+
+def courier_count(rows):
+
+    """ Esta função tem a responsabilidade de escolher a quantidade de entregadores para um tamanho de arquivo
+
+    Input: Quantidade de linhas
+    Output: Quantidade de entregadores (no mínimo os 1.200 do dataset original) """
+
+    return max(1200, -(-rows // ORDERS_PER_COURIER))
+
+def courier_ids(couriers):
+
+    """ Esta função tem a responsabilidade de gerar os códigos dos entregadores (CITY07RES15DEL00)
+
+    Os entregadores são distribuídos entre 20 cidades e 20 restaurantes; o número
+    do entregador ganha mais dígitos quando há mais de 100 por restaurante.
+
+    Input: Quantidade de entregadores
+    Output: (códigos, índice da cidade de cada entregador) """
+
+    per_restaurant = -(-couriers // 400)
+    width = max(2, len(str(per_restaurant - 1)))
+    codes = np.arange(couriers)
+    city, restaurant, deliverer = codes % 20, (codes // 20) % 20, codes // 400
+    ids = np.array(['CITY%02dRES%02dDEL%0*d' % (c, r, width, d) for c, r, d in zip(city, restaurant, deliverer)], dtype = object)
+    return ids, city
+
+def _dirty(rng, values, dirt, sentinel = 'NaN '):
+    values = values.astype(object)
+    values[rng.random(len(values)) < dirt] = sentinel
+    return values
+
+def _padded(options, codes):
+    return np.array([option + ' ' for option in options], dtype = object)[codes]
+
+def generate_orders(rows, seed = 0, start = 0, couriers = None, days = DEFAULT_DAYS, dirt = DEFAULT_DIRT):
+
+    """ Esta função tem a responsabilidade de gerar um bloco de pedidos sintéticos como texto do CSV
+
+    O bloco depende só dos argumentos: write_orders chama esta função com start
+    múltiplo de BLOCK_ROWS, o que torna o arquivo reprodutível pelo seed.
+
+    Input: Quantidade de linhas, seed, posição da primeira linha no arquivo, entregadores, dias, fração de sentinelas
+    Output: Dataframe com as colunas do train.csv como texto """
+
+    couriers = couriers or courier_count(rows)
+    ids, courier_city = courier_ids(couriers)
+    # Atributos de cada entregador, iguais em todos os blocos
+    profile = np.random.default_rng([seed, 0])
+    courier_age = profile.integers(20, 40, couriers)
+    courier_rating = profile.normal(4.6, 0.3, couriers)
+    courier_vehicle = profile.integers(0, len(VEHICLES), couriers)
+    courier_city_type = profile.choice(len(CITY_TYPES), couriers, p = [0.55, 0.4, 0.05])
+
+    rng = np.random.default_rng([seed, 1, start])
+    courier = rng.integers(0, couriers, rows)
+    city_type = courier_city_type[courier]
+    traffic = rng.choice(len(TRAFFIC), rows, p = [0.34, 0.24, 0.10, 0.32])
+    weather = rng.integers(0, len(WEATHER), rows)
+    festival = rng.random(rows) < 0.02
+    multiple = rng.choice(3, rows, p = [0.31, 0.62, 0.07])
+
+    restaurant = CITY_CENTERS[courier_city[courier]] + rng.normal(0, 0.05, (rows, 2))
+    delivery = restaurant + rng.uniform(-0.1, 0.1, (rows, 2))
+    km = np.hypot(*(delivery - restaurant).T) * 111
+    minutes = (8 + 0.9 * km + TRAFFIC_MINUTES[traffic] + WEATHER_MINUTES[weather]
+               + 15 * festival + 4 * multiple + 3 * (city_type == 2) + rng.normal(0, 3, rows))
+    minutes = np.clip(np.rint(minutes), 10, 54).astype(int)
+    rating = np.clip(np.rint((courier_rating[courier] + rng.normal(0, 0.1, rows)) * 10), 25, 50).astype(int)
+
+    # Algumas coordenadas de restaurante zeradas ou com o sinal trocado, como no dataset original
+    broken = rng.random(rows) < dirt / 2
+    restaurant[broken] = restaurant[broken] * rng.choice([0, -1], (int(broken.sum()), 1))
+
+    date_labels = pd.date_range(START_DATE, periods = days).strftime('%d-%m-%Y').to_numpy(dtype = object)
+    ordered = rng.integers(8 * 4, 24 * 4, rows) * 15
+    picked = ordered + rng.choice([5, 10, 15], rows)
+
+    df = pd.DataFrame({
+        'ID': ['0x%x ' % i for i in range(start, start + rows)],
+        'Delivery_person_ID': ids[courier] + ' ',
+        'Delivery_person_Age': _dirty(rng, NUMBER_LABELS[courier_age[courier]], dirt),
+        'Delivery_person_Ratings': _dirty(rng, RATING_LABELS[rating], dirt),
+        'Restaurant_latitude': restaurant[:, 0],
+        'Restaurant_longitude': restaurant[:, 1],
+        'Delivery_location_latitude': delivery[:, 0],
+        'Delivery_location_longitude': delivery[:, 1],
+        'Order_Date': date_labels[rng.integers(0, days, rows)],
+        'Time_Orderd': _dirty(rng, TIME_LABELS[ordered % (24 * 60)], dirt),
+        'Time_Order_picked': TIME_LABELS[picked % (24 * 60)],
+        'Weatherconditions': _dirty(rng, np.array(['conditions ' + w for w in WEATHER], dtype = object)[weather], dirt, NA_VALUES[1]),
+        'Road_traffic_density': _dirty(rng, _padded(TRAFFIC, traffic), dirt),
+        'Vehicle_condition': rng.integers(0, 3, rows),
+        'Type_of_order': _padded(ORDER_TYPES, rng.integers(0, len(ORDER_TYPES), rows)),
+        'Type_of_vehicle': _padded(VEHICLES, courier_vehicle[courier]),
+        'multiple_deliveries': _dirty(rng, NUMBER_LABELS[multiple], dirt),
+        'Festival': _dirty(rng, _padded(['No', 'Yes'], festival.astype(int)), dirt),
+        'City': _dirty(rng, _padded(CITY_TYPES, city_type), dirt),
+        'Time_taken(min)': MINUTE_LABELS[minutes],
+    }, columns = COLUMNS)
+    return df
+
+def write_orders(path, rows, seed = 0, couriers = None, days = DEFAULT_DAYS, dirt = DEFAULT_DIRT):
+
+    """ Esta função tem a responsabilidade de gravar um CSV sintético em blocos
+
+    O arquivo é gravado com um nome temporário e renomeado no fim, para que um
+    arquivo incompleto nunca seja lido como dataset.
+
+    Input: Caminho do CSV, quantidade de linhas, seed, entregadores, dias, fração de sentinelas
+    Output: Caminho do CSV """
+
+    couriers = couriers or courier_count(rows)
+    os.makedirs(os.path.dirname(path) or '.', exist_ok = True)
+    tmp = path + '.tmp'
+    # O cabeçalho é escrito à parte: o pyarrow põe aspas nos nomes das colunas
+    options = pa_csv.WriteOptions(include_header = False, quoting_style = 'none')
+    with open(tmp, 'wb') as f:
+        f.write((','.join(COLUMNS) + '\n').encode())
+        for start in range(0, rows, BLOCK_ROWS):
+            block = generate_orders(min(BLOCK_ROWS, rows - start), seed, start, couriers, days, dirt)
+            pa_csv.write_csv(pa.Table.from_pandas(block, preserve_index = False), f, options)
+    os.replace(tmp, path)
+    return path
@@ -0,0 +1,204 @@
+""" Séries temporais diárias com somas de prefixo: janelas móveis, crescimento e acumulados
+
+Os pedidos são agregados por dia (número inteiro de dias desde 1970-01-01, sem
+formatar datas) e por combinação dos filtros da barra lateral (BITMAP_COLUMNS).
+Para cada medida a estrutura guarda a soma de prefixo ao longo dos dias, num
+array com um eixo por filtro e um eixo de dias:
+
+    prefix[trânsito, clima, festival, d] = soma dos dias anteriores a d
+
+Uma consulta soma as combinações escolhidas nos filtros (O(combinações x dias))
+e, a partir daí, a soma de qualquer intervalo de dias custa O(1):
+prefix[fim] - prefix[início]. Janelas móveis de 7 e 28 dias, crescimento semana
+contra semana e séries acumuladas saem dessas diferenças em O(dias), para
+qualquer intervalo de datas.
+
+Lotes anexados são incorporados por update_timeseries sem reler o histórico:
+os dias (e categorias) novos ampliam os eixos e as somas de prefixo são refeitas
+em O(combinações x dias). """
+
+# Libraries
+import numpy as np
+import pandas as pd
+
+from curry_company.bitmap import BITMAP_COLUMNS
+from curry_company.cube import MEASURES
+from curry_company.dateindex import day_numbers, week_of_year
+
+# Medidas guardadas: pedidos e, para cada medida do cubo, soma e quantidade de valores
+SERIES = ['orders'] + [prefix + moment for prefix in MEASURES.values() for moment in ('sum', 'count')]
+
+WINDOWS = (7, 28)
+
+# =======================================
+# Funções
+# =======================================
+
+def _codes(df1, dims):
+    codes = []
+    for coluna, categories in dims.items():
+        codes.append(pd.Categorical(df1[coluna], categories = categories).codes.astype('int64'))
+    return codes
+
+def _daily(df1, dims, day0, days):
+
+    """ Esta função tem a responsabilidade de somar cada medida por combinação de filtros e dia
+
+    Linhas com valor fora das categorias (NaN) ficam de fora, como no cubo.
+
+    Input: Dataframe limpo, categorias de cada filtro, primeiro dia, quantidade de dias
+    Output: Dicionário medida -> array (categorias de cada filtro..., dias) """
+
+    codes = _codes(df1, dims)
+    shape = tuple(len(categories) for categories in dims.values()) + (days,)
+    valid = np.logical_and.reduce([code >= 0 for code in codes])
+    flat = np.ravel_multi_index(tuple(code[valid] for code in codes) + (day_numbers(df1['Order_Date'])[valid] - day0,), shape)
+    size = int(np.prod(shape))
+    daily = {'orders': np.bincount(flat, minlength = size).reshape(shape)}
+    for measure, prefix in MEASURES.items():
+        values = df1[measure].to_numpy(dtype = 'float64', na_value = np.nan)[valid]
+        present = ~np.isnan(values)
+        daily[prefix + 'sum'] = np.bincount(flat[present], weights = values[present], minlength = size).reshape(shape)
+        daily[prefix + 'count'] = np.bincount(flat[present], minlength = size).reshape(shape)
+    return daily
+
+def _prefix(daily):
+    pad = [(0, 0)] * (daily.ndim - 1) + [(1, 0)]
+    return np.pad(daily, pad).cumsum(axis = -1)
+
+def build_timeseries(df1, dims = BITMAP_COLUMNS):
+
+    """ Esta função tem a responsabilidade de montar as somas de prefixo diárias a partir do dataframe limpo
+
+    Input: Dataframe limpo, colunas de filtro
+    Output: Dicionário com day0 (primeiro dia), days (quantidade), dims (categorias por filtro) e prefix (medida -> array) """
+
+    dims = {coluna: pd.Index(df1[coluna].cat.categories) if isinstance(df1[coluna].dtype, pd.CategoricalDtype)
+            else pd.Index(pd.unique(df1[coluna].dropna())) for coluna in dims}
+    numbers = day_numbers(df1['Order_Date'])
+    day0 = int(numbers.min()) if len(numbers) else 0
+    days = int(numbers.max()) - day0 + 1 if len(numbers) else 0
+    daily = _daily(df1, dims, day0, days)
+    return {'day0': day0, 'days': days, 'dims': dims, 'prefix': {measure: _prefix(values) for measure, values in daily.items()}}
+
+def update_timeseries(ts, df1):
+
+    """ Esta função tem a responsabilidade de incorporar à série apenas os pedidos novos
+
+    Dias fora do intervalo atual e categorias novas ampliam os eixos.
+
+    Input: Série (build_timeseries), dataframe limpo com os pedidos novos
+    Output: Série atualizada """
+
+    if not len(df1):
+        return ts
+    dims = {}
+    for coluna, categories in ts['dims'].items():
+        values = df1[coluna].cat.categories if isinstance(df1[coluna].dtype, pd.CategoricalDtype) else pd.unique(df1[coluna].dropna())
+        dims[coluna] = categories.append(pd.Index(values).difference(categories))
+    numbers = day_numbers(df1['Order_Date'])
+    day0 = min(ts['day0'], int(numbers.min())) if ts['days'] else int(numbers.min())
+    days = max(ts['day0'] + ts['days'], int(numbers.max()) + 1) - day0
+    new = _daily(df1, dims, day0, days)
+    prefix = {}
+    for measure, values in ts['prefix'].items():
+        old = np.diff(values, axis = -1)
+        # Categorias novas no fim de cada eixo de filtro; dias novos antes e depois do intervalo antigo
+        pad = [(0, len(dims[coluna]) - len(categories)) for coluna, categories in ts['dims'].items()]
+        pad.append((ts['day0'] - day0, day0 + days - ts['day0'] - ts['days']))
+        prefix[measure] = _prefix(np.pad(old, pad) + new[measure])
+    return {'day0': day0, 'days': days, 'dims': dims, 'prefix': prefix}
+
+def select(ts, measures = SERIES, **filters):
+
+    """ Esta função tem a responsabilidade de somar as combinações de filtros escolhidas
+
+    Input: Série, medidas, filtros (coluna = lista de valores aceitos; ausentes ou None aceitam todos)
+    Output: Dicionário medida -> soma de prefixo 1-D (days + 1 posições) """
+
+    index = []
+    for coluna, categories in ts['dims'].items():
+        values = filters.get(coluna)
+        if values is None:
+            index.append(slice(None))
+        else:
+            positions = categories.get_indexer(pd.Index(list(values)))
+            index.append(np.unique(positions[positions >= 0]))
+    # Um eixo de cada vez: np.ix_ não mistura fatias e listas
+    result = {}
+    for measure in measures:
+        values = ts['prefix'][measure]
+        for axis, positions in enumerate(index):
+            if not isinstance(positions, slice):
+                values = np.take(values, positions, axis = axis)
+        result[measure] = values.reshape(-1, values.shape[-1]).sum(axis = 0)
+    return result
+
+def day_span(ts, date_start = None, date_end = None):
+
+    """ Esta função tem a responsabilidade de converter um intervalo de datas em posições de dias da série
+
+    Input: Série, intervalo (date_start incluída, date_end exclusiva, como no cubo)
+    Output: (primeiro dia, dia final exclusivo) em posições de 0 a days """
+
+    start = 0 if date_start is None else int(day_numbers([pd.Timestamp(date_start)])[0]) - ts['day0']
+    stop = ts['days'] if date_end is None else int(day_numbers([pd.Timestamp(date_end)])[0]) - ts['day0']
+    start, stop = min(max(start, 0), ts['days']), min(max(stop, 0), ts['days'])
+    return start, max(start, stop)
+
+def window_sums(prefix, start, stop, window):
+
+    """ Esta função tem a responsabilidade de calcular a soma móvel de window dias terminando em cada dia
+
+    A janela do dia t cobre os dias [t - window + 1, t], inclusive dias anteriores
+    a start (o início do intervalo não encurta a janela); antes do primeiro dia da série a soma é zero.
+
+    Input: Soma de prefixo 1-D, intervalo de posições, tamanho da janela
+    Output: Array com uma soma por dia de [start, stop) """
+
+    ends = np.arange(start, stop) + 1
+    return prefix[ends] - prefix[np.maximum(ends - window, 0)]
+
+def daily_series(ts, date_start = None, date_end = None, **filters):
+
+    """ Esta função tem a responsabilidade de montar a série diária de pedidos com janelas, crescimento e acumulado
+
+    Colunas:
+        - orders: pedidos do dia
+        - orders_7d, orders_28d: pedidos nos 7 e 28 dias terminados no dia (NaN se a
+          janela começar antes do primeiro dia do dataset)
+        - wow_growth: orders_7d contra os 7 dias anteriores (0.1 = +10%; NaN sem as duas semanas completas)
+        - cumulative_orders: pedidos desde date_start
+        - avg_time_7d: tempo médio de entrega (min) nos 7 dias terminados no dia
+
+    Input: Série, intervalo (date_end exclusiva), filtros
+    Output: Dataframe com uma linha por dia do intervalo, inclusive dias sem pedidos """
+
+    start, stop = day_span(ts, date_start, date_end)
+    sums = select(ts, ['orders', 'time_sum', 'time_count'], **filters)
+    orders = sums['orders']
+    dates = pd.to_datetime(np.arange(ts['day0'] + start, ts['day0'] + stop), unit = 'D')
+    df_aux = pd.DataFrame({'Order_Date': dates, 'orders': np.diff(orders)[start:stop]})
+    # Janelas que começariam antes do primeiro dia da série ficam sem valor (NaN), em vez de parciais
+    position = np.arange(start, stop)
+    for window in WINDOWS:
+        df_aux[f'orders_{window}d'] = np.where(position + 1 >= window, window_sums(orders, start, stop, window), np.nan)
+    previous = np.where(position + 1 >= 14, orders[np.maximum(position - 6, 0)] - orders[np.maximum(position - 13, 0)], np.nan)
+    df_aux['wow_growth'] = df_aux['orders_7d'] / np.where(previous > 0, previous, np.nan) - 1
+    df_aux['cumulative_orders'] = orders[start + 1:stop + 1] - orders[start]
+    time_count = window_sums(sums['time_count'], start, stop, 7)
+    df_aux['avg_time_7d'] = window_sums(sums['time_sum'], start, stop, 7) / np.where(time_count > 0, time_count, np.nan)
+    return df_aux
+
+def weekly_series(ts, date_start = None, date_end = None, **filters):
+
+    """ Esta função tem a responsabilidade de somar os pedidos por semana do ano ('%U')
+
+    Input: Série, intervalo (date_end exclusiva), filtros
+    Output: Dataframe com week_of_year e orders (semanas com pedidos) """
+
+    start, stop = day_span(ts, date_start, date_end)
+    orders = np.diff(select(ts, ['orders'], **filters)['orders'])[start:stop]
+    weeks = week_of_year(np.arange(ts['day0'] + start, ts['day0'] + stop))
+    df_aux = pd.DataFrame({'week_of_year': weeks, 'orders': orders}).groupby('week_of_year', sort = True).sum()
+    return df_aux.loc[df_aux['orders'] > 0].reset_index()
@@ -0,0 +1,84 @@
+""" Top-k por grupo (ex.: entregadores mais rápidos e mais lentos por cidade)
+
+O valor é agregado uma única vez por (grupo, chave) e, dentro de cada grupo, os k
+menores e os k maiores são escolhidos por seleção parcial (np.partition), sem
+ordenar todos os pares. Empates são resolvidos pela chave (ou pelo texto dela,
+quando a chave é um código de dicionário), para que o resultado seja sempre o
+mesmo. """
+
+# Libraries
+import numpy as np
+
+# =======================================
+# Funções
+# =======================================
+
+def _select(values, keys, k):
+
+    """ Esta função tem a responsabilidade de escolher as posições dos k menores valores
+
+    Input: Valores, chaves (desempate), k
+    Output: Posições escolhidas, ordenadas por (valor, chave) """
+
+    if len(values) > k:
+        threshold = np.partition(values, k - 1)[k - 1]
+        below = np.flatnonzero(values < threshold)
+        ties = np.flatnonzero(values == threshold)
+        ties = ties[np.argsort(keys[ties], kind = 'stable')][:k - len(below)]
+        positions = np.concatenate([below, ties])
+    else:
+        positions = np.arange(len(values))
+    return positions[np.lexsort((keys[positions], values[positions]))]
+
+def _tiebreak(codes, labels):
+
+    """ Esta função tem a responsabilidade de trocar códigos de dicionário pela posição do seu texto em ordem alfabética
+
+    Os códigos dependem da ordem em que os valores apareceram (ex.: um lote anexado
+    depois); a ordem do texto não, e é a do ranking original (sort_values estável
+    sobre o groupby).
+
+    Input: Códigos, dicionário (pd.Index com o texto de cada código)
+    Output: Array de postos, na mesma ordem dos códigos """
+
+    text = labels.take(codes).to_numpy()
+    ranks = np.empty(len(text), dtype = np.int64)
+    ranks[np.argsort(text, kind = 'stable')] = np.arange(len(text))
+    return ranks
+
+def top_k(df, by, key, value, k = 10, agg = 'min', groups = None, labels = None):
+
+    """ Esta função tem a responsabilidade de calcular os k menores e os k maiores valores por grupo
+
+    Parâmetros:
+        - by: coluna do grupo (ex.: 'City')
+        - key: coluna da entidade ranqueada (ex.: 'Delivery_person_ID', 'Type_of_vehicle')
+        - value: coluna do valor (ex.: 'Time_taken(min)')
+        - agg: agregação do valor por entidade (padrão: 'min')
+        - groups: grupos exibidos, nessa ordem (padrão: todos os presentes)
+        - labels: dicionário da chave codificada (pd.Index); empates são resolvidos pelo texto
+
+    Input: Dataframe
+    Output: (dataframe com os k menores, dataframe com os k maiores), com as colunas by, key e value """
+
+    df_aux = df.groupby([by, key], observed = True, sort = False)[value].agg(agg).reset_index()
+    positions_by_group = df_aux.groupby(by, observed = True).indices
+    if groups is None:
+        groups = sorted(positions_by_group)
+    values = df_aux[value].to_numpy()
+    keys = df_aux[key].to_numpy()
+    if labels is not None:
+        keys = _tiebreak(keys, labels)
+
+    smallest, largest = [], []
+    for group in groups:
+        positions = positions_by_group.get(group)
+        if positions is None:
+            continue
+        smallest.append(positions[_select(values[positions], keys[positions], k)])
+        largest.append(positions[_select(-values[positions], keys[positions], k)])
+    if not smallest:
+        empty = df_aux.iloc[:0].reset_index(drop = True)
+        return empty, empty
+    return (df_aux.iloc[np.concatenate(smallest)].reset_index(drop = True),
+            df_aux.iloc[np.concatenate(largest)].reset_index(drop = True))
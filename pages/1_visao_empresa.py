@@ -1,166 +1,212 @@
 # Libraries
-from haversine import haversine
 import plotly.express as px
-import plotly.graph_objects as go
 import streamlit as st
-import pandas as pd
+import streamlit.components.v1 as components
+import numpy as np
 from datetime import datetime
 from PIL import Image
 import folium
-from streamlit_folium import folium_static
+from curry_company import kpis, precompute, profiling
+from curry_company.bitmap import build_bitmaps, select_rows
+from curry_company.cube import slice_cube, update_cube
+from curry_company.dateindex import build_date_index, date_range
+from curry_company.distinct import update_distinct
+from curry_company.loader import load_dataset, load_derived, pin_version
+from curry_company.parallel import parallel_builder
+from curry_company.maps import cluster_layer, cluster_points, geojson_layer, heatmap_layer
+from curry_company.render import cached_figure, cached_map_html, plotly_chart
+from curry_company.results import cached_result
+from curry_company.sections import render_sections
+from curry_company.spatial import heatmap_tiles, level_for_zoom, update_grid
+from curry_company.timeseries import build_timeseries, update_timeseries
 
 st.set_page_config(page_title = 'Visão Empresa', layout = 'wide')
 
+# Nome da página no cache de resultados
+PAGE = 'visao_empresa'
+
+# Perfil deste rerun: tempo, linhas e memória de cada estágio (ver curry_company.profiling)
+profiling.begin_rerun(PAGE)
+
+# Versões novas do dataset são aquecidas e publicadas em segundo plano (ver curry_company.precompute);
+# este rerun inteiro usa a versão publicada agora
+precompute.start_scheduler()
+pin_version()
+
+# Opções do mapa de calor: rótulo -> valor
+KINDS = {'Locais de entrega': 'delivery', 'Restaurantes': 'restaurant'}
+WEIGHTS = {'Pedidos': 'orders', 'Tempo médio (min)': 'time_mean'}
+DEFAULT_ZOOM = 5
+
 # =======================================
 # Funções
 # =======================================
 
-def country_maps(df1):
-    """ Esta função tem a responsabilidade de retornar um mapa com a localização central de cada cidade por tipo de tráfego
+def delivery_clusters(df1):
+    """ Esta função tem a responsabilidade de agrupar os locais de entrega numa grade (agrupamento no servidor)
     
     Input: Dataframe
-    Output: Mapa """
+    Output: Dataframe com latitude, longitude e orders por célula """
+
+    return cluster_points(df1['Delivery_location_latitude'].to_numpy(), df1['Delivery_location_longitude'].to_numpy())
+
+def city_map(df_aux, clusters = None):
+    """ Esta função tem a responsabilidade de montar o mapa Folium com os pontos centrais de cada cidade por tipo de tráfego
+    
+    Todos os pontos vão numa única camada GeoJSON; com clusters, os locais de entrega
+    agrupados no servidor entram como uma segunda camada.
+    
+    Input: Dataframe com as medianas, locais de entrega agrupados (opcional)
+    Output: folium.Map """
 
-    # A localização central de cada cidade por tipo de tráfego.
-    colunas = ['Road_traffic_density', 'City', 'Delivery_location_latitude', 'Delivery_location_longitude']
-    df_aux = df1.loc[:, colunas].groupby(['City', 'Road_traffic_density']).median().reset_index() # Utiliza-se mediana para obter o ponto central do banco de dados -> a média altera os dados
     map = folium.Map()
-    for index, location_info in df_aux.iterrows():
-        folium.Marker( [location_info['Delivery_location_latitude'],
-                          location_info['Delivery_location_longitude']],
-                          popup=location_info[['City', 'Road_traffic_density']] ).add_to( map )
-    folium_static(map, width = 1024, height = 600)
+    geojson_layer(df_aux, 'Delivery_location_latitude', 'Delivery_location_longitude', ['City', 'Road_traffic_density'], name = 'Centro por cidade e tráfego').add_to(map)
+    if clusters is not None:
+        cluster_layer(clusters, name = 'Locais de entrega').add_to(map)
+    return map
+
+def country_maps(df1, filtros, raw = False):
+    """ Esta função tem a responsabilidade de gerar o mapa com a localização central de cada cidade por tipo de tráfego
+    
+    O HTML do mapa fica no cache de renderização: o mesmo conjunto de medianas não monta o mapa de novo.
+    
+    Input: Dataframe, filtros da barra lateral, exibir também os locais de entrega
+    Output: HTML do mapa """
+
+    # A localização central de cada cidade por tipo de tráfego.
+    df_aux = cached_result(PAGE, 'country_maps', filtros, kpis.city_traffic_medians, df1)
+    if raw:
+        clusters = cached_result(PAGE, 'delivery_clusters', filtros, delivery_clusters, df1)
+        html = cached_map_html('country_maps', city_map, df_aux, clusters = clusters)
+    else:
+        html = cached_map_html('country_maps', city_map, df_aux)
+    return html
+
+def grid_tiles(grid, filtros, level, kind):
+    """ Esta função tem a responsabilidade de somar as células do índice espacial no nível do mapa de calor
+    
+    Input: Índice espacial, filtros da barra lateral, nível da grade, tipo de ponto
+    Output: Dataframe com uma linha por célula do nível """
+
+    return heatmap_tiles(slice_cube(grid, **filtros), level, kind)
 
-def order_by_deliver_by_week (df1):
+def heat_map(tiles, weight, zoom):
+    """ Esta função tem a responsabilidade de montar o mapa Folium com o mapa de calor das células
+    
+    Input: Células do nível, coluna do peso, zoom inicial
+    Output: folium.Map """
+
+    if len(tiles):
+        location = [np.average(tiles['latitude'], weights = tiles['orders']), np.average(tiles['longitude'], weights = tiles['orders'])]
+    else:
+        location = None
+    map = folium.Map(location = location, zoom_start = zoom)
+    heatmap_layer(tiles, weight).add_to(map)
+    return map
+
+def delivery_heatmap(grid, filtros, kind, weight, zoom):
+    """ Esta função tem a responsabilidade de gerar o mapa de calor dos pedidos ou do tempo médio de entrega
+    
+    O nível da grade acompanha o zoom: só as células daquele nível vão para o navegador.
+    
+    Input: Índice espacial, filtros da barra lateral, tipo de ponto, coluna do peso, zoom
+    Output: HTML do mapa """
+
+    level = level_for_zoom(zoom)
+    tiles = cached_result(PAGE, 'delivery_heatmap', dict(filtros, level = level, kind = kind), grid_tiles, grid, filtros, level, kind)
+    html = cached_map_html('delivery_heatmap', heat_map, tiles, weight = weight, zoom = zoom)
+    return html
+
+def order_by_deliver_by_week (couriers, ts, filtros):
     """ Esta função tem a responsabilidade de retornar um gráfico de linhas em que reporta a quantidade de pedidos por entregador por semana
     
-    Input: Dataframe
+    Input: Entregadores distintos por célula, série temporal, filtros da barra lateral
     Output: Figura """
 
     # A quantidade de pedidos por entregador por semana.
-    coluna1 = ['ID', 'week_of_year']
-    df_aux1 = df1.loc[:, coluna1].groupby(['week_of_year']).count().reset_index()
-    coluna2 = ['Delivery_person_ID', 'week_of_year']
-    df_aux2 = df1.loc[:, coluna2].groupby(['week_of_year']).nunique().reset_index()
-    df_aux = pd.merge(df_aux1, df_aux2, how = 'inner')
-    df_aux['order_by_deliver'] = df_aux['ID'] / df_aux['Delivery_person_ID']
-    fig = px.line(df_aux, x = 'week_of_year', y = 'order_by_deliver')
+    df_aux = cached_result(PAGE, 'order_by_deliver_by_week', filtros, kpis.order_by_deliver_by_week, couriers, ts, filtros)
+    fig = cached_figure('order_by_deliver_by_week', px.line, df_aux, x = 'week_of_year', y = 'order_by_deliver')
     return (fig)
             
-def order_by_week(df1):
+def order_by_week(ts, filtros):
     """ Esta função tem a responsabilidade de retornar um gráfico de linhas em que reporta a quantidade de pedidos por semana
     
-    Input: Dataframe
+    Input: Série temporal, filtros da barra lateral
     Output: Figura """
     
     # Quantidade de pedidos por semana
-    df1['week_of_year'] = df1['Order_Date'].dt.strftime('%U') # .dt transforma a sequência de dados em data (se fosse string, seria str)
-    df_aux = df1.loc[:, ['ID','week_of_year']].groupby(['week_of_year']).count().reset_index()
-    fig = px.line(df_aux, x = 'week_of_year', y = 'ID')
+    df_aux = cached_result(PAGE, 'order_by_week', filtros, kpis.order_by_week, ts, filtros)
+    fig = cached_figure('order_by_week', px.line, df_aux, x = 'week_of_year', y = 'orders')
     return(fig)
 
-def traffic_order_city(df1):
+def order_trends(ts, filtros):
+    """ Esta função tem a responsabilidade de retornar os gráficos de tendência dos pedidos: janelas móveis e crescimento semanal
+    
+    Input: Série temporal, filtros da barra lateral
+    Output: (Figura das janelas de 7 e 28 dias, figura do crescimento semana contra semana) """
+    
+    # Pedidos nos últimos 7 e 28 dias e crescimento contra a semana anterior, de cada dia do intervalo
+    df_aux = cached_result(PAGE, 'order_trends', filtros, kpis.order_trends, ts, filtros)
+    fig_windows = cached_figure('order_trends_windows', px.line, df_aux, x = 'Order_Date', y = ['orders_7d', 'orders_28d'])
+    fig_growth = cached_figure('order_trends_growth', px.bar, df_aux, x = 'Order_Date', y = 'wow_growth')
+    return (fig_windows, fig_growth)
+
+def traffic_order_city(cells, filtros):
     """ Esta função tem a responsabilidade de retornar um gráfico scatter baseado na comparação de volume de pedidos por cidade e tipo de tráfego 
     
-    Input: Dataframe
+    Input: Células do cubo, filtros da barra lateral
     Output: Figura """
     
     # Comparação do volume de pedidos por cidade e tipo de tráfego.
-    colunas = ['ID','City','Road_traffic_density']
-    df_aux = df1.loc[:, colunas].groupby(['City','Road_traffic_density']).count().reset_index()
-    fig = px.scatter(df_aux, x = 'City', y = 'Road_traffic_density', size = 'ID', color = 'City')
+    df_aux = cached_result(PAGE, 'traffic_order_city', filtros, kpis.traffic_order_city, cells)
+    fig = cached_figure('traffic_order_city', px.scatter, df_aux, x = 'City', y = 'Road_traffic_density', size = 'orders', color = 'City')
     return (fig)
 
-def traffic_order_share(df1):
+def traffic_order_share(cells, filtros):
     """ Esta função tem a responsabilidade de retornar um gráfico de pizza baseado na distribuição de pedidos por tipo de tráfego
     
-    Input: Dataframe
+    Input: Células do cubo, filtros da barra lateral
     Output: Figura """        
     # Distribuição dos pedidos por tipo de tráfego
     
-    df_aux = df1.loc[:,['ID','Road_traffic_density']].groupby('Road_traffic_density').count().reset_index()
-    df_aux['entregas_perc'] = df_aux['ID'] / df_aux['ID'].sum()
-    fig = px.pie(df_aux, values = 'entregas_perc', names = 'Road_traffic_density')
+    df_aux = cached_result(PAGE, 'traffic_order_share', filtros, kpis.traffic_order_share, cells)
+    fig = cached_figure('traffic_order_share', px.pie, df_aux, values = 'entregas_perc', names = 'Road_traffic_density')
     return (fig)
 
-def order_metric(df1):
+def order_metric(ts, filtros):
     """ Esta função tem a responsabilidade de retornar uma figura baseado na quantidade de pedidos por dia
     
-    Input: Dataframe
+    Input: Série temporal, filtros da barra lateral
     Output: Figura """        
-    colunas = ['ID', 'Order_Date']
-    df_aux = df1.loc[:, colunas].groupby(['Order_Date']).count().reset_index()
+    df_aux = cached_result(PAGE, 'order_metric', filtros, kpis.order_metric, ts, filtros)
         
     # Gráfico de barras
         
-    fig = px.bar(df_aux, x = 'Order_Date', y = 'ID')
+    fig = cached_figure('order_metric', px.bar, df_aux, x = 'Order_Date', y = 'orders')
     return (fig)
 
-def clean_code(df1):
-    
-    """ Esta função tem a responsabilidade de limpar o dataframe
-    
-    Tipos de Limpeza:
-    1. Remove espaços de maneira massiva
-    2. Remove o NaN de linhas específicas
-    3. Conversão de colunas
-    4. Retira o (min) de time_taken
-    
-    Input: Dataframe
-    Output: Dataframe """
-    
-    # Removendo NaN de linhas
+# ----------------------- Início da Estrutura Lógica de Programação -----------------------
 
-    df1 = df.copy()
-    
-    df1 = df1.loc[df1['Road_traffic_density'] != 'NaN ', :].copy()
-    df1 = df1.loc[df1['City'] != 'NaN ', :].copy()
-    df1 = df1.loc[df1['Weatherconditions'] != 'NaN ', :].copy()
-    
-    # Conversão de colunas
-    
-    df1['Delivery_person_Ratings'] = (df1['Delivery_person_Ratings'].astype(float))
-    
-    linhas_selecionadas = (df1['Delivery_person_Age'] != 'NaN ')
-    df1 = df1.loc[linhas_selecionadas, :].copy()
-    df1['Delivery_person_Age'] = (df1['Delivery_person_Age'].astype(int)).copy()
-    
-    linhas_selecionadas = (df1['Weatherconditions'] != 'conditions NaN ')
-    df1 = df1.loc[linhas_selecionadas, :].copy()
-    
-    linhas_selecionadas = (df1['Festival'] != 'NaN ')
-    df1 = df1.loc[linhas_selecionadas, :].copy()
-    
-    df1 = df1.loc[df1['multiple_deliveries'] != 'NaN ', :].copy()
-    df1['multiple_deliveries'] = (df1['multiple_deliveries'].astype(int)).copy()
-    
-    df1['Order_Date'] = pd.to_datetime(df1['Order_Date'], format = '%d-%m-%Y').copy()
-    
-    # Retirando espaços de maneira massiva
-    
-    df1['ID'] = df1.loc[:, 'ID'].str.strip()
-    df1['Delivery_person_ID'] = df1.loc[:, 'Delivery_person_ID'].str.strip()
-    df1['Road_traffic_density'] = df1.loc[:, 'Road_traffic_density'].str.strip()
-    df1['Type_of_order'] = df1.loc[:, 'Type_of_order'].str.strip()
-    df1['Type_of_vehicle'] = df1.loc[:, 'Type_of_vehicle'].str.strip()
-    df1['Festival'] = df1.loc[:, 'Festival'].str.strip()
-    df1['City'] = df1.loc[:, 'City'].str.strip()
-    df1['Road_traffic_density'] = df1.loc[:, 'Road_traffic_density'].str.strip()
-    
-    # Retirando o (min) de time_taken
-    
-    df1['Time_taken(min)'] = df1['Time_taken(min)'].str.strip('(min) ')
-    df1['Time_taken(min)'] = (df1['Time_taken(min)'].astype(int)).copy()
+# Import dataset já limpo (lido e limpo uma única vez por processo)
+df1 = load_dataset()
 
-    return (df1)
+# Cubo pré-agregado (montado uma única vez por versão do dataset)
+cube = load_derived('cube', parallel_builder('cube'), update = update_cube)
 
-# ----------------------- Início da Estrutura Lógica de Programação -----------------------
+# Índice dia -> posição no dataset ordenado por Order_Date
+date_index = load_derived('date_index', build_date_index)
 
-# Import dataset
-df = pd.read_csv('dataset/train.csv')
+# Bitmaps por valor de trânsito/clima/festival (mesma ordem de linhas do dataset)
+bitmaps = load_derived('bitmaps', build_bitmaps)
 
-# Limpando dataset
-df1 = clean_code(df)
+# Índice espacial: pedidos e tempo de entrega por célula da grade
+grid = load_derived('grid', parallel_builder('grid'), update = update_grid)
+
+# Entregadores distintos por dia/tráfego/clima (bitmap exato)
+couriers = load_derived('couriers', parallel_builder('couriers'), update = update_distinct)
+
+# Somas de prefixo diárias por trânsito/clima/festival (janelas móveis e séries semanais)
+ts = load_derived('timeseries', build_timeseries, update = update_timeseries)
 
 ## Visão - Empresa
 
@@ -178,8 +224,8 @@ st.sidebar.markdown ('# Curry Company')
 st.sidebar.markdown ('## Fastest Delivery in Town')
 st.sidebar.markdown ("""---""")
 
-st.sidebar.markdown ('## Selecione uma data limite')
-date_slider = st.sidebar.slider('Até qual valor?', value=datetime(2022, 3, 3), min_value=datetime(2022, 2, 11), max_value=datetime(2022, 4, 6), format = 'DD/MM/YYYY')
+st.sidebar.markdown ('## Selecione um intervalo de datas')
+date_start, date_end = st.sidebar.slider('Qual intervalo? (a data final não é incluída)', value=(datetime(2022, 2, 11), datetime(2022, 3, 3)), min_value=datetime(2022, 2, 11), max_value=datetime(2022, 4, 6), format = 'DD/MM/YYYY')
 
 st.sidebar.markdown ("""---""")
 
@@ -191,27 +237,40 @@ traffic_options = st.sidebar.multiselect(
 st.sidebar.markdown ("""---""")
 st.sidebar.markdown ('### Powered by Comunidade DS')
 
-# Filtro de data
+# Filtros no cubo
+
+filtros = dict(date_start = date_start, date_end = date_end, Road_traffic_density = traffic_options)
+cells = profiling.profiled('slice_cube', slice_cube, cube, **filtros)
+
+# Filtro de data: busca binária no dataset ordenado (posições das linhas do intervalo)
 
-linhas_selecionadas = df1['Order_Date'] < date_slider
-df1 = df1.loc[linhas_selecionadas, :]
+inicio, fim = date_range(date_index, date_start, date_end)
 
-# Filtro de trânsito
+# Filtros de múltipla escolha: bitmaps combinados apenas dentro do intervalo de datas
 
-linhas_selecionadas = df1['Road_traffic_density'].isin(traffic_options)
-df1 = df1.loc[linhas_selecionadas, :]
+df1 = profiling.profiled('select_rows', select_rows, df1, bitmaps, inicio, fim, Road_traffic_density = traffic_options)
 
 # =======================================
 # Layout no Streamlit
 # =======================================
 
-tab1, tab2, tab3 =  st.tabs(['Visão Gerencial', 'Visão Tática', 'Visão Geográfica'])
+# Só a seção escolhida é calculada; as demais são aquecidas em segundo plano (ver curry_company.sections)
+secao = st.radio('Seção', ['Visão Gerencial', 'Visão Tática', 'Visão Geográfica'], horizontal = True, label_visibility = 'collapsed')
 
-with tab1:
+def managerial_figures():
+    return (order_metric(ts, filtros), traffic_order_share(cells, filtros), traffic_order_city(cells, filtros))
+
+def tactical_figures():
+    return (order_by_week(ts, filtros), order_by_deliver_by_week(couriers, ts, filtros), order_trends(ts, filtros))
+
+def geographic_maps():
+    return (country_maps(df1, filtros), delivery_heatmap(grid, filtros, 'delivery', 'orders', DEFAULT_ZOOM))
+
+def visao_gerencial():
+    fig_day, fig_share, fig_city = managerial_figures()
     with st.container():
         st.markdown('# Orders by Day')
-        fig = order_metric(df1)
-        st.plotly_chart( fig, use_container_width=True)
+        plotly_chart(fig_day, use_container_width=True)
         
     # Criando duas colunas no Streamlit
     
@@ -219,29 +278,57 @@ with tab1:
         col1, col2 = st.columns (2)
         with col1:
             st.markdown('# Traffic Order Share')
-            fig = traffic_order_share(df1)
-            st.plotly_chart(fig, use_container_width=True)
+            plotly_chart(fig_share, use_container_width=True)
         
         with col2:
             st.markdown('# Traffic Order City')
-            fig = traffic_order_city(df1)
-            st.plotly_chart(fig, use_container_width=True)
-                
-with tab2:
+            plotly_chart(fig_city, use_container_width=True)
+
+def visao_tatica():
+    fig_week, fig_deliver, (fig_windows, fig_growth) = tactical_figures()
     with st.container():
         
         st.markdown("# Order by Week")
-        fig = order_by_week(df1)
-        st.plotly_chart(fig, use_container_width=True)
+        plotly_chart(fig_week, use_container_width=True)
         
     with st.container():
         
         st.markdown("# Order by Week by Deliver")
-        fig = order_by_deliver_by_week (df1)
-        st.plotly_chart(fig, use_container_width=True)
+        plotly_chart(fig_deliver, use_container_width=True)
 
-with tab3:
-    
+    with st.container():
+        col1, col2 = st.columns(2)
+        with col1:
+            st.markdown('# Orders: Last 7 / 28 Days')
+            plotly_chart(fig_windows, use_container_width=True)
+
+        with col2:
+            st.markdown('# Week over Week Growth')
+            plotly_chart(fig_growth, use_container_width=True)
+
+def visao_geografica():
     st.markdown("# Country Maps")
-    country_maps (df1)
-    
+    raw = st.checkbox('Exibir todos os locais de entrega (agrupados no servidor)')
+    components.html(country_maps(df1, filtros, raw), width = 1024, height = 600 + 10)
+
+    st.markdown("# Delivery Heatmap")
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        kind = KINDS[st.selectbox('Pontos', list(KINDS))]
+    with col2:
+        weight = WEIGHTS[st.selectbox('Peso', list(WEIGHTS))]
+    with col3:
+        zoom = st.slider('Zoom', min_value = 3, max_value = 12, value = DEFAULT_ZOOM)
+    components.html(delivery_heatmap(grid, filtros, kind, weight, zoom), width = 1024, height = 600 + 10)
+
+# Seção -> (desenho, cálculo para o aquecimento com os valores padrão dos widgets)
+render_sections(PAGE, {'Visão Gerencial': (visao_gerencial, managerial_figures),
+                       'Visão Tática': (visao_tatica, tactical_figures),
+                       'Visão Geográfica': (visao_geografica, geographic_maps)}, secao, filtros)
+
+# Painel de depuração (?debug=1 na URL ou CURRY_DEBUG=1): estágios deste rerun e p50/p95 por página
+profile = profiling.end_rerun()
+if profiling.DEBUG or st.query_params.get('debug') == '1':
+    with st.sidebar.expander('Debug: tempos do rerun', expanded = True):
+        st.dataframe(profiling.stage_table(profile), hide_index = True)
+        st.dataframe(profiling.page_summary(), hide_index = True)
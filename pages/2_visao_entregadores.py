@@ -1,108 +1,48 @@
 # Libraries
-from haversine import haversine
-import plotly.express as px
-import plotly.graph_objects as go
 import streamlit as st
-import pandas as pd
 from datetime import datetime
 from PIL import Image
-import folium
-from streamlit_folium import folium_static
+from curry_company import kpis, precompute, profiling
+from curry_company.bitmap import build_bitmaps, select_rows
+from curry_company.cube import slice_cube, update_cube
+from curry_company.dateindex import build_date_index, date_range
+from curry_company.loader import decode_columns, load_dataset, load_derived, load_dictionary, pin_version
+from curry_company.parallel import parallel_builder
+from curry_company.profiles import PAGE_SIZE, lookup, ordering, profile_frame, scan, search, update_profiles
+from curry_company.results import cached_result
+from curry_company.sections import render_sections
 
 st.set_page_config(page_title = 'Visão Entregadores', layout = 'wide')
 
-# =======================================
-# Funções
-# =======================================
+# Nome da página no cache de resultados
+PAGE = 'visao_entregadores'
+
+# Perfil deste rerun: tempo, linhas e memória de cada estágio (ver curry_company.profiling)
+profiling.begin_rerun(PAGE)
+
+# Versões novas do dataset são aquecidas e publicadas em segundo plano (ver curry_company.precompute);
+# este rerun inteiro usa a versão publicada agora
+precompute.start_scheduler()
+pin_version()
 
-def top_delivers(df1, top_asc):
-                
-    """ Esta função tem a responsabilidade de calcular os entregadores mais rápidos/lentos do dataframe através da função top_asc
-    
-    Input: Dataframe
-    Output: Dataframe """
-    
-    col = ['Time_taken(min)', 'City', 'Delivery_person_ID']
-    
-    df_aux = df1.loc[:, col].groupby(['City', 'Delivery_person_ID']).min().sort_values(['City', 'Time_taken(min)'], ascending = top_asc).reset_index()
-    df_aux01 = df_aux.loc[df_aux['City'] == 'Metropolitian'].head(10)
-    df_aux02 = df_aux.loc[df_aux['City'] == 'Urban'].head(10)
-    df_aux03 = df_aux.loc[df_aux['City'] == 'Semi-Urban'].head(10)
-    df3 = pd.concat([df_aux01, df_aux02, df_aux03]).reset_index(drop = True)
-    return (df3)
-
-    """ Esta função tem a responsabilidade de calcular os entregadores mais lentos do dataframe
-    
-    Input: Dataframe
-    Output: Dataframe """
-    
-## Limpeza dos dados
-
-def clean_code(df1):
-    
-    """ Esta função tem a responsabilidade de limpar o dataframe
-    
-    Tipos de Limpeza:
-    1. Remove espaços de maneira massiva
-    2. Remove o NaN de linhas específicas
-    3. Conversão de colunas
-    4. Retira o (min) de time_taken
-    
-    Input: Dataframe
-    Output: Dataframe """
-    
-    # Removendo NaN de linhas
-
-    df1 = df.copy()
-    
-    df1 = df1.loc[df1['Road_traffic_density'] != 'NaN ', :].copy()
-    df1 = df1.loc[df1['City'] != 'NaN ', :].copy()
-    df1 = df1.loc[df1['Weatherconditions'] != 'NaN ', :].copy()
-    
-    # Conversão de colunas
-    
-    df1['Delivery_person_Ratings'] = (df1['Delivery_person_Ratings'].astype(float))
-    
-    linhas_selecionadas = (df1['Delivery_person_Age'] != 'NaN ')
-    df1 = df1.loc[linhas_selecionadas, :].copy()
-    df1['Delivery_person_Age'] = (df1['Delivery_person_Age'].astype(int)).copy()
-    
-    linhas_selecionadas = (df1['Weatherconditions'] != 'conditions NaN')
-    df1 = df1.loc[linhas_selecionadas, :].copy()
-    
-    linhas_selecionadas = (df1['Festival'] != 'NaN ')
-    df1 = df1.loc[linhas_selecionadas, :].copy()
-    
-    df1 = df1.loc[df1['multiple_deliveries'] != 'NaN ', :].copy()
-    df1['multiple_deliveries'] = (df1['multiple_deliveries'].astype(int)).copy()
-    
-    df1['Order_Date'] = pd.to_datetime(df1['Order_Date'], format = '%d-%m-%Y').copy()
-    
-    # Retirando espaços de maneira massiva
-    
-    df1['ID'] = df1.loc[:, 'ID'].str.strip()
-    df1['Delivery_person_ID'] = df1.loc[:, 'Delivery_person_ID'].str.strip()
-    df1['Road_traffic_density'] = df1.loc[:, 'Road_traffic_density'].str.strip()
-    df1['Type_of_order'] = df1.loc[:, 'Type_of_order'].str.strip()
-    df1['Type_of_vehicle'] = df1.loc[:, 'Type_of_vehicle'].str.strip()
-    df1['Festival'] = df1.loc[:, 'Festival'].str.strip()
-    df1['City'] = df1.loc[:, 'City'].str.strip()
-    df1['Road_traffic_density'] = df1.loc[:, 'Road_traffic_density'].str.strip()
-    
-    # Retirando o (min) de time_taken
-    
-    df1['Time_taken(min)'] = df1['Time_taken(min)'].str.strip('(min) ')
-    df1['Time_taken(min)'] = (df1['Time_taken(min)'].astype(int)).copy()
-
-    return (df1)
+# Os cálculos desta página ficam em curry_company.kpis
 
 # ----------------------- Início da Estrutura Lógica de Programação -----------------------
 
-# Import dataset
-df = pd.read_csv('dataset/train.csv')
+# Import dataset já limpo (lido e limpo uma única vez por processo)
+df1 = load_dataset()
+
+# Cubo pré-agregado (montado uma única vez por versão do dataset)
+cube = load_derived('cube', parallel_builder('cube'), update = update_cube)
+
+# Índice dia -> posição no dataset ordenado por Order_Date
+date_index = load_derived('date_index', build_date_index)
+
+# Bitmaps por valor de trânsito/clima/festival (mesma ordem de linhas do dataset)
+bitmaps = load_derived('bitmaps', build_bitmaps)
 
-# Limpando dataset
-df1 = clean_code(df)
+# Perfis por entregador, indexados pelo código (consultas sem tocar nas linhas do dataset)
+profiles = load_derived('courier_profiles', parallel_builder('courier_profiles'), update = update_profiles)
 
 # =======================================
 # Barra lateral
@@ -118,8 +58,8 @@ st.sidebar.markdown ('# Curry Company')
 st.sidebar.markdown ('## Fastest Delivery in Town')
 st.sidebar.markdown ("""---""")
 
-st.sidebar.markdown ('## Selecione uma data limite')
-date_slider = st.sidebar.slider('Até qual valor?', value=datetime(2022, 3, 3), min_value=datetime(2022, 2, 11), max_value=datetime(2022, 4, 6), format = 'DD/MM/YYYY')
+st.sidebar.markdown ('## Selecione um intervalo de datas')
+date_start, date_end = st.sidebar.slider('Qual intervalo? (a data final não é incluída)', value=(datetime(2022, 2, 11), datetime(2022, 3, 3)), min_value=datetime(2022, 2, 11), max_value=datetime(2022, 4, 6), format = 'DD/MM/YYYY')
 
 st.sidebar.markdown ("""---""")
 
@@ -136,88 +76,135 @@ weatherconditions = st.sidebar.multiselect(
 st.sidebar.markdown ("""---""")
 st.sidebar.markdown ('### Powered by Comunidade DS')
 
-# Filtro de data
+# Filtros no cubo
 
-linhas_selecionadas = df1['Order_Date'] < date_slider
-df1 = df1.loc[linhas_selecionadas, :]
+filtros = dict(date_start = date_start, date_end = date_end, Road_traffic_density = traffic_options, Weatherconditions = weatherconditions)
+cells = profiling.profiled('slice_cube', slice_cube, cube, **filtros)
 
-# Filtro de trânsito
+# Filtro de data: busca binária no dataset ordenado (posições das linhas do intervalo)
 
-linhas_selecionadas = df1['Road_traffic_density'].isin(traffic_options)
-df1 = df1.loc[linhas_selecionadas, :]
+inicio, fim = date_range(date_index, date_start, date_end)
 
-# Filtro de condições climáticas
+# Filtros de múltipla escolha: bitmaps combinados apenas dentro do intervalo de datas
 
-linhas_selecionadas = df1['Weatherconditions'].isin(weatherconditions)
-df1 = df1.loc[linhas_selecionadas, :]
+df1 = profiling.profiled('select_rows', select_rows, df1, bitmaps, inicio, fim, Road_traffic_density = traffic_options, Weatherconditions = weatherconditions)
 
 # =======================================
 # Layout no Streamlit
 # =======================================
 
-tab1 =  st.tabs(['Visão Gerencial'])
+# Só a seção escolhida é calculada; as demais são aquecidas em segundo plano (ver curry_company.sections)
+secao = st.radio('Seção', ['Overall Metrics', 'Avaliações', 'Velocidade de Entrega', 'Perfis'], horizontal = True, label_visibility = 'collapsed')
 
-with st.container():
-    st.title('Overall Metrics')
-    col1, col2, col3, col4 = st.columns(4, gap = 'large')
-    
-    with col1:
-        # Exibir a maior idade dos entregadores
-        maior_idade = (df1.loc[:, 'Delivery_person_Age'].max())
-        col1.metric('Maior Idade', maior_idade)
-        
-    with col2:
-        # Exibir a menor idade dos entregadores
-        menor_idade = (df1.loc[:, 'Delivery_person_Age'].min())
-        col2.metric('Menor Idade', menor_idade)
-
-    with col3:
-        # Exibir a melhor condição dos veículos
-        melhor_condicao = (df1.loc[:, 'Vehicle_condition'].max())
-        col3.metric('Melhor Condição', melhor_condicao)
-
-    with col4:
-        # Exibit a pior condição dos veículos
-        pior_condicao = (df1.loc[:, 'Vehicle_condition'].min())
-        col4.metric('Pior Condição', pior_condicao)
-
-with st.container():
-    st.markdown("""---""")
-    st.title('Avaliações')
-
-    col1, col2 = st.columns(2)
-    with col1:
-        st.markdown('##### Avaliações Médias por Entregador')
-        col = ['Delivery_person_Ratings', 'Delivery_person_ID']
-        df_avg_ratings_per_deliver = df1.loc[:, col].groupby('Delivery_person_ID').mean().reset_index()
-        st.dataframe(df_avg_ratings_per_deliver)
-        
-    with col2:
-        st.markdown('##### Avaliação Média por Trânsito')
-        col = ['Delivery_person_Ratings', 'Road_traffic_density']
-        df_avg_std_rating_by_traffic = ( df1.loc[:, col].groupby('Road_traffic_density').agg({'Delivery_person_Ratings': ['mean','std']}))
-        df_avg_std_rating_by_traffic.columns = ['delivery_mean', 'delivery_std']
-        df_avg_std_rating_by_traffic.reset_index()
-        st.dataframe(df_avg_std_rating_by_traffic)
-        
-        st.markdown('##### Avaliação Média por Clima')
-        col = ['Delivery_person_Ratings', 'Weatherconditions']
-        df_avg_std_rating_by_weather = ( df1.loc[:, col].groupby('Weatherconditions').agg({'Delivery_person_Ratings': ['mean','std']}))
-        df_avg_std_rating_by_weather.columns = ['delivery_mean', 'delivery_std']
-        df_avg_std_rating_by_weather.reset_index()
-        st.dataframe(df_avg_std_rating_by_weather)
-
-with st.container():
-    st.markdown("""---""")
-    st.title('Velocidade de Entrega')
-
-    col1, col2 = st.columns(2)
-    with col1:
-        st.markdown('##### Entregadores Mais Rapidos')
-        df3 = top_delivers (df1, top_asc = True)
-        st.dataframe(df3)
+# Ordenações da tabela de perfis: rótulo -> (coluna, crescente)
+ORDENACOES = {'Mais pedidos': ('orders', False), 'Melhor avaliação': ('rating_mean', False), 'Pior avaliação': ('rating_mean', True),
+              'Mais rápidos': ('time_mean', True), 'Mais lentos': ('time_mean', False)}
+
+def overall_data():
+    return cached_result(PAGE, 'overall_metrics', filtros, kpis.overall_metrics, df1)
+
+def ratings_data():
+    df_avg_ratings_per_deliver = cached_result(PAGE, 'avg_rating_per_deliver', filtros, kpis.avg_rating_per_deliver, df1)
+    df_avg_std_rating_by_traffic = cached_result(PAGE, 'avg_std_rating_by_traffic', filtros, kpis.avg_std_rating, cells, 'Road_traffic_density')
+    df_avg_std_rating_by_weather = cached_result(PAGE, 'avg_std_rating_by_weather', filtros, kpis.avg_std_rating, cells, 'Weatherconditions')
+    return (df_avg_ratings_per_deliver, df_avg_std_rating_by_traffic, df_avg_std_rating_by_weather)
+
+def speed_data():
+    return cached_result(PAGE, 'top_delivers', filtros, kpis.top_delivers, df1, load_dictionary('Delivery_person_ID'))
+
+def visao_overall():
+    with st.container():
+        st.title('Overall Metrics')
+        col1, col2, col3, col4 = st.columns(4, gap = 'large')
+        maior_idade, menor_idade, melhor_condicao, pior_condicao = overall_data()
         
-    with col2:
-        st.markdown('##### Entregadores Mais Lentos')
-        df3 = top_delivers(df1, top_asc = False)
-        st.dataframe(df3)
+        with col1:
+            # Exibir a maior idade dos entregadores
+            col1.metric('Maior Idade', maior_idade)
+            
+        with col2:
+            # Exibir a menor idade dos entregadores
+            col2.metric('Menor Idade', menor_idade)
+
+        with col3:
+            # Exibir a melhor condição dos veículos
+            col3.metric('Melhor Condição', melhor_condicao)
+
+        with col4:
+            # Exibit a pior condição dos veículos
+            col4.metric('Pior Condição', pior_condicao)
+
+def visao_avaliacoes():
+    with st.container():
+        st.title('Avaliações')
+        df_avg_ratings_per_deliver, df_avg_std_rating_by_traffic, df_avg_std_rating_by_weather = ratings_data()
+
+        col1, col2 = st.columns(2)
+        with col1:
+            st.markdown('##### Avaliações Médias por Entregador')
+            st.dataframe(decode_columns(df_avg_ratings_per_deliver, ['Delivery_person_ID']))
+            
+        with col2:
+            st.markdown('##### Avaliação Média por Trânsito')
+            st.dataframe(df_avg_std_rating_by_traffic)
+            
+            st.markdown('##### Avaliação Média por Clima')
+            st.dataframe(df_avg_std_rating_by_weather)
+
+def visao_velocidade():
+    with st.container():
+        st.title('Velocidade de Entrega')
+
+        fastest, slowest = speed_data()
+
+        col1, col2 = st.columns(2)
+        with col1:
+            st.markdown('##### Entregadores Mais Rapidos')
+            st.dataframe(decode_columns(fastest, ['Delivery_person_ID']))
+            
+        with col2:
+            st.markdown('##### Entregadores Mais Lentos')
+            st.dataframe(decode_columns(slowest, ['Delivery_person_ID']))
+
+def visao_perfis():
+    with st.container():
+        st.title('Perfis')
+
+        # Perfis e dicionário de IDs apenas: nada aqui percorre os pedidos (nem usa os filtros da barra lateral)
+        busca = st.text_input('Buscar entregador (ID completo ou parte dele)', placeholder = 'CITY07RES15DEL01')
+        if busca.strip():
+            codes = search(profiles, load_dictionary('Delivery_person_ID'), busca)
+            if len(codes) == 0:
+                st.info('Nenhum entregador encontrado.')
+                return
+            if len(codes) == 1:
+                perfil = lookup(profiles, int(codes[0]))
+                col1, col2, col3, col4, col5 = st.columns(5)
+                col1.metric('Pedidos', perfil['orders'])
+                col2.metric('Avaliação Média', round(perfil['rating_mean'], 2))
+                col3.metric('Tempo Médio (min)', round(perfil['time_mean'], 1))
+                col4.metric('Menor / Maior Tempo', '%d / %d' % (perfil['time_min'], perfil['time_max']))
+                col5.metric('Idade', int(perfil['age']))
+            st.dataframe(decode_columns(profile_frame(profiles, codes), ['Delivery_person_ID']), hide_index = True)
+            return
+
+        col1, col2 = st.columns(2)
+        coluna, crescente = ORDENACOES[col1.selectbox('Ordenar por', list(ORDENACOES))]
+        total = len(ordering(profiles, coluna, crescente))
+        pagina = col2.number_input('Página', min_value = 1, max_value = max(1, -(-total // PAGE_SIZE)), value = 1)
+        df_aux, total = scan(profiles, coluna, crescente, pagina - 1)
+        st.caption('%d entregadores' % total)
+        st.dataframe(decode_columns(df_aux, ['Delivery_person_ID']), hide_index = True)
+
+# Seção -> (desenho, cálculo para o aquecimento)
+render_sections(PAGE, {'Overall Metrics': (visao_overall, overall_data),
+                       'Avaliações': (visao_avaliacoes, ratings_data),
+                       'Velocidade de Entrega': (visao_velocidade, speed_data),
+                       'Perfis': (visao_perfis, None)}, secao, filtros)
+
+# Painel de depuração (?debug=1 na URL ou CURRY_DEBUG=1): estágios deste rerun e p50/p95 por página
+profile = profiling.end_rerun()
+if profiling.DEBUG or st.query_params.get('debug') == '1':
+    with st.sidebar.expander('Debug: tempos do rerun', expanded = True):
+        st.dataframe(profiling.stage_table(profile), hide_index = True)
+        st.dataframe(profiling.page_summary(), hide_index = True)
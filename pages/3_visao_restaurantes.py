@@ -1,138 +1,94 @@
 # Libraries
-from haversine import haversine
 import plotly.express as px
 import plotly.graph_objects as go
 import streamlit as st
-import pandas as pd
 from datetime import datetime
 from PIL import Image
-import folium
-from streamlit_folium import folium_static
+from curry_company import kpis, precompute, profiling
+from curry_company.cube import slice_cube, update_cube
+from curry_company.distinct import count_distinct, update_distinct
+from curry_company.loader import load_derived, pin_version
+from curry_company.parallel import parallel_builder
+from curry_company.render import cached_figure, plotly_chart
+from curry_company.results import cached_result
+from curry_company.sections import render_sections
 import numpy as np
 
 st.set_page_config(page_title = 'Visão Restaurantes', layout = 'wide')
 
+# Nome da página no cache de resultados
+PAGE = 'visao_restaurantes'
+
+# Perfil deste rerun: tempo, linhas e memória de cada estágio (ver curry_company.profiling)
+profiling.begin_rerun(PAGE)
+
+# Versões novas do dataset são aquecidas e publicadas em segundo plano (ver curry_company.precompute);
+# este rerun inteiro usa a versão publicada agora
+precompute.start_scheduler()
+pin_version()
+
 # =======================================
 # Funções
 # =======================================
 
-def avg_std_time_graph(df1):
+def avg_std_time_graph(cells, filtros):
 
     """ Esta função tem a responsabilidade de plotar o gráfico de barras que possui a distribuição da distância por cidade
     
-    Input: Dataframe
+    Input: Células do cubo, filtros da barra lateral
     Output: Gráfico de barras """
     
-    col = ['Time_taken(min)', 'City']
-    df_aux = df1.loc[:, col].groupby(['City']).agg({'Time_taken(min)': ['mean', 'std']})
-    df_aux.columns = ['avg_time', 'std_time']
-    df_aux = df_aux.reset_index()
+    df_aux = cached_result(PAGE, 'avg_std_time_by_city', filtros, kpis.avg_std_time, cells, ['City'])
+    fig = cached_figure('avg_std_time_graph', avg_std_time_bar, df_aux)
+    return (fig)
+
+def avg_std_time_bar(df_aux):
+
+    """ Esta função tem a responsabilidade de montar o gráfico de barras com o tempo médio e o desvio padrão por cidade
+
+    Input: Dataframe com City, avg_time e std_time
+    Output: Gráfico de barras """
+
     fig = go.Figure()
     fig.add_trace(go.Bar(name = 'Control', x = df_aux['City'], y = df_aux['avg_time'], error_y = dict(type = 'data', array = df_aux['std_time'])))
     fig.update_layout(barmode = 'group')
     return (fig)
 
-def avg_std_time_festival_delivery(df1, op, festival):
+def distance_pie(avg_distance):
+
+    """ Esta função tem a responsabilidade de montar o gráfico de pizza da distância média por cidade
+
+    Input: Dataframe com City e distance
+    Output: Gráfico de pizza """
+
+    return go.Figure(data = [go.Pie(labels = avg_distance['City'], values = avg_distance['distance'], pull = [0, 0.1, 0])])
+
+def avg_std_time_festival_delivery(cells, op, festival, filtros):
     
     """ Esta função tem a responsabilidade de calcular o tempo médio e o desvio padrão do tempo de entrega
         Parâmetros:
             Input:
-                - df: Dataframe
+                - cells: Células do cubo
                 - op: Tipo de operação
                     'avg_time' = Calcula o tempo médio
                     'std_time' = Calcula o desvio padrão
                 - festival: Com ou sem festival
                     'Yes' = Calcula com festival
                     'No' = Calcula sem festival
+                - filtros: Filtros da barra lateral
             Output:
-                - df: Dataframe """
+                - Valor arredondado (None se não houver pedidos) """
             
-    col = ['Time_taken(min)', 'Festival']
-    df_aux = df1.loc[:, col].groupby('Festival').agg({'Time_taken(min)': ['mean', 'std']})
-    df_aux.columns = ['avg_time', 'std_time']
-    df_aux = df_aux.reset_index()
-    df_aux = np.round(df_aux.loc[df_aux['Festival'] == festival, op], 2)
-    return (df_aux)
-
-def distance(df1):
-    
-    """ Esta função tem a responsabilidade de calcular a distância média entre os restaurantes.
-    
-    Input: Dataframe
-    Output: Dataframe"""
-    
-    col = ['Restaurant_latitude', 'Restaurant_longitude', 'Delivery_location_latitude', 'Delivery_location_longitude']
-    df1['distance'] = df1.loc[:, col].apply( lambda x: haversine ((x['Restaurant_latitude'], x['Restaurant_longitude']), (x['Delivery_location_latitude'], x['Delivery_location_longitude'])), axis = 1)
-    avg_distance = np.round(df1.loc[:, 'distance'].mean(),2)
-    return avg_distance
-
-## Limpeza dos dados
-
-def clean_code(df1):
-    
-    """ Esta função tem a responsabilidade de limpar o dataframe
-    
-    Tipos de Limpeza:
-    1. Remove espaços de maneira massiva
-    2. Remove o NaN de linhas específicas
-    3. Conversão de colunas
-    4. Retira o (min) de time_taken
-    
-    Input: Dataframe
-    Output: Dataframe """
-    
-    # Removendo NaN de linhas
-
-    df1 = df.copy()
-    
-    df1 = df1.loc[df1['Road_traffic_density'] != 'NaN ', :].copy()
-    df1 = df1.loc[df1['City'] != 'NaN ', :].copy()
-    df1 = df1.loc[df1['Weatherconditions'] != 'NaN ', :].copy()
-    
-    # Conversão de colunas
-    
-    df1['Delivery_person_Ratings'] = (df1['Delivery_person_Ratings'].astype(float))
-    
-    linhas_selecionadas = (df1['Delivery_person_Age'] != 'NaN ')
-    df1 = df1.loc[linhas_selecionadas, :].copy()
-    df1['Delivery_person_Age'] = (df1['Delivery_person_Age'].astype(int)).copy()
-    
-    linhas_selecionadas = (df1['Weatherconditions'] != 'conditions NaN')
-    df1 = df1.loc[linhas_selecionadas, :].copy()
-    
-    linhas_selecionadas = (df1['Festival'] != 'NaN ')
-    df1 = df1.loc[linhas_selecionadas, :].copy()
-    
-    df1 = df1.loc[df1['multiple_deliveries'] != 'NaN ', :].copy()
-    df1['multiple_deliveries'] = (df1['multiple_deliveries'].astype(int)).copy()
-    
-    df1['Order_Date'] = pd.to_datetime(df1['Order_Date'], format = '%d-%m-%Y').copy()
-    
-    # Retirando espaços de maneira massiva
-    
-    df1['ID'] = df1.loc[:, 'ID'].str.strip()
-    df1['Delivery_person_ID'] = df1.loc[:, 'Delivery_person_ID'].str.strip()
-    df1['Road_traffic_density'] = df1.loc[:, 'Road_traffic_density'].str.strip()
-    df1['Type_of_order'] = df1.loc[:, 'Type_of_order'].str.strip()
-    df1['Type_of_vehicle'] = df1.loc[:, 'Type_of_vehicle'].str.strip()
-    df1['Festival'] = df1.loc[:, 'Festival'].str.strip()
-    df1['City'] = df1.loc[:, 'City'].str.strip()
-    df1['Road_traffic_density'] = df1.loc[:, 'Road_traffic_density'].str.strip()
-    
-    # Retirando o (min) de time_taken
-    
-    df1['Time_taken(min)'] = df1['Time_taken(min)'].str.strip('(min) ')
-    df1['Time_taken(min)'] = (df1['Time_taken(min)'].astype(int)).copy()
-
-    return (df1)
+    df_aux = cached_result(PAGE, 'avg_std_time_by_festival', filtros, kpis.avg_std_time, cells, ['Festival'])
+    return kpis.festival_time(df_aux, op, festival)
 
 # ----------------------- Início da Estrutura Lógica de Programação -----------------------
 
-# Import dataset
-df = pd.read_csv('dataset/train.csv')
+# Cubo pré-agregado (montado uma única vez por versão do dataset)
+cube = load_derived('cube', parallel_builder('cube'), update = update_cube)
 
-# Limpando dataset
-df1 = clean_code(df)
+# Entregadores distintos por dia/tráfego/clima (bitmap exato)
+couriers = load_derived('couriers', parallel_builder('couriers'), update = update_distinct)
 
 # =======================================
 # Barra lateral
@@ -148,8 +104,8 @@ st.sidebar.markdown ('# Curry Company')
 st.sidebar.markdown ('## Fastest Delivery in Town')
 st.sidebar.markdown ("""---""")
 
-st.sidebar.markdown ('## Selecione uma data limite')
-date_slider = st.sidebar.slider('Até qual valor?', value=datetime(2022, 3, 3), min_value=datetime(2022, 2, 11), max_value=datetime(2022, 4, 6), format = 'DD/MM/YYYY')
+st.sidebar.markdown ('## Selecione um intervalo de datas')
+date_start, date_end = st.sidebar.slider('Qual intervalo? (a data final não é incluída)', value=(datetime(2022, 2, 11), datetime(2022, 3, 3)), min_value=datetime(2022, 2, 11), max_value=datetime(2022, 4, 6), format = 'DD/MM/YYYY')
 
 st.sidebar.markdown ("""---""")
 
@@ -166,76 +122,86 @@ weatherconditions = st.sidebar.multiselect(
 st.sidebar.markdown ("""---""")
 st.sidebar.markdown ('### Powered by Comunidade DS')
 
-# Filtro de data
-
-linhas_selecionadas = df1['Order_Date'] < date_slider
-df1 = df1.loc[linhas_selecionadas, :]
-
-# Filtro de trânsito
-
-linhas_selecionadas = df1['Road_traffic_density'].isin(traffic_options)
-df1 = df1.loc[linhas_selecionadas, :]
-
-# Filtro de condições climáticas
+# Filtros no cubo
 
-linhas_selecionadas = df1['Weatherconditions'].isin(weatherconditions)
-df1 = df1.loc[linhas_selecionadas, :]
+filtros = dict(date_start = date_start, date_end = date_end, Road_traffic_density = traffic_options, Weatherconditions = weatherconditions)
+cells = profiling.profiled('slice_cube', slice_cube, cube, **filtros)
 
 # =======================================
 # Layout no Streamlit
 # =======================================
 
-tab1 =  st.tabs(['Visão Gerencial'])
-
-with st.container():
-    st.title("Overall Metrics")
-    col1, col2, col3, col4, col5, col6 = st.columns(6)
-    with col1:
-        delivery_unique = len(df1['Delivery_person_ID'].unique())
-        st.metric('Entregadores', delivery_unique)
-    with col2:
-        avg_distance = distance(df1)
-        col2.metric('Avg dist', avg_distance)
-    with col3:
-        df_aux = avg_std_time_festival_delivery(df1, 'avg_time', 'Yes')
-        col3.metric('Tempo médio c/ festival', df_aux)
-    with col4:
-        df_aux = avg_std_time_festival_delivery(df1, 'std_time', 'Yes')
-        col4.metric('Std s/ festival', df_aux)
-    with col5:
-        df_aux = avg_std_time_festival_delivery(df1, 'avg_time', 'No')
-        col5.metric('Tempo médio s/ festival', df_aux)
-    with col6:
-        df_aux = avg_std_time_festival_delivery(df1, 'std_time', 'No')
-        col6.metric('Std s/ festival', df_aux)
-with st.container():
-    st.markdown("""---""")
-    st.title("Distribuição da distância")
-    col1, col2 = st.columns(2)
-    with col1:
-        fig = avg_std_time_graph(df1)
-        st.plotly_chart(fig)
-    with col2:
-        st.markdown("""---""")
-        col = ['Time_taken(min)', 'City', 'Type_of_order']
-        df_aux = df1.loc[:, col].groupby(['City', 'Type_of_order']).agg({'Time_taken(min)': ['mean', 'std']})
-        df_aux.columns = ['avg_time', 'std_time']
-        df_aux = df_aux.reset_index()
-        st.dataframe(df_aux)
-with st.container():
-    st.markdown("""---""")
-    st.title("Distribuição do tempo")
-    col1, col2 = st.columns(2)
-    with col1:
-        col = ['Restaurant_latitude', 'Restaurant_longitude', 'Delivery_location_latitude', 'Delivery_location_longitude']
-        df1['distance'] = df1.loc[:, col].apply( lambda x: haversine ((x['Restaurant_latitude'], x['Restaurant_longitude']), (x['Delivery_location_latitude'], x['Delivery_location_longitude'])), axis = 1)
-        avg_distance = np.round(df1.loc[:, ['City','distance']].groupby('City').mean().reset_index(),2)
-        fig = go.Figure(data = [go.Pie(labels = avg_distance['City'], values = avg_distance['distance'], pull = [0, 0.1, 0])])
-        st.plotly_chart(fig)
-    with col2:
-        col = ['Time_taken(min)', 'City', 'Road_traffic_density']
-        df_aux = df1.loc[:, col].groupby(['City', 'Road_traffic_density']).agg({'Time_taken(min)': ['mean', 'std']})
-        df_aux.columns = ['avg_time', 'std_time']
-        df_aux = df_aux.reset_index()
-        fig = px.sunburst(df_aux, path = ['City', 'Road_traffic_density'], values = 'avg_time', color = 'std_time', color_continuous_scale = 'RdBu', color_continuous_midpoint = np.average(df_aux['std_time']))
-        st.plotly_chart(fig)
+# Só a seção escolhida é calculada; as demais são aquecidas em segundo plano (ver curry_company.sections)
+secao = st.radio('Seção', ['Overall Metrics', 'Distribuição da distância', 'Distribuição do tempo'], horizontal = True, label_visibility = 'collapsed')
+
+def overall_data():
+    return (cached_result(PAGE, 'delivery_unique', filtros, count_distinct, couriers, **filtros),
+            cached_result(PAGE, 'distance', filtros, kpis.distance, cells),
+            avg_std_time_festival_delivery(cells, 'avg_time', 'Yes', filtros),
+            avg_std_time_festival_delivery(cells, 'std_time', 'Yes', filtros),
+            avg_std_time_festival_delivery(cells, 'avg_time', 'No', filtros),
+            avg_std_time_festival_delivery(cells, 'std_time', 'No', filtros))
+
+def distance_data():
+    return (avg_std_time_graph(cells, filtros),
+            cached_result(PAGE, 'avg_std_time_by_city_order', filtros, kpis.avg_std_time, cells, ['City', 'Type_of_order']))
+
+def time_data():
+    avg_distance = cached_result(PAGE, 'distance_by_city', filtros, kpis.distance_by_city, cells)
+    fig_pie = cached_figure('distance_pie', distance_pie, avg_distance)
+    df_aux = cached_result(PAGE, 'avg_std_time_by_city_traffic', filtros, kpis.avg_std_time, cells, ['City', 'Road_traffic_density'])
+    # O sunburst agrupa pelo path internamente: rótulos como texto evitam combinações vazias das categorias
+    df_aux[['City', 'Road_traffic_density']] = df_aux[['City', 'Road_traffic_density']].astype(str)
+    fig_sunburst = cached_figure('avg_std_time_sunburst', px.sunburst, df_aux, path = ['City', 'Road_traffic_density'], values = 'avg_time', color = 'std_time', color_continuous_scale = 'RdBu', color_continuous_midpoint = np.average(df_aux['std_time']))
+    return (fig_pie, fig_sunburst)
+
+def visao_overall():
+    with st.container():
+        st.title("Overall Metrics")
+        delivery_unique, avg_distance, avg_festival, std_festival, avg_sem_festival, std_sem_festival = overall_data()
+        col1, col2, col3, col4, col5, col6 = st.columns(6)
+        with col1:
+            st.metric('Entregadores', delivery_unique)
+        with col2:
+            col2.metric('Avg dist', avg_distance)
+        with col3:
+            col3.metric('Tempo médio c/ festival', avg_festival)
+        with col4:
+            col4.metric('Std s/ festival', std_festival)
+        with col5:
+            col5.metric('Tempo médio s/ festival', avg_sem_festival)
+        with col6:
+            col6.metric('Std s/ festival', std_sem_festival)
+
+def visao_distancia():
+    with st.container():
+        st.title("Distribuição da distância")
+        fig, df_aux = distance_data()
+        col1, col2 = st.columns(2)
+        with col1:
+            plotly_chart(fig)
+        with col2:
+            st.markdown("""---""")
+            st.dataframe(df_aux)
+
+def visao_tempo():
+    with st.container():
+        st.title("Distribuição do tempo")
+        fig_pie, fig_sunburst = time_data()
+        col1, col2 = st.columns(2)
+        with col1:
+            plotly_chart(fig_pie)
+        with col2:
+            plotly_chart(fig_sunburst)
+
+# Seção -> (desenho, cálculo para o aquecimento)
+render_sections(PAGE, {'Overall Metrics': (visao_overall, overall_data),
+                       'Distribuição da distância': (visao_distancia, distance_data),
+                       'Distribuição do tempo': (visao_tempo, time_data)}, secao, filtros)
+
+# Painel de depuração (?debug=1 na URL ou CURRY_DEBUG=1): estágios deste rerun e p50/p95 por página
+profile = profiling.end_rerun()
+if profiling.DEBUG or st.query_params.get('debug') == '1':
+    with st.sidebar.expander('Debug: tempos do rerun', expanded = True):
+        st.dataframe(profiling.stage_table(profile), hide_index = True)
+        st.dataframe(profiling.page_summary(), hide_index = True)
@@ -0,0 +1,113 @@
+""" Lote anexado (append_orders) x dataset reconstruído a partir do CSV concatenado
+
+As estruturas atualizadas com as linhas novas (cubo, entregadores distintos,
+perfis) e as reconstruídas sobre o dataset com o lote (índice de datas, bitmaps)
+devem ser as mesmas de um dataset montado do zero. Os códigos das colunas
+codificadas (ID, Delivery_person_ID...) podem diferir entre os dois (o
+dicionário cresce na ordem de chegada), por isso as comparações usam o texto. """
+
+# Libraries
+import numpy as np
+import pandas as pd
+import pytest
+
+from curry_company import kpis, loader
+from curry_company.append import append_orders
+from curry_company.cube import DIMENSIONS as CUBE_DIMENSIONS
+from curry_company.distinct import count_distinct, count_distinct_by
+from curry_company.encoding import ENCODED_COLUMNS
+from curry_company.profiles import active_codes, profile_frame
+from curry_company.synthetic import write_orders
+
+ROWS = 4000
+BATCH_ROWS = 600
+
+# O lote traz 100 entregadores que o dataset ainda não tem
+BATCH_COURIERS = 1300
+
+FILTERS = [{},
+           {'date_start': pd.Timestamp(2022, 3, 1), 'date_end': pd.Timestamp(2022, 3, 15)},
+           {'Road_traffic_density': ['Low', 'Jam'], 'Weatherconditions': ['conditions Fog']},
+           {'Festival': ['Yes']}]
+
+# =======================================
+# Funções
+# =======================================
+
+def decoded_profiles(structures, path):
+    df_aux = profile_frame(structures['profiles'], active_codes(structures['profiles']))
+    df_aux = loader.decode_columns(df_aux, ['Delivery_person_ID'], path)
+    df_aux = df_aux.astype({'Delivery_person_ID': str}).sort_values('Delivery_person_ID').reset_index(drop = True)
+    return df_aux[sorted(df_aux.columns)]
+
+@pytest.fixture(scope = 'module')
+def datasets(tmp_path_factory):
+    directory = tmp_path_factory.mktemp('append')
+    base = write_orders(str(directory / 'base.csv'), ROWS, seed = 0)
+    batch = write_orders(str(directory / 'batch.csv'), BATCH_ROWS, seed = 1, couriers = BATCH_COURIERS)
+
+    # Dataset com o lote anexado depois de as estruturas já existirem
+    appended = str(directory / 'appended.csv')
+    with open(base) as f:
+        base_text = f.read()
+    with open(appended, 'w') as f:
+        f.write(base_text)
+    loader.build_dataset(appended)
+    kpis.load_structures(appended)
+    assert append_orders(batch, appended) > 0
+    assert loader.current_snapshot(appended).previous is not None
+
+    # Mesmo conteúdo montado do zero
+    rebuilt = str(directory / 'rebuilt.csv')
+    with open(batch) as f:
+        batch_rows = f.read().split('\n', 1)[1]
+    with open(rebuilt, 'w') as f:
+        f.write(base_text + batch_rows)
+    loader.build_dataset(rebuilt)
+    return (appended, kpis.load_structures(appended)), (rebuilt, kpis.load_structures(rebuilt))
+
+# =======================================
+# Testes
+# =======================================
+
+def test_dataset(datasets):
+    (appended, first), (rebuilt, second) = datasets
+    decoded = lambda df1, path: loader.decode_columns(df1, ENCODED_COLUMNS, path).astype({coluna: str for coluna in ENCODED_COLUMNS})
+    pd.testing.assert_frame_equal(decoded(first['df1'], appended), decoded(second['df1'], rebuilt))
+
+def test_cube(datasets):
+    (_, first), (_, second) = datasets
+    # update_cube pode devolver as medidas em outra ordem de colunas
+    sort = lambda cube: cube[sorted(cube.columns)].sort_values(CUBE_DIMENSIONS).reset_index(drop = True)
+    pd.testing.assert_frame_equal(sort(first['cube']), sort(second['cube']), check_categorical = False)
+
+def test_date_index(datasets):
+    (_, first), (_, second) = datasets
+    for name in ('days', 'offsets'):
+        np.testing.assert_array_equal(first['date_index'][name], second['date_index'][name])
+
+def test_bitmaps(datasets):
+    (_, first), (_, second) = datasets
+    assert first['bitmaps']['rows'] == second['bitmaps']['rows']
+    for coluna, bitmaps in second['bitmaps']['bitmaps'].items():
+        assert set(first['bitmaps']['bitmaps'][coluna]) == set(bitmaps)
+        for label, bits in bitmaps.items():
+            np.testing.assert_array_equal(first['bitmaps']['bitmaps'][coluna][label], bits)
+
+def test_distinct(datasets):
+    (_, first), (_, second) = datasets
+    for filtros in FILTERS:
+        assert count_distinct(first['couriers'], **filtros) == count_distinct(second['couriers'], **filtros)
+        weeks = [kpis.week_of_year(kpis.day_numbers(couriers['keys']['Order_Date'])) for couriers in (first['couriers'], second['couriers'])]
+        pd.testing.assert_series_equal(count_distinct_by(first['couriers'], weeks[0], **filtros),
+                                       count_distinct_by(second['couriers'], weeks[1], **filtros))
+
+def test_profiles(datasets):
+    (appended, first), (rebuilt, second) = datasets
+    pd.testing.assert_frame_equal(decoded_profiles(first, appended), decoded_profiles(second, rebuilt))
+
+def test_top_delivers(datasets):
+    (appended, _), (rebuilt, _) = datasets
+    for filtros in FILTERS:
+        for fast_or_slow in zip(kpis.compute_kpi('top_delivers', filtros, appended), kpis.compute_kpi('top_delivers', filtros, rebuilt)):
+            pd.testing.assert_frame_equal(*(df_aux.astype({'Delivery_person_ID': str}) for df_aux in fast_or_slow))
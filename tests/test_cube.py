@@ -0,0 +1,85 @@
+""" Média e desvio padrão a partir dos momentos do cubo x groupby().agg(['mean', 'std']) do pandas """
+
+# Libraries
+import numpy as np
+import pandas as pd
+import pytest
+
+from curry_company.cube import build_cube, slice_cube
+from curry_company.kpis import avg_std_rating
+
+FILTERS = [{},
+           {'date_start': pd.Timestamp(2022, 2, 12), 'date_end': pd.Timestamp(2022, 2, 14)},
+           {'Road_traffic_density': ['Low', 'Jam']},
+           {'Weatherconditions': ['conditions Fog', 'conditions Sunny'], 'Festival': ['No']},
+           # Filtro vazio (multiselect sem opções): nenhuma célula
+           {'Road_traffic_density': []}]
+
+# =======================================
+# Funções
+# =======================================
+
+def orders():
+
+    """ Esta função tem a responsabilidade de montar um dataframe limpo pequeno
+
+    'conditions Sandstorm' tem um único pedido (desvio padrão NaN) e há uma
+    avaliação ausente, que não entra na média nem no desvio padrão.
+
+    Input: None
+    Output: Dataframe no formato do dataset limpo """
+
+    return pd.DataFrame({
+        'Order_Date': pd.to_datetime(['2022-02-11', '2022-02-11', '2022-02-12', '2022-02-12', '2022-02-13',
+                                      '2022-02-13', '2022-02-13', '2022-02-14', '2022-02-14', '2022-02-15']),
+        'City': pd.Categorical(['Urban', 'Urban', 'Metropolitian', 'Urban', 'Semi-Urban',
+                                'Metropolitian', 'Metropolitian', 'Urban', 'Urban', 'Metropolitian']),
+        'Road_traffic_density': pd.Categorical(['Low', 'Low', 'Jam', 'High', 'Jam', 'Medium', 'Low', 'Jam', 'Low', 'High']),
+        'Weatherconditions': pd.Categorical(['conditions Fog', 'conditions Fog', 'conditions Sunny', 'conditions Fog', 'conditions Sandstorm',
+                                             'conditions Sunny', 'conditions Sunny', 'conditions Fog', 'conditions Windy', 'conditions Windy']),
+        'Festival': pd.Categorical(['No', 'No', 'No', 'Yes', 'No', 'No', 'Yes', 'No', 'No', 'No']),
+        'Type_of_order': pd.Categorical(['Snack', 'Meal', 'Snack', 'Drinks', 'Buffet', 'Meal', 'Snack', 'Snack', 'Meal', 'Drinks']),
+        'Delivery_person_Ratings': [4.9, 4.5, np.nan, 4.7, 3.1, 5.0, 4.2, 4.8, 4.6, 4.4],
+        'Time_taken(min)': [24, 33, 26, 21, 30, 40, 32, 17, 20, 29],
+        'distance': [3.1, 7.2, 12.5, 5.0, 9.8, 14.0, 2.2, 6.6, 4.4, 11.1],
+    })
+
+def expected(df1, filtros, by):
+
+    """ Esta função tem a responsabilidade de calcular o resultado como a página original, direto nas linhas
+
+    Input: Dataframe limpo, filtros, dimensão do agrupamento
+    Output: Dataframe indexado pela dimensão com delivery_mean e delivery_std """
+
+    linhas_selecionadas = pd.Series(True, index = df1.index)
+    if 'date_start' in filtros:
+        linhas_selecionadas &= df1['Order_Date'] >= filtros['date_start']
+    if 'date_end' in filtros:
+        linhas_selecionadas &= df1['Order_Date'] < filtros['date_end']
+    for coluna, valores in filtros.items():
+        if coluna not in ('date_start', 'date_end'):
+            linhas_selecionadas &= df1[coluna].isin(valores)
+    df_aux = df1.loc[linhas_selecionadas].groupby(by, observed = True)['Delivery_person_Ratings'].agg(['mean', 'std'])
+    df_aux.columns = ['delivery_mean', 'delivery_std']
+    return df_aux
+
+# =======================================
+# Testes
+# =======================================
+
+@pytest.mark.parametrize('filtros', FILTERS)
+@pytest.mark.parametrize('by', ['Road_traffic_density', 'Weatherconditions'])
+def test_avg_std_rating_matches_pandas(filtros, by):
+    df1 = orders()
+    result = avg_std_rating(slice_cube(build_cube(df1), **filtros), by)
+    pd.testing.assert_frame_equal(result, expected(df1, filtros, by), check_index_type = False, check_categorical = False)
+
+def test_single_order_group_has_nan_std():
+    result = avg_std_rating(slice_cube(build_cube(orders())), 'Weatherconditions')
+    assert result.loc['conditions Sandstorm', 'delivery_mean'] == 3.1
+    assert np.isnan(result.loc['conditions Sandstorm', 'delivery_std'])
+
+def test_empty_filter():
+    result = avg_std_rating(slice_cube(build_cube(orders()), Road_traffic_density = []), 'Weatherconditions')
+    assert result.empty
+    assert list(result.columns) == ['delivery_mean', 'delivery_std']
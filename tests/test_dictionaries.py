@@ -0,0 +1,51 @@
+""" Troca dos dicionários ao regravar o arquivo colunar: diretório novo + link trocado com os.replace """
+
+# Libraries
+import os
+
+import pandas as pd
+
+from curry_company import encoding
+
+# =======================================
+# Funções
+# =======================================
+
+def dictionaries(*labels):
+    return {'Delivery_person_ID': pd.Index(list(labels), dtype = object)}
+
+def read(csv_path):
+    return encoding.load_dictionary(encoding.dictionaries_path(csv_path), 'Delivery_person_ID').tolist()
+
+# =======================================
+# Testes
+# =======================================
+
+def test_publish_replaces_the_whole_directory(tmp_path):
+    csv_path = str(tmp_path / 'train.csv')
+    first = encoding.publish_dictionaries(dictionaries('DEL01', 'DEL02'), csv_path)
+    assert read(csv_path) == ['DEL01', 'DEL02']
+
+    # Um leitor que já resolveu o diretório antigo ainda o lê inteiro até a troca
+    old = os.path.realpath(encoding.dictionaries_path(csv_path))
+    assert encoding.load_dictionary(old, 'Delivery_person_ID').tolist() == ['DEL01', 'DEL02']
+
+    second = encoding.publish_dictionaries(dictionaries('DEL03'), csv_path)
+    assert second != first
+    assert read(csv_path) == ['DEL03']
+    assert not os.path.exists(first)
+    assert sorted(os.listdir(tmp_path)) == ['train.dictionaries', os.path.basename(second)]
+
+def test_publish_over_plain_directory(tmp_path):
+    # Formato anterior: os dicionários num diretório comum
+    csv_path = str(tmp_path / 'train.csv')
+    encoding.save_dictionaries(dictionaries('DEL01'), encoding.dictionaries_path(csv_path))
+    encoding.publish_dictionaries(dictionaries('DEL01', 'DEL02'), csv_path)
+    assert os.path.islink(encoding.dictionaries_path(csv_path))
+    assert read(csv_path) == ['DEL01', 'DEL02']
+
+def test_append_writes_through_the_link(tmp_path):
+    csv_path = str(tmp_path / 'train.csv')
+    directory = encoding.publish_dictionaries(dictionaries('DEL01'), csv_path)
+    encoding.save_dictionaries(dictionaries('DEL01', 'DEL02'), encoding.dictionaries_path(csv_path))
+    assert encoding.load_dictionary(directory, 'Delivery_person_ID').tolist() == ['DEL01', 'DEL02']
@@ -0,0 +1,95 @@
+""" Contagem de distintos por célula: modo exato x nunique() e erro do HyperLogLog """
+
+# Libraries
+import math
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from curry_company.distinct import build_distinct, count_distinct, count_distinct_by, hll_precision, merge_distinct, update_distinct
+
+ROWS = 20000
+
+FILTERS = [{},
+           {'date_start': pd.Timestamp(2022, 2, 20), 'date_end': pd.Timestamp(2022, 3, 5)},
+           {'Road_traffic_density': ['Low', 'Jam']},
+           {'Weatherconditions': ['conditions Fog'], 'Festival': ['Yes']},
+           {'date_start': pd.Timestamp(2022, 3, 1), 'Road_traffic_density': ['High'], 'Weatherconditions': ['conditions Sunny', 'conditions Windy']},
+           # Filtro vazio (multiselect sem opções)
+           {'Road_traffic_density': []}]
+
+# =======================================
+# Funções
+# =======================================
+
+def orders(rows = ROWS, couriers = 1500, seed = 0):
+
+    """ Esta função tem a responsabilidade de gerar pedidos com as dimensões das células e um ID de entregador
+
+    Input: Quantidade de linhas, quantidade de entregadores, seed
+    Output: Dataframe """
+
+    rng = np.random.default_rng(seed)
+    choice = lambda values: pd.Categorical(np.asarray(values)[rng.integers(0, len(values), rows)], categories = values)
+    return pd.DataFrame({
+        'Order_Date': pd.Timestamp(2022, 2, 11) + pd.to_timedelta(rng.integers(0, 40, rows), unit = 'D'),
+        'Road_traffic_density': choice(['Low', 'Medium', 'High', 'Jam']),
+        'Weatherconditions': choice(['conditions Cloudy', 'conditions Fog', 'conditions Sandstorm', 'conditions Sunny', 'conditions Windy']),
+        'Festival': choice(['No', 'Yes']),
+        'Delivery_person_ID': np.char.add('DEL', rng.integers(0, couriers, rows).astype(str)).astype(object),
+    })
+
+def selected(df1, filtros):
+    linhas_selecionadas = pd.Series(True, index = df1.index)
+    if 'date_start' in filtros:
+        linhas_selecionadas &= df1['Order_Date'] >= filtros['date_start']
+    if 'date_end' in filtros:
+        linhas_selecionadas &= df1['Order_Date'] < filtros['date_end']
+    for coluna, valores in filtros.items():
+        if coluna not in ('date_start', 'date_end'):
+            linhas_selecionadas &= df1[coluna].isin(valores)
+    return df1.loc[linhas_selecionadas]
+
+# =======================================
+# Testes
+# =======================================
+
+@pytest.mark.parametrize('filtros', FILTERS)
+def test_exact_matches_nunique(filtros):
+    df1 = orders()
+    assert count_distinct(build_distinct(df1), **filtros) == selected(df1, filtros)['Delivery_person_ID'].nunique()
+
+@pytest.mark.parametrize('filtros', FILTERS)
+def test_exact_merge_and_update(filtros):
+    df1 = orders()
+    whole = build_distinct(df1)
+    # Partes com entregadores e células que só aparecem numa delas
+    parts = [df1.iloc[:5000], df1.iloc[5000:12000], orders(8000, couriers = 3000, seed = 1)]
+    merged = merge_distinct(*(build_distinct(part) for part in parts))
+    updated = update_distinct(update_distinct(build_distinct(parts[0]), parts[1]), parts[2])
+    everything = pd.concat(parts, ignore_index = True)
+    expected = selected(everything, filtros)['Delivery_person_ID'].nunique()
+    assert count_distinct(merged, **filtros) == expected
+    assert count_distinct(updated, **filtros) == expected
+    assert count_distinct(whole, **filtros) == selected(df1, filtros)['Delivery_person_ID'].nunique()
+
+def test_exact_count_by_week():
+    df1 = orders()
+    sketch = build_distinct(df1)
+    weeks = sketch['keys']['Order_Date'].dt.strftime('%U').to_numpy()
+    expected = df1.groupby(df1['Order_Date'].dt.strftime('%U'))['Delivery_person_ID'].nunique()
+    pd.testing.assert_series_equal(count_distinct_by(sketch, weeks), expected, check_names = False, check_index_type = False)
+
+@pytest.mark.parametrize('error', [0.01, 0.02, 0.05])
+@pytest.mark.parametrize('couriers', [300, 50000])
+def test_hll_error_bound(error, couriers):
+    # Erro relativo típico documentado: 1.04 / sqrt(2^p); 3 vezes cobre ~99.7% dos casos
+    df1 = orders(rows = 100000, couriers = couriers)
+    bound = 3 * 1.04 / math.sqrt(2 ** hll_precision(error))
+    parts = [build_distinct(df1.iloc[start:start + 25000], mode = 'hll', error = error) for start in range(0, len(df1), 25000)]
+    for sketch in (build_distinct(df1, mode = 'hll', error = error), merge_distinct(*parts)):
+        for filtros in FILTERS[:-1]:
+            expected = selected(df1, filtros)['Delivery_person_ID'].nunique()
+            assert abs(count_distinct(sketch, **filtros) - expected) <= bound * expected, filtros
+        assert count_distinct(sketch, **FILTERS[-1]) == 0
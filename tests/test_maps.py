@@ -0,0 +1,33 @@
+""" Camadas de mapa sem pontos (ex.: nenhum pedido nos filtros da barra lateral) """
+
+# Libraries
+import folium
+import pandas as pd
+
+from curry_company import maps
+
+COLUMNS = ['City', 'Road_traffic_density', 'Delivery_location_latitude', 'Delivery_location_longitude']
+
+# =======================================
+# Testes
+# =======================================
+
+def test_geojson_layer_empty():
+    df_aux = pd.DataFrame({coluna: [] for coluna in COLUMNS})
+    layer = maps.geojson_layer(df_aux, 'Delivery_location_latitude', 'Delivery_location_longitude', ['City', 'Road_traffic_density'])
+    assert layer.data['features'] == []
+    map = folium.Map()
+    layer.add_to(map)
+    map.get_root().render()
+
+def test_geojson_layer_popup():
+    df_aux = pd.DataFrame({'City': ['Urban'], 'Road_traffic_density': ['Low'],
+                           'Delivery_location_latitude': [12.9], 'Delivery_location_longitude': [77.6]})
+    layer = maps.geojson_layer(df_aux, 'Delivery_location_latitude', 'Delivery_location_longitude', ['City', 'Road_traffic_density'])
+    assert layer.data['features'][0]['properties'] == {'City': 'Urban', 'Road_traffic_density': 'Low'}
+    assert any(isinstance(child, folium.GeoJsonPopup) for child in layer._children.values())
+
+def test_cluster_layer_empty():
+    layer = maps.cluster_layer(maps.cluster_points([], []))
+    assert layer.data['features'] == []
+    folium.Map().add_child(layer).get_root().render()
@@ -0,0 +1,98 @@
+""" Perfis por entregador: consulta pelo código, varredura ordenada em páginas e busca pelo ID """
+
+# Libraries
+import numpy as np
+import pandas as pd
+import pytest
+
+from curry_company.profiles import build_profiles, lookup, ordering, profile_frame, scan, search
+
+# Dicionário de Delivery_person_ID: o código 2 (BANGRES03DEL01) não tem pedidos
+DICTIONARY = pd.Index(['INDORES13DEL02', 'BANGRES18DEL02', 'BANGRES03DEL01', 'COIMBRES13DEL02', 'CHENRES06DEL01', 'INDORES01DEL03'])
+
+# =======================================
+# Funções
+# =======================================
+
+def orders():
+
+    """ Esta função tem a responsabilidade de montar pedidos limpos com Delivery_person_ID já codificado
+
+    O entregador 5 não tem avaliações (média NaN).
+
+    Input: None
+    Output: Dataframe """
+
+    return pd.DataFrame({
+        'Delivery_person_ID': np.array([0, 0, 0, 1, 1, 3, 4, 4, 4, 4, 5], dtype = 'int32'),
+        'Delivery_person_Ratings': [4.9, 4.5, 4.7, 4.0, 3.0, 5.0, 4.6, 4.8, 4.6, 4.2, np.nan],
+        'Time_taken(min)': [24, 33, 26, 40, 38, 15, 20, 22, 29, 31, 35],
+        'Delivery_person_Age': [30, 30, 30, 25, 25, 39, 22, 22, 22, 22, 35],
+        'Type_of_vehicle': pd.Categorical(['motorcycle', 'motorcycle', 'scooter', 'scooter', 'scooter', 'motorcycle',
+                                           'electric_scooter', 'motorcycle', 'motorcycle', 'motorcycle', 'scooter']),
+        'City': pd.Categorical(['Urban', 'Urban', 'Metropolitian', 'Urban', 'Urban', 'Semi-Urban',
+                                'Metropolitian', 'Metropolitian', 'Urban', 'Metropolitian', 'Urban']),
+    })
+
+@pytest.fixture
+def profiles():
+    return build_profiles(orders())
+
+# =======================================
+# Testes
+# =======================================
+
+def test_lookup_matches_groupby(profiles):
+    df1 = orders()
+    grouped = df1.groupby('Delivery_person_ID')
+    for code, df_aux in grouped:
+        perfil = lookup(profiles, code)
+        assert perfil['orders'] == len(df_aux)
+        np.testing.assert_allclose([perfil['rating_mean'], perfil['rating_std']],
+                                   [df_aux['Delivery_person_Ratings'].mean(), df_aux['Delivery_person_Ratings'].std()], equal_nan = True)
+        assert (perfil['time_min'], perfil['time_max']) == (df_aux['Time_taken(min)'].min(), df_aux['Time_taken(min)'].max())
+        assert perfil['time_mean'] == pytest.approx(df_aux['Time_taken(min)'].mean())
+        assert perfil['age'] == df_aux['Delivery_person_Age'].max()
+        assert perfil['vehicle'] == df_aux['Type_of_vehicle'].value_counts().idxmax()
+        for city, count in df_aux['City'].value_counts().items():
+            assert perfil[city] == count
+
+def test_lookup_missing(profiles):
+    # Código sem pedidos, fora do intervalo e negativo
+    assert lookup(profiles, 2) is None
+    assert lookup(profiles, profiles['size']) is None
+    assert lookup(profiles, -1) is None
+
+def test_scan_pages(profiles):
+    order = ordering(profiles, 'orders', ascending = False)
+    assert order.tolist() == [4, 0, 1, 3, 5]
+    pages = []
+    for page in range(3):
+        df_aux, total = scan(profiles, 'orders', ascending = False, page = page, page_size = 2)
+        assert total == 5
+        pages.append(df_aux)
+    assert [len(df_aux) for df_aux in pages] == [2, 2, 1]
+    assert pd.concat(pages)['Delivery_person_ID'].tolist() == order.tolist()
+    # Depois da última página
+    df_aux, total = scan(profiles, 'orders', ascending = False, page = 3, page_size = 2)
+    assert df_aux.empty and total == 5
+    assert list(df_aux.columns) == list(profile_frame(profiles, [0]).columns)
+
+def test_scan_sorts_missing_last(profiles):
+    for ascending in (True, False):
+        df_aux, _ = scan(profiles, 'rating_mean', ascending = ascending)
+        assert df_aux['Delivery_person_ID'].iloc[-1] == 5
+        values = df_aux['rating_mean'].iloc[:-1].to_numpy()
+        assert (np.diff(values) >= 0).all() if ascending else (np.diff(values) <= 0).all()
+    with pytest.raises(ValueError):
+        ordering(profiles, 'Delivery_person_ID')
+
+def test_search(profiles):
+    # ID exato, parte do ID sem diferenciar maiúsculas e limite
+    assert search(profiles, DICTIONARY, 'COIMBRES13DEL02').tolist() == [3]
+    assert search(profiles, DICTIONARY, ' indores ').tolist() == [0, 5]
+    assert search(profiles, DICTIONARY, 'DEL0', limit = 3).tolist() == [0, 1, 3]
+    # Entregador sem pedidos, texto sem resultado e texto vazio
+    assert search(profiles, DICTIONARY, 'BANGRES03DEL01').tolist() == []
+    assert search(profiles, DICTIONARY, 'MYSRES').tolist() == []
+    assert search(profiles, DICTIONARY, '   ').tolist() == []
@@ -0,0 +1,81 @@
+""" Dataset compartilhado: sessões e processos do pool não copiam as colunas
+
+As colunas numéricas de load_dataset devem apontar para o arquivo colunar
+mapeado em memória (as mesmas páginas para todas as sessões) e attach_columns
+deve montar o dataframe do pool sobre os blocos de memória compartilhada. """
+
+# Libraries
+import ctypes
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from curry_company import loader, parallel, store
+from curry_company.synthetic import write_orders
+
+ROWS = 5000
+
+# =======================================
+# Funções
+# =======================================
+
+def mapped_buffers(path):
+
+    """ Esta função tem a responsabilidade de expor como arrays os intervalos de endereço em que o arquivo está mapeado
+
+    Input: Caminho do arquivo
+    Output: Lista de np.ndarray (uint8), um por mapeamento """
+
+    target = os.path.realpath(path)
+    buffers = []
+    with open('/proc/self/maps') as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) >= 6 and parts[5] == target:
+                start, end = (int(address, 16) for address in parts[0].split('-'))
+                buffers.append(np.frombuffer((ctypes.c_char * (end - start)).from_address(start), dtype = np.uint8))
+    return buffers
+
+@pytest.fixture(scope = 'module')
+def dataset(tmp_path_factory):
+    path = write_orders(str(tmp_path_factory.mktemp('dataset') / 'train.csv'), ROWS)
+    loader.build_dataset(path)
+    return path
+
+# =======================================
+# Testes
+# =======================================
+
+@pytest.mark.skipif(not os.path.exists('/proc/self/maps'), reason = 'precisa de /proc/self/maps (Linux)')
+def test_sessions_share_mapped_columns(dataset):
+    sessao_1, sessao_2 = loader.load_dataset(dataset), loader.load_dataset(dataset)
+    buffers = mapped_buffers(store.store_path(dataset))
+    assert buffers
+    colunas = sessao_1.select_dtypes('number').columns
+    assert len(colunas)
+    for coluna in colunas:
+        values = sessao_1[coluna].to_numpy()
+        assert np.shares_memory(values, sessao_2[coluna].to_numpy()), coluna
+        assert any(np.shares_memory(values, buffer) for buffer in buffers), coluna
+
+def test_attach_columns_does_not_copy(dataset):
+    df1 = loader.load_dataset(dataset)
+    colunas = [coluna for coluna in df1.columns if isinstance(df1[coluna].dtype, pd.CategoricalDtype)][:2]
+    colunas += list(df1.select_dtypes('number').columns[:2])
+    layout, blocks = parallel.share_columns(df1, colunas)
+    try:
+        attached = parallel.attach_columns(layout)
+        for coluna in colunas:
+            name, dtype, categories = layout['columns'][coluna]
+            block = np.ndarray(layout['rows'], dtype = np.dtype(dtype), buffer = parallel._attached[name].buf)
+            values = attached[coluna].array.codes if categories is not None else attached[coluna].to_numpy()
+            assert np.shares_memory(values, block), coluna
+            pd.testing.assert_series_equal(attached[coluna], df1[coluna], check_names = False)
+        del attached, values, block
+    finally:
+        for name, _, _ in layout['columns'].values():
+            if name in parallel._attached:
+                parallel._attached.pop(name).close()
+        parallel.release(blocks)
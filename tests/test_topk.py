@@ -0,0 +1,48 @@
+""" Top-k por grupo: empates resolvidos pelo texto do ID, não pela ordem dos códigos """
+
+# Libraries
+import numpy as np
+import pandas as pd
+
+from curry_company.topk import top_k
+
+# Dicionário em ordem de aparição: o código não segue a ordem alfabética do ID
+LABELS = pd.Index(['DEL03', 'DEL01', 'DEL04', 'DEL02', 'DEL05'])
+
+# =======================================
+# Funções
+# =======================================
+
+def orders():
+    return pd.DataFrame({'City': ['Urban'] * 6 + ['Metropolitian'] * 2,
+                         'Delivery_person_ID': np.array([0, 1, 2, 3, 4, 0, 3, 1], dtype = 'int32'),
+                         'Time_taken(min)': [20, 20, 30, 20, 10, 40, 15, 15]})
+
+def decoded(df_aux):
+    return [LABELS[code] for code in df_aux['Delivery_person_ID']]
+
+# =======================================
+# Testes
+# =======================================
+
+def test_ties_follow_labels():
+    smallest, largest = top_k(orders(), 'City', 'Delivery_person_ID', 'Time_taken(min)', k = 3, labels = LABELS)
+    # Urban: DEL05 (10), depois o empate em 20 (DEL01, DEL02, DEL03) cortado em k = 3
+    assert decoded(smallest[smallest['City'] == 'Urban']) == ['DEL05', 'DEL01', 'DEL02']
+    assert decoded(largest[largest['City'] == 'Urban']) == ['DEL04', 'DEL01', 'DEL02']
+    assert decoded(smallest[smallest['City'] == 'Metropolitian']) == ['DEL01', 'DEL02']
+
+def test_ties_do_not_depend_on_codes():
+    # Os mesmos pedidos com outro dicionário (ex.: lote anexado numa ordem diferente)
+    df1 = orders()
+    remap = np.array([4, 0, 1, 2, 3])
+    labels = pd.Index([LABELS[np.flatnonzero(remap == code)[0]] for code in range(len(LABELS))])
+    df2 = df1.assign(Delivery_person_ID = remap[df1['Delivery_person_ID']].astype('int32'))
+    for first, second in zip(top_k(df1, 'City', 'Delivery_person_ID', 'Time_taken(min)', k = 3, labels = LABELS),
+                             top_k(df2, 'City', 'Delivery_person_ID', 'Time_taken(min)', k = 3, labels = labels)):
+        assert decoded(first) == [labels[code] for code in second['Delivery_person_ID']]
+        assert first['Time_taken(min)'].tolist() == second['Time_taken(min)'].tolist()
+
+def test_ties_by_key_without_labels():
+    smallest, _ = top_k(orders(), 'City', 'Delivery_person_ID', 'Time_taken(min)', k = 3)
+    assert smallest.loc[smallest['City'] == 'Urban', 'Delivery_person_ID'].tolist() == [4, 0, 1]